@@ -0,0 +1,217 @@
+# Importamos los módulos para leer los argumentos, calcular el resumen del código fuente y manejar los ficheros de la caché
+import argparse
+import hashlib
+import os
+import re
+import sys
+
+# Importamos el conjunto de instrucciones y la función que codifica cada instrucción
+from cpu import DISPATCH, encode
+# Importamos el formato de las imágenes binarias de programa
+from image import VERSION, build_image
+# Importamos la función que codifica las palabras de 32 bits
+from memory import pack_words
+# Importamos el optimizador de programas
+from optimizer import optimize
+
+# Definimos el lenguaje ensamblador
+# Cada línea tiene como mucho una etiqueta y una instrucción o directiva; los comentarios empiezan por ";" o "#"
+#   bucle:  SUB R0, R1      ; operaciones con dos registros: ADD, SUB, AND, OR, XOR, MOV
+#           NOT R0          ; operaciones con un registro: NOT, IN, OUT
+#           LDR R2, dato    ; operaciones con un registro y una dirección: LDR, STR
+#           JZ fin          ; saltos a una dirección: JMP, JZ, JN
+#           HALT            ; operaciones sin operandos: NOP, HALT
+# Las directivas son:
+#   .code               las líneas siguientes van a la sección de código (la sección inicial)
+#   .data               las líneas siguientes van a la sección de datos, que se coloca después del código
+#   .word v1, v2, ...   palabras de 32 bits con esos valores o con las direcciones de esas etiquetas
+#   .space n            n bytes a cero
+#   .entry etiqueta     dirección de inicio del programa, por defecto el principio del código
+# Las direcciones son números (decimales o con prefijo 0x) o etiquetas, opcionalmente con un desplazamiento: dato+4
+# Son relativas al principio de la imagen, que el procesador usa como base del segmento al cargarla
+
+# Definimos los operandos de cada mnemónico a partir de la tabla de despacho del procesador
+OPERANDS = {name: (op, params) for op, (method, name, params) in enumerate(DISPATCH)}
+
+# Definimos el formato de una etiqueta con un desplazamiento opcional, por ejemplo dato+4
+LABEL_VALUE = re.compile(r"([A-Za-z_]\w*)\s*(?:([+-])\s*(0[xX][0-9A-Fa-f]+|\d+))?")
+
+# Nombre del directorio de la caché de imágenes, junto a los ficheros fuente
+CACHE_DIR = "__cpucache__"
+
+
+# Definimos una función que lee un número de registro
+def parse_register(text, line):
+    if len(text) < 2 or text[0] not in "Rr" or not text[1:].isdigit() or int(text[1:]) > 15:
+        raise ValueError(f"línea {line}: registro inválido: {text}")
+    return int(text[1:])
+
+# Definimos una función que lee una dirección o un valor
+def parse_value(text, labels, line):
+    # Recibe un número, una etiqueta o una etiqueta con desplazamiento y devuelve su valor
+    try:
+        return int(text, 0) # Si es un número, lo devuelve
+    except ValueError:
+        pass
+    match = LABEL_VALUE.fullmatch(text) # Si no, tiene que ser una etiqueta con un desplazamiento opcional
+    if match == None:
+        raise ValueError(f"línea {line}: valor inválido: {text}")
+    name, sign, offset = match.groups()
+    if name not in labels: # Comprueba si la etiqueta existe
+        raise ValueError(f"línea {line}: etiqueta desconocida: {name}")
+    delta = int(offset, 0) if sign else 0 # Desplazamiento sobre la etiqueta
+    return labels[name] - delta if sign == "-" else labels[name] + delta
+
+# Definimos una función que separa el código fuente en líneas con etiqueta, instrucción y operandos
+def parse_lines(source):
+    # Devuelve una lista de tuplas (número de línea, etiqueta o None, mnemónico o directiva o None, operandos)
+    lines = []
+    for number, text in enumerate(source.splitlines(), 1):
+        for mark in ";#": # Quita los comentarios
+            text = text.split(mark, 1)[0]
+        label = None
+        if ":" in text: # Si la línea tiene etiqueta
+            label, text = text.split(":", 1)
+            label = label.strip()
+            if not label.isidentifier():
+                raise ValueError(f"línea {number}: etiqueta inválida: {label}")
+        words = text.split(None, 1) # Separa el mnemónico de los operandos
+        if not words and label == None: # Línea vacía
+            continue
+        mnemonic = words[0].upper() if words else None
+        operands = [op.strip() for op in words[1].split(",")] if len(words) > 1 else []
+        lines.append((number, label, mnemonic, operands))
+    return lines
+
+# Definimos una función que calcula el tamaño en bytes de una línea
+def line_size(number, mnemonic, operands):
+    if mnemonic == None or mnemonic in (".CODE", ".DATA", ".ENTRY"):
+        return 0
+    if mnemonic == ".WORD":
+        return 4 * len(operands)
+    if mnemonic == ".SPACE":
+        try:
+            size = int(operands[0], 0)
+        except (IndexError, ValueError):
+            size = -1
+        if size < 0:
+            raise ValueError(f"línea {number}: .space necesita un número de bytes")
+        return size
+    if mnemonic not in OPERANDS:
+        raise ValueError(f"línea {number}: instrucción desconocida: {mnemonic}")
+    return 4
+
+# Definimos una función que ensambla el código fuente en palabras de 32 bits
+def assemble_sections(source):
+    # Devuelve la tupla (bytes del código, bytes de los datos, dirección de inicio)
+    # Lanza ValueError con el número de línea si el código fuente tiene errores
+    lines = parse_lines(source)
+    # Primera pasada: calcula el tamaño de cada sección y la posición de cada etiqueta dentro de su sección
+    sizes = {".CODE": 0, ".DATA": 0}
+    places = {} # Etiqueta -> (sección, posición)
+    section = ".CODE"
+    for number, label, mnemonic, operands in lines:
+        if mnemonic in sizes: # Cambio de sección
+            section = mnemonic
+        if label != None:
+            if label in places:
+                raise ValueError(f"línea {number}: etiqueta repetida: {label}")
+            places[label] = (section, sizes[section])
+        sizes[section] += line_size(number, mnemonic, operands)
+    # La sección de datos va a continuación de la de código
+    start = {".CODE": 0, ".DATA": sizes[".CODE"]}
+    labels = {label: start[section] + place for label, (section, place) in places.items()}
+    # Segunda pasada: codifica las instrucciones y los datos
+    out = {".CODE": bytearray(), ".DATA": bytearray()}
+    section = ".CODE"
+    entry = 0
+    for number, label, mnemonic, operands in lines:
+        if mnemonic in out:
+            section = mnemonic
+        elif mnemonic == ".ENTRY":
+            if len(operands) != 1:
+                raise ValueError(f"línea {number}: .entry necesita una dirección")
+            entry = parse_value(operands[0], labels, number)
+        elif mnemonic == ".WORD":
+            values = [parse_value(text, labels, number) for text in operands]
+            for value in values:
+                if value < -(1 << 31) or value >= 1 << 32:
+                    raise ValueError(f"línea {number}: el valor no cabe en 32 bits: {value}")
+            out[section] += pack_words(values)
+        elif mnemonic == ".SPACE":
+            out[section] += bytes(line_size(number, mnemonic, operands))
+        elif mnemonic != None:
+            op, params = OPERANDS[mnemonic]
+            if len(operands) != len(params):
+                raise ValueError(f"línea {number}: {mnemonic} necesita {len(params)} operandos")
+            fields = {"n": 0, "m": 0, "d": 0}
+            for param, text in zip(params, operands):
+                if param == "d":
+                    value = parse_value(text, labels, number)
+                    if value < 0 or value > 0xFFFF:
+                        raise ValueError(f"línea {number}: la dirección no cabe en 16 bits: {value}")
+                    fields[param] = value
+                else:
+                    fields[param] = parse_register(text, number)
+            out[section] += pack_words([encode(op, fields["n"], fields["m"], fields["d"])])
+    return bytes(out[".CODE"]), bytes(out[".DATA"]), entry
+
+# Definimos una función que ensambla el código fuente en una imagen de programa
+def assemble(source):
+    # Devuelve los bytes de la imagen, que se pueden cargar con CPU.load_program o guardar en un fichero
+    return build_image(*assemble_sections(source))
+
+# Definimos una función que ensambla un fichero fuente usando la caché de imágenes
+def assemble_file(path, cache_dir=None):
+    # Las imágenes se guardan en cache_dir, por defecto __cpucache__ junto al fichero fuente,
+    # con el resumen SHA-256 del código fuente y la versión del formato como nombre
+    # Si la imagen ya existe no se vuelve a ensamblar
+    # Devuelve la ruta de la imagen, que se puede cargar con CPU.load_image
+    with open(path, "rb") as file:
+        source = file.read()
+    if cache_dir == None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR)
+    digest = hashlib.sha256(source).hexdigest()
+    target = os.path.join(cache_dir, f"{digest}.v{VERSION}.img")
+    if not os.path.exists(target): # Si la imagen no está en la caché
+        image = assemble(source.decode("utf-8")) # Ensambla el código fuente
+        os.makedirs(cache_dir, exist_ok=True)
+        temp = f"{target}.{os.getpid()}.tmp" # Escribe primero en un fichero temporal
+        with open(temp, "wb") as file:
+            file.write(image)
+        os.replace(temp, target) # Lo renombra de una vez para que otro proceso nunca lea una imagen a medias
+    return target
+
+
+# Definimos la entrada de línea de comandos
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ensambla un programa en una imagen binaria")
+    parser.add_argument("source", help="fichero fuente en ensamblador")
+    parser.add_argument("-o", "--output", help="fichero de imagen, por defecto el de la caché")
+    parser.add_argument("-O", "--optimize", action="store_true", help="optimiza el programa (requiere -o)")
+    args = parser.parse_args(argv)
+    if args.optimize and args.output == None: # La caché guarda el programa sin optimizar
+        parser.error("-O/--optimize requiere -o/--output")
+    try:
+        if args.output == None: # Usa la caché
+            print(assemble_file(args.source))
+        else:
+            with open(args.source, encoding="utf-8") as file:
+                image = assemble(file.read())
+            if args.optimize: # Optimiza el programa ensamblado
+                result = optimize(image)
+                if result.reason != None:
+                    print(f"{args.source}: no se optimiza: {result.reason}", file=sys.stderr)
+                else:
+                    print(f"{args.source}: {result.removed} palabras eliminadas", file=sys.stderr)
+                image = build_image(pack_words(result.program), b"", result.entry)
+            with open(args.output, "wb") as file:
+                file.write(image)
+    except ValueError as error: # Errores del código fuente
+        print(f"{args.source}: {error}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+# Importamos numpy para ejecutar muchas instancias del procesador a la vez con operaciones vectoriales
+import numpy as np
+
+# Importamos el conjunto de instrucciones y el formato de las instrucciones del procesador
+from cpu import (
+    MEM_SIZE, NUM_REGS, OP_MASK, RN_MASK, RM_MASK, DIR_MASK,
+    NOP, ADD, SUB, AND, OR, XOR, NOT, MOV, LDR, STR, JMP, JZ, JN, IN, OUT, HALT,
+)
+# Importamos la función que codifica el programa como una imagen de bytes
+from memory import pack_words
+
+# Definimos los códigos de fallo de cada instancia
+# Un fallo de operación guarda el código de operación de la instrucción que falló (de 0 a 15)
+NO_FAULT = -1 # La instancia no ha fallado
+FETCH_FAULT = 16 # La instancia intentó leer una instrucción en una dirección inválida
+
+# Definimos los nombres de las operaciones para los mensajes de error
+NAMES = ["NOP", "ADD", "SUB", "AND", "OR", "XOR", "NOT", "MOV", "LDR", "STR", "JMP", "JZ", "JN", "IN", "OUT", "HALT"]
+
+# Desplazamientos de los 4 bytes de una palabra
+WORD_BYTES = np.arange(4)
+
+
+# Definimos un lote de instancias del procesador que ejecutan el mismo programa en paralelo
+# Cada instancia es una fila de los arrays: registros, ALU, CP, UC y memoria de datos
+# En cada paso se decodifica la instrucción de todas las instancias activas y se aplica cada operación
+# a la vez sobre todas las instancias que la ejecutan, usando máscaras cuando los CP se separan tras JZ o JN
+# Las instancias que ejecutan HALT o fallan dejan de estar activas
+# Los registros y la ALU son enteros de 64 bits, a diferencia de los enteros sin límite de cpu.py
+class Batch:
+    __slots__ = ("size", "regs", "alu", "cp", "uc", "fault", "cycles", "mem",
+                 "inputs", "in_len", "in_pos", "out", "out_count", "base")
+
+    def __init__(self, program, inputs, mem_size=MEM_SIZE, dir=0, in_len=None):
+        # Recibe el programa como lista de palabras de 32 bits y una matriz de entradas con una fila por instancia
+        # in_len indica cuántos valores de su fila puede leer cada instancia, por defecto la fila entera
+        # El programa se carga en la memoria de cada instancia a partir de la dirección dir, que es la base del segmento
+        inputs = np.asarray(inputs, dtype=np.int64) # Entradas de cada instancia
+        if inputs.ndim == 1: # Una sola columna de entradas
+            inputs = inputs[:, None]
+        lanes = inputs.shape[0] # Número de instancias
+        image = np.frombuffer(pack_words(program), dtype=np.uint8) # Imagen de bytes del programa
+        if dir < 0 or dir + image.size > mem_size: # Comprueba si el programa cabe en la memoria
+            raise ValueError("el programa no cabe en la memoria de datos")
+        self.size = mem_size # Tamaño de la memoria de cada instancia
+        self.base = dir # Base del segmento
+        self.regs = np.zeros((lanes, NUM_REGS), dtype=np.int64) # Registros de cada instancia
+        self.alu = np.zeros(lanes, dtype=np.int64) # ALU de cada instancia
+        self.cp = np.full(lanes, dir, dtype=np.int64) # CP de cada instancia
+        self.uc = np.zeros(lanes, dtype=np.int8) # UC de cada instancia (0 = ejecutando, 1 = detenido)
+        self.fault = np.full(lanes, NO_FAULT, dtype=np.int8) # Fallo de cada instancia
+        self.cycles = np.zeros(lanes, dtype=np.int64) # Instrucciones ejecutadas por cada instancia
+        self.mem = np.zeros((lanes, mem_size), dtype=np.uint8) # Memoria de datos de cada instancia
+        self.mem[:, dir:dir + image.size] = image # Carga el programa en todas las memorias
+        self.inputs = inputs # Valores de entrada
+        if in_len is None: # Cada instancia puede leer su fila entera
+            in_len = np.full(lanes, inputs.shape[1], dtype=np.int64)
+        else: # Un valor para todas las instancias o uno por instancia
+            in_len = np.broadcast_to(np.asarray(in_len, dtype=np.int64), (lanes,)).copy()
+            if np.any((in_len < 0) | (in_len > inputs.shape[1])): # Comprueba si caben en las filas de entradas
+                raise ValueError("in_len tiene que estar entre 0 y el número de columnas de las entradas")
+        self.in_len = in_len # Valores que puede leer cada instancia
+        self.in_pos = np.zeros(lanes, dtype=np.int64) # Próximo valor de entrada de cada instancia
+        self.out = np.zeros((lanes, 8), dtype=np.int64) # Valores de salida de cada instancia, crece según haga falta
+        self.out_count = np.zeros(lanes, dtype=np.int64) # Número de valores de salida de cada instancia
+
+    def read_words(self, lanes, dir):
+        # Lee la palabra de 32 bits con signo en la dirección dir de la memoria de cada instancia de lanes
+        bytes = self.mem[lanes[:, None], dir[:, None] + WORD_BYTES] # Obtiene los 4 bytes de cada palabra
+        return np.ascontiguousarray(bytes).view("<i4")[:, 0].astype(np.int64) # Los junta en little-endian
+
+    def write_words(self, lanes, dir, num):
+        # Escribe los 32 bits menos significativos de num en la dirección dir de la memoria de cada instancia de lanes
+        bytes = (num & 0xFFFFFFFF).astype("<u4").view(np.uint8).reshape(-1, 4) # Separa los 4 bytes de cada palabra
+        self.mem[lanes[:, None], dir[:, None] + WORD_BYTES] = bytes
+
+    def valid_dir(self, dir):
+        # Devuelve la máscara de las direcciones de palabra válidas
+        return (dir >= 0) & (dir + 4 <= self.size)
+
+    def active(self):
+        # Devuelve los índices de las instancias que siguen ejecutando
+        return np.flatnonzero((self.uc == 0) & (self.fault == NO_FAULT))
+
+    def step(self):
+        # Ejecuta una instrucción en todas las instancias activas
+        # Devuelve el número de instancias que la ejecutaron
+        lanes = self.active() # Instancias activas
+        if lanes.size == 0: # Si no queda ninguna
+            return 0
+        cp = self.cp[lanes] # CP de las instancias activas
+        ok = self.valid_dir(cp) # Comprueba si las direcciones de las instrucciones son válidas
+        self.fault[lanes[~ok]] = FETCH_FAULT # Las instancias con una dirección inválida fallan
+        lanes, cp = lanes[ok], cp[ok]
+        ir = self.read_words(lanes, cp) # Lee la instrucción de cada instancia
+        self.cp[lanes] = cp + 4 # Incrementa el CP en 4
+        op = (ir & OP_MASK) >> 28 # Extrae el código de operación de cada instrucción
+        rn = (ir & RN_MASK) >> 24 # Extrae el número del primer registro de cada instrucción
+        rm = (ir & RM_MASK) >> 20 # Extrae el número del segundo registro de cada instrucción
+        dir = self.base + (ir & DIR_MASK) # Extrae la dirección de memoria de cada instrucción
+        for code in np.unique(op): # Aplica cada operación a las instancias que la ejecutan
+            sel = op == code
+            self.execute(int(code), lanes[sel], rn[sel], rm[sel], dir[sel])
+        return lanes.size # Devuelve el número de instancias que ejecutaron la instrucción
+
+    def execute(self, op, lanes, rn, rm, dir):
+        # Aplica la operación op a la vez sobre las instancias de lanes
+        # Las instancias cuyos operandos no son válidos fallan, igual que cuando la operación devuelve falso en cpu.py
+        regs, alu = self.regs, self.alu
+        if op in (ADD, SUB, AND, OR, XOR, MOV, NOT, LDR, STR, IN, OUT): # Operaciones que usan el registro Rn
+            ok = rn < NUM_REGS
+            if op in (ADD, SUB, AND, OR, XOR, MOV): # Operaciones que usan también el registro Rm
+                ok &= rm < NUM_REGS
+            if op in (LDR, STR): # Operaciones que acceden a la memoria de datos
+                ok &= self.valid_dir(dir)
+            if op == IN: # La entrada falla si la instancia ya no tiene valores
+                ok &= self.in_pos[lanes] < self.in_len[lanes]
+        elif op in (JMP, JZ, JN): # Saltos
+            ok = self.valid_dir(dir)
+        else: # NOP y HALT no fallan nunca
+            ok = np.ones(lanes.size, dtype=bool)
+        self.fault[lanes[~ok]] = op # Las instancias con operandos inválidos fallan
+        lanes, rn, rm, dir = lanes[ok], rn[ok], rm[ok], dir[ok]
+        self.cycles[lanes] += 1 # Cuenta el ciclo solo en las instancias que ejecutan la operación, igual que CPU.cycles
+        if op == NOP: # Resetea el valor de la ALU
+            alu[lanes] = 0
+            return
+        if op == HALT: # Resetea la ALU y detiene las instancias
+            alu[lanes] = 0
+            self.uc[lanes] = 1
+            return
+        if op == JMP: # Salta a la dirección y copia a la ALU la dirección de 16 bits, sin la base del segmento
+            alu[lanes] = dir - self.base
+            self.cp[lanes] = dir
+            return
+        if op in (JZ, JN): # Salta solo en las instancias cuya ALU es cero o negativa
+            taken = alu[lanes] == 0 if op == JZ else alu[lanes] < 0
+            self.cp[lanes[taken]] = dir[taken]
+            return
+        if op == STR: # Almacena el registro Rn en la memoria de datos
+            num = regs[lanes, rn]
+            alu[lanes] = num
+            self.write_words(lanes, dir, num)
+            return
+        if op == OUT: # Añade el registro Rn a la salida de cada instancia
+            num = regs[lanes, rn]
+            alu[lanes] = num
+            pos = self.out_count[lanes]
+            if pos.size and pos.max() >= self.out.shape[1]: # Amplía la matriz de salida si no cabe
+                self.out = np.concatenate([self.out, np.zeros_like(self.out)], axis=1)
+            self.out[lanes, pos] = num
+            self.out_count[lanes] = pos + 1
+            return
+        if op == LDR: # Carga la palabra de la memoria de datos
+            num = self.read_words(lanes, dir)
+        elif op == IN: # Lee el siguiente valor de entrada
+            num = self.inputs[lanes, self.in_pos[lanes]]
+            self.in_pos[lanes] += 1
+        elif op == NOT:
+            num = ~regs[lanes, rn]
+        elif op == MOV:
+            num = regs[lanes, rm]
+        else: # Operaciones aritméticas y lógicas entre Rn y Rm
+            a, b = regs[lanes, rn], regs[lanes, rm]
+            if op == ADD:
+                num = a + b
+            elif op == SUB:
+                num = a - b
+            elif op == AND:
+                num = a & b
+            elif op == OR:
+                num = a | b
+            else:
+                num = a ^ b
+        alu[lanes] = num # Guarda el resultado en la ALU
+        regs[lanes, rn] = num # Copia el resultado de la ALU al registro Rn
+
+    def run(self, max_cycles=None):
+        # Ejecuta pasos hasta que todas las instancias se detengan o fallen, o hasta max_cycles pasos
+        # Devuelve el número de pasos ejecutados
+        steps = 0
+        while max_cycles == None or steps < max_cycles:
+            if not self.step(): # Si no queda ninguna instancia activa
+                break
+            steps += 1
+        return steps
+
+    def outputs(self, lane):
+        # Devuelve los valores de salida de la instancia lane
+        return self.out[lane, :self.out_count[lane]]
+
+    def error(self, lane):
+        # Devuelve el mensaje de error de la instancia lane, con el mismo texto que cpu.py, o None si no falló
+        fault = self.fault[lane]
+        if fault == NO_FAULT:
+            return None
+        if fault == FETCH_FAULT:
+            return "Error: dirección de memoria inválida"
+        return f"Error: operación {NAMES[fault]} inválida"
+
+
+# Definimos una función que ejecuta un programa sobre muchas entradas a la vez
+def run_lockstep(program, inputs, mem_size=MEM_SIZE, max_cycles=None, dir=0, in_len=None):
+    # Recibe el programa y una matriz de entradas con una fila por instancia
+    # Devuelve el lote con el estado final de todas las instancias como arrays de numpy
+    batch = Batch(program, inputs, mem_size, dir, in_len) # Crea una instancia del procesador por fila de entradas
+    batch.run(max_cycles) # Ejecuta todas las instancias a la vez
+    return batch # Devuelve el estado final
@@ -0,0 +1,15 @@
+# Paquete de pruebas de rendimiento del procesador
+# workloads.py define los programas de prueba y bench.py los mide con cada configuración del procesador
+# Se ejecuta con python -m benchmarks desde el directorio raíz del repositorio, por ejemplo:
+#   python -m benchmarks -o resultados.json
+#   python -m benchmarks --baseline resultados.json --threshold 0.05
+# La comparación con una referencia solo se hace si se pide con --baseline, porque el ruido entre ejecuciones
+# puede superar el umbral: en una máquina compartida de un solo núcleo las medidas varían un 10-20 % de una ejecución
+# a otra aunque el código no cambie. Para reducirlo, cada prueba se ejecuta una vez sin medir, se mide con el
+# recolector de basura desactivado y se compara score, la mediana de las instrucciones por segundo normalizada
+# con un bucle de calibración de Python medido justo antes de cada ejecución
+# benchmarks/baseline.json es una referencia medida en una sola máquina; --baseline sin fichero compara con ella
+# El score solo compensa aproximadamente la velocidad de la máquina, así que antes de sacar conclusiones
+# la referencia se regenera en la máquina en la que se va a comparar, con el código sin cambios:
+#   python -m benchmarks -o benchmarks/baseline.json
+#   python -m benchmarks --baseline
@@ -0,0 +1,7 @@
+# Importamos el módulo sys para devolver el código de salida
+import sys
+
+# Importamos la entrada de línea de comandos de las pruebas de rendimiento
+from benchmarks.bench import main
+
+sys.exit(main())
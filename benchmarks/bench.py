@@ -0,0 +1,243 @@
+# Importamos los módulos para leer los argumentos, escribir los resultados y medir el tiempo y la memoria
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+# Importamos el procesador, el ensamblador, los puertos en memoria y el optimizador
+from cpu import CPU
+from assembler import assemble
+from ports import IteratorInput, ListOutput
+from optimizer import load_optimized
+# Importamos los programas de prueba
+from benchmarks.workloads import WORKLOADS
+
+# Definimos las configuraciones del procesador que se comparan
+# Cada una es la tupla (nivel de fidelidad, motor de CPU.run_program, si se carga con optimizer.load_optimized)
+ENGINES = {
+    "microarch/interp": ("microarch", "interp", False),
+    "microarch/blocks": ("microarch", "blocks", False),
+    "functional/interp": ("functional", "interp", False),
+    "functional/blocks": ("functional", "blocks", False),
+    "functional/optimized": ("functional", "interp", True),
+}
+
+# Versión del formato de los resultados
+FORMAT = 2 # La versión 2 añade median_ips y score
+
+# Fracción que puede empeorar una medida respecto a la de referencia antes de considerarla una regresión
+THRESHOLD = 0.10
+
+# Ejecuciones medidas por defecto de cada prueba, además de una de calentamiento que no se mide
+REPEAT = 5
+
+# Vueltas del bucle de calibración (ver calibrate)
+CALIBRATION_LOOPS = 200000
+
+# Directorio raíz del repositorio, desde el que se importa cpu al medir el tiempo de arranque
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Resultados de referencia guardados en el repositorio, con los que se compara con --baseline sin fichero
+# Solo sirven en la máquina en la que se midieron: se regeneran con python -m benchmarks -o benchmarks/baseline.json
+# (ver __init__.py)
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+
+# Definimos una función que prepara un procesador con un programa de prueba cargado
+def prepare(workload, image, engine):
+    # Devuelve el procesador listo para CPU.run_program, o None si el programa no se pudo cargar
+    fidelity, run_engine, optimize = ENGINES[engine]
+    proc = CPU(workload.mem_size, fidelity=fidelity)
+    proc.verbose = False # No se imprime el estado final
+    proc.input_port = IteratorInput(workload.inputs) # Las entradas y salidas no pasan por la terminal
+    proc.output_port = ListOutput()
+    start = load_optimized(proc, image)[0] if optimize else proc.load_program(image)
+    if start == None: # Comprueba si hubo un error al cargar el programa
+        return None
+    proc.cp = start
+    return proc
+
+# Definimos una función que mide el tiempo de un bucle fijo de Python puro
+def calibrate():
+    # El bucle hace el mismo tipo de trabajo que el intérprete del procesador (sumas, máscaras, índices de listas),
+    # así que su tiempo sigue la velocidad de la máquina y de la versión de Python
+    # Dividir las medidas entre él permite comparar resultados de máquinas distintas de forma aproximada
+    table = list(range(8))
+    total = 0
+    start = time.perf_counter()
+    for i in range(CALIBRATION_LOOPS):
+        total = (total + table[i & 7]) & 0xFFFFFFFF
+    return time.perf_counter() - start
+
+# Definimos una función que mide un programa de prueba con una configuración
+def measure(workload, engine, repeat=REPEAT, memory=True):
+    # Ejecuta el programa una vez sin medirlo, para compilar los bloques y llenar las cachés compartidas,
+    # y después repeat veces con CPU.run_program, con el recolector de basura desactivado
+    # Antes de cada ejecución mide el bucle de calibración; score es la mediana de las instrucciones por segundo
+    # de cada ejecución multiplicadas por el tiempo de calibración medido justo antes, es decir,
+    # instrucciones por vuelta del bucle de calibración, que varía mucho menos que ips entre ejecuciones y máquinas
+    # Con memory=True lo ejecuta una vez más con tracemalloc para medir el pico de memoria,
+    # aparte porque tracemalloc hace mucho más lenta la ejecución
+    # Devuelve un diccionario con las medidas, o None si el programa falla
+    image = assemble(workload.source)
+    run_engine = ENGINES[engine][1]
+    times = [] # Tiempo de cada ejecución
+    scores = [] # Instrucciones por segundo normalizadas de cada ejecución
+    for i in range(repeat + 1):
+        proc = prepare(workload, image, engine)
+        if proc == None:
+            return None
+        calibration = calibrate()
+        enabled = gc.isenabled()
+        gc.disable() # Las pausas del recolector no forman parte del procesador
+        try:
+            start = time.perf_counter()
+            proc.run_program(run_engine)
+            elapsed = time.perf_counter() - start
+        finally:
+            if enabled:
+                gc.enable()
+        if proc.error != None or proc.uc != 1: # El programa tiene que terminar con HALT
+            return None
+        if i: # La primera ejecución es de calentamiento
+            times.append(elapsed)
+            scores.append(proc.cycles / elapsed * calibration / CALIBRATION_LOOPS if elapsed else 0.0)
+    best = min(times)
+    median = statistics.median(times)
+    result = {
+        "instructions": proc.cycles,
+        "seconds": best,
+        "median_seconds": median,
+        "ips": proc.cycles / best if best else 0.0, # Instrucciones por segundo de la ejecución más rápida
+        "median_ips": proc.cycles / median if median else 0.0,
+        "score": statistics.median(scores), # Instrucciones por vuelta del bucle de calibración
+    }
+    if memory: # Si hay que medir el pico de memoria
+        tracemalloc.start()
+        proc = prepare(workload, image, engine) # Incluye las memorias y las cachés del procesador
+        proc.run_program(run_engine)
+        result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+# Definimos una función que mide el tiempo de arranque del intérprete y de importar el procesador
+def measure_startup(repeat=5):
+    # Cada medida lanza un intérprete nuevo, así que incluye todos los módulos que importa cpu.py
+    # Devuelve los mejores tiempos de arrancar el intérprete y de importar cpu, sin contar el arranque
+    def best(code):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+            times.append(time.perf_counter() - start)
+        return min(times)
+    interpreter = best("pass")
+    return {"interpreter_seconds": interpreter, "import_seconds": max(0.0, best("import cpu") - interpreter)}
+
+# Definimos una función que ejecuta todas las pruebas pedidas
+def run_benchmarks(workloads=None, engines=None, scale=1, repeat=REPEAT, memory=True, startup=True):
+    # Recibe los nombres de los programas y de las configuraciones, por defecto todos
+    # Devuelve los resultados como un diccionario que se puede guardar en JSON
+    results = {}
+    failed = []
+    for name in workloads or WORKLOADS:
+        workload = WORKLOADS[name](scale)
+        for engine in engines or ENGINES:
+            result = measure(workload, engine, repeat, memory)
+            if result == None: # Si el programa falló
+                failed.append(f"{name} {engine}")
+            else:
+                results.setdefault(name, {})[engine] = result
+    return {
+        "format": FORMAT,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scale": scale,
+        "repeat": repeat,
+        "startup": measure_startup() if startup else None,
+        "results": results,
+        "failed": failed,
+    }
+
+# Definimos una función que compara unos resultados con los de referencia
+def compare(current, baseline, threshold=THRESHOLD):
+    # Una regresión es una prueba más lenta, o un arranque más lento, por más de threshold respecto a la referencia;
+    # las pruebas que no están en los dos resultados no se comparan
+    # Se compara score, que está normalizado con el bucle de calibración; con resultados de la versión 1 del formato,
+    # que no lo tienen, se comparan las instrucciones por segundo
+    # Devuelve la lista de mensajes de las regresiones
+    regressions = []
+    for name, engines in current["results"].items():
+        for engine, result in engines.items():
+            old = baseline.get("results", {}).get(name, {}).get(engine)
+            if old == None:
+                continue
+            key = "score" if "score" in old and "score" in result else "ips" # Medida que tienen los dos resultados
+            if not old[key]:
+                continue
+            change = result[key] / old[key] - 1 # Cambio relativo de la velocidad
+            if change < -threshold:
+                spec = ",.0f" if key == "ips" else ".4f"
+                regressions.append(f"{name} {engine}: {key} {result[key]:{spec}}, {change:+.1%} respecto a {old[key]:{spec}}")
+    now, old = current.get("startup"), baseline.get("startup")
+    if now and old and old["import_seconds"]: # Si los dos resultados midieron el arranque
+        change = now["import_seconds"] / old["import_seconds"] - 1
+        if change > threshold:
+            regressions.append(f"import cpu: {now['import_seconds'] * 1000:.1f} ms, {change:+.1%} respecto a {old['import_seconds'] * 1000:.1f} ms")
+    return regressions
+
+# Definimos una función que imprime una tabla con los resultados
+def print_results(current):
+    print(f"{'programa':10} {'configuración':22} {'instrucciones':>13} {'segundos':>9} {'instr/s':>12} {'memoria':>10}")
+    for name, engines in current["results"].items():
+        for engine, result in engines.items():
+            peak = result.get("peak_bytes")
+            peak = f"{peak / 1024:,.0f} KiB" if peak != None else "-"
+            print(f"{name:10} {engine:22} {result['instructions']:>13,} {result['seconds']:>9.3f} {result['ips']:>12,.0f} {peak:>10}")
+    for case in current["failed"]:
+        print(f"{case}: el programa no terminó con HALT")
+    startup = current["startup"]
+    if startup:
+        print(f"arranque del intérprete: {startup['interpreter_seconds'] * 1000:.1f} ms, import cpu: {startup['import_seconds'] * 1000:.1f} ms")
+
+
+# Definimos la entrada de línea de comandos
+# Se ejecuta con python -m benchmarks desde el directorio raíz del repositorio
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Mide el rendimiento del procesador")
+    parser.add_argument("-w", "--workload", action="append", choices=list(WORKLOADS), help="programa de prueba, por defecto todos")
+    parser.add_argument("-e", "--engine", action="append", choices=list(ENGINES), help="configuración, por defecto todas")
+    parser.add_argument("--scale", type=float, default=1, help="multiplica el número de instrucciones de cada programa")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help=f"ejecuciones medidas de cada prueba, por defecto {REPEAT}")
+    parser.add_argument("--no-memory", action="store_true", help="no mide el pico de memoria")
+    parser.add_argument("--no-startup", action="store_true", help="no mide el tiempo de arranque")
+    parser.add_argument("-o", "--output", help="fichero JSON en el que se guardan los resultados")
+    parser.add_argument("--baseline", nargs="?", const=BASELINE,
+                        help="compara con este fichero JSON de resultados, sin fichero con benchmarks/baseline.json")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="empeoramiento permitido, por defecto 0.10")
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat tiene que ser al menos 1")
+    current = run_benchmarks(args.workload, args.engine, args.scale, args.repeat, not args.no_memory, not args.no_startup)
+    print_results(current)
+    if args.output: # Guarda los resultados
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(current, file, indent=2)
+    status = 1 if current["failed"] else 0
+    if args.baseline: # Compara con la referencia
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        regressions = compare(current, baseline, args.threshold)
+        for message in regressions:
+            print(f"regresión: {message}")
+        if regressions:
+            status = 1
+        else:
+            print(f"sin regresiones respecto a {args.baseline}")
+    return status
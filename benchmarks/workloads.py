@@ -0,0 +1,142 @@
+# Importamos namedtuple para describir cada programa de prueba
+from collections import namedtuple
+
+# Importamos los códigos de operación y la función que codifica las instrucciones
+from cpu import ADD, SUB, encode
+
+# Definimos un programa de prueba
+# source es el código en ensamblador (ver assembler.py), inputs los valores que leerá IN,
+# mem_size el tamaño de la memoria y description una línea que explica qué mide
+Workload = namedtuple("Workload", ["name", "source", "inputs", "mem_size", "description"])
+
+# Tamaño de la memoria de los programas de prueba, suficiente para su código y sus datos
+MEM_SIZE = 4096
+
+# Palabras del vector que recorre el programa memory
+SWEEP_WORDS = 64
+
+
+# Definimos los programas de prueba
+# Cada función recibe la escala (1 ejecuta unas 300.000 instrucciones) y devuelve el Workload
+# Todos terminan con HALT, así que CPU.uc vale 1 y CPU.error None si se ejecutan bien
+
+# Bucle de operaciones aritméticas y lógicas entre registros
+def arith(scale=1):
+    count = max(1, int(40000 * scale))
+    source = f"""
+        LDR R1, one
+        LDR R2, count
+        LDR R3, seed
+loop:   ADD R4, R3
+        XOR R4, R2
+        SUB R5, R4
+        AND R5, R3
+        OR R6, R5
+        SUB R2, R1
+        JZ done
+        JMP loop
+done:   HALT
+one:    .word 1
+count:  .word {count}
+seed:   .word 12345
+"""
+    return Workload("arith", source, [], MEM_SIZE, "bucle de ADD, SUB, AND, OR y XOR entre registros")
+
+# Recorrido de un vector en memoria que lee, modifica y escribe cada palabra
+def memory(scale=1):
+    # Las instrucciones solo tienen direcciones fijas, así que el recorrido está desenrollado
+    count = max(1, int(1500 * scale))
+    sweep = "\n".join(f"        LDR R0, vector+{4 * i}\n        ADD R0, R1\n        STR R0, vector+{4 * i}"
+                      for i in range(SWEEP_WORDS))
+    source = f"""
+        LDR R1, one
+        LDR R2, count
+loop:
+{sweep}
+        SUB R2, R1
+        JZ done
+        JMP loop
+done:   HALT
+one:    .word 1
+count:  .word {count}
+vector: .space {4 * SWEEP_WORDS}
+"""
+    return Workload("memory", source, [], MEM_SIZE, "recorrido de LDR y STR sobre un vector de la memoria de datos")
+
+# Bucle con saltos condicionales que dependen de los datos
+def branches(scale=1):
+    count = max(1, int(23000 * scale))
+    source = f"""
+        LDR R0, low
+        LDR R1, one
+        LDR R2, count
+        LDR R3, mask
+        LDR R7, half
+loop:   ADD R4, R4
+        XOR R4, R2
+        AND R4, R3
+        MOV R5, R4
+        AND R5, R0
+        JZ skip
+        ADD R6, R1
+skip:   MOV R5, R4
+        SUB R5, R7
+        JN next
+        SUB R6, R1
+next:   SUB R2, R1
+        JZ done
+        JMP loop
+done:   HALT
+low:    .word 3
+one:    .word 1
+count:  .word {count}
+mask:   .word 0xFFFF
+half:   .word 0x8000
+"""
+    return Workload("branches", source, [], MEM_SIZE, "saltos JZ y JN tomados según los datos")
+
+# Flujo de entrada y salida: suma cada valor leído y escribe la suma parcial
+def io(scale=1):
+    count = max(1, int(50000 * scale))
+    source = """
+        LDR R3, one
+        IN R2
+loop:   IN R0
+        ADD R1, R0
+        OUT R1
+        SUB R2, R3
+        JZ done
+        JMP loop
+done:   HALT
+one:    .word 1
+"""
+    return Workload("io", source, [count] + list(range(count)), MEM_SIZE, "IN y OUT con puertos en memoria")
+
+# Programa que modifica su propio código en cada vuelta
+def selfmod(scale=1):
+    # Cada vuelta cambia la instrucción patch entre ADD R0, R1 y SUB R0, R1,
+    # así que hay que invalidar las cachés de instrucciones y de bloques en cada vuelta
+    count = max(1, int(50000 * scale))
+    first = encode(ADD, 0, 1)
+    source = f"""
+        LDR R1, one
+        LDR R2, count
+        LDR R3, first
+        LDR R4, flip
+loop:   XOR R3, R4
+        STR R3, patch
+patch:  NOP
+        SUB R2, R1
+        JZ done
+        JMP loop
+done:   HALT
+one:    .word 1
+count:  .word {count}
+first:  .word {first}
+flip:   .word {first ^ encode(SUB, 0, 1)}
+"""
+    return Workload("selfmod", source, [], MEM_SIZE, "código automodificable que invalida las cachés en cada vuelta")
+
+
+# Definimos la tabla de programas de prueba por nombre
+WORKLOADS = {function.__name__: function for function in (arith, memory, branches, io, selfmod)}
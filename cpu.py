@@ -1,7 +1,15 @@
 # Importamos el módulo sys para usar la entrada y salida estándar
 import sys
+import time
 
-# Definimos el tamaño de la memoria en bytes
+# Importamos la memoria respaldada por bytes
+from memory import MappedMemory, Memory, PagedMemory, make_memory, pack_words
+# Importamos el formato de las imágenes binarias de programa
+from image import HEADER, is_image, read_image
+# snapshot.py y replay.py se importan al usarlos, para que importar cpu no cargue pickle, zlib ni argparse
+
+# Definimos el tamaño por defecto de la memoria en bytes
+# CPU.configure_memory permite usar memorias mucho mayores, de hasta varios GB
 MEM_SIZE = 32
 
 # Definimos el tamaño de los registros y las instrucciones en bits
@@ -35,378 +43,956 @@ IN = 0xD
 OUT = 0xE
 HALT = 0xF
 
-# Definimos los componentes del procesador
-alu = 0 # La ALU guarda el resultado de la última operación
-uc = 0 # La UC guarda el estado del procesador (0 = ejecutando, 1 = detenido)
-mbr = 0 # El MBR guarda la instrucción o el dato leído de la memoria
-cp = 0 # El CP guarda la dirección de la próxima instrucción a ejecutar
-mar = 0 # El MAR guarda la dirección de memoria a acceder
-ir = 0 # El IR guarda la instrucción a decodificar y ejecutar
-regs = [0] * NUM_REGS # Los registros se inicializan a cero
-
-# Definimos la memoria de sistema y la memoria de datos
-# Usamos listas de enteros para representar la memoria
-# Cada elemento de la lista es un byte
-# Para leer o escribir una instrucción o un dato de 32 bits, se usan 4 bytes consecutivos
-mem_sis = [0] * MEM_SIZE # La memoria de sistema se inicializa a cero
-mem_dat = [0] * MEM_SIZE # La memoria de datos se inicializa a cero
-
-# Definimos los buses
-bus_int = 0 # El bus interno transfiere datos entre el MBR y el IR o los registros
-bus_dat = 0 # El bus de datos transfiere datos entre el MBR y la memoria de datos
-bus_dir = 0 # El bus de direcciones transfiere direcciones entre el MAR y la memoria de sistema o de datos
-bus_con = 0 # El bus de control transfiere señales de control entre la UC y los demás componentes
-
-# Definimos las funciones que realizan las operaciones del conjunto de instrucciones
-# Cada función recibe como parámetros los números de los registros o las direcciones de memoria involucrados
-# Cada función actualiza el valor de la ALU y de los registros o la memoria según corresponda
-# Cada función devuelve un valor booleano que indica si la operación se realizó con éxito o no
-
-def nop():
-    # No hace nada
-    global alu
-    alu = 0 # Resetea el valor de la ALU
-    return True # Devuelve verdadero
-
-def add(rn, rm):
-    # Suma los contenidos de los registros Rn y Rm y guarda el resultado en Rn
-    global alu, regs
-    if rn < 0 or rn >= NUM_REGS or rm < 0 or rm >= NUM_REGS:
-        # Comprueba si los números de los registros son válidos
-        return False # Devuelve falso si no lo son
-    alu = regs[rn] + regs[rm] # Suma los contenidos de los registros y guarda el resultado en la ALU
-    regs[rn] = alu # Copia el resultado de la ALU al registro Rn
-    return True # Devuelve verdadero
-
-def sub(rn, rm):
-    # Resta los contenidos de los registros Rn y Rm y guarda el resultado en Rn
-    global alu, regs
-    if rn < 0 or rn >= NUM_REGS or rm < 0 or rm >= NUM_REGS: # Comprueba si los números de los registros son válidos
-        return False # Devuelve falso si no lo son
-    alu = regs[rn] - regs[rm] # Resta los contenidos de los registros y guarda el resultado en la ALU
-    regs[rn] = alu # Copia el resultado de la ALU al registro Rn
-    return True # Devuelve verdadero
-
-def and_(rn, rm):
-    # Realiza la operación lógica AND entre los contenidos de los registros Rn y Rm y guarda el resultado en Rn
-    global alu, regs
-    if rn < 0 or rn >= NUM_REGS or rm < 0 or rm >= NUM_REGS: # Comprueba si los números de los registros son válidos
-        return False # Devuelve falso si no lo son
-    alu = regs[rn] & regs[rm] # Realiza la operación lógica AND y guarda el resultado en la ALU
-    regs[rn] = alu # Copia el resultado de la ALU al registro Rn
-    return True # Devuelve verdadero
-
-def or_(rn, rm):
-    # Realiza la operación lógica OR entre los contenidos de los registros Rn y Rm y guarda el resultado en Rn
-    global alu, regs
-    if rn < 0 or rn >= NUM_REGS or rm < 0 or rm >= NUM_REGS: # Comprueba si los números de los registros son válidos
-        return False # Devuelve falso si no lo son
-    alu = regs[rn] | regs[rm] # Realiza la operación lógica OR y guarda el resultado en la ALU
-    regs[rn] = alu # Copia el resultado de la ALU al registro Rn
-    return True # Devuelve verdadero
-
-def xor(rn, rm):
-    # Realiza la operación lógica XOR entre los contenidos de los registros Rn y Rm y guarda el resultado en Rn
-    global alu, regs
-    if rn < 0 or rn >= NUM_REGS or rm < 0 or rm >= NUM_REGS: # Comprueba si los números de los registros son válidos
-        return False # Devuelve falso si no lo son
-    alu = regs[rn] ^ regs[rm] # Realiza la operación lógica XOR y guarda el resultado en la ALU
-    regs[rn] = alu # Copia el resultado de la ALU al registro Rn
-    return True # Devuelve verdadero
-
-def not_(rn):
-    # Realiza la operación lógica NOT sobre el contenido del registro Rn y guarda el resultado en Rn
-    global alu, regs
-    if rn < 0 or rn >= NUM_REGS: # Comprueba si el número del registro es válido
-        return False # Devuelve falso si no lo es
-    alu = ~regs[rn] # Realiza la operación lógica NOT y guarda el resultado en la ALU
-    regs[rn] = alu # Copia el resultado de la ALU al registro Rn
-    return True # Devuelve verdadero
-
-def mov(rn, rm):
-    # Copia el contenido del registro Rm al registro Rn
-    global alu, regs
-    if rn < 0 or rn >= NUM_REGS or rm < 0 or rm >= NUM_REGS: # Comprueba si los números de los registros son válidos
-        return False # Devuelve falso si no lo son
-    alu = regs[rm] # Copia el contenido del registro Rm a la ALU
-    regs[rn] = alu # Copia el contenido de la ALU al registro Rn
-    return True # Devuelve verdadero
-
-def ldr(rn, dir):
-    # Carga el contenido de la dirección de memoria dir al registro Rn
-    global alu, regs, mbr, mar, bus_int, bus_dat, bus_dir
-    if rn < 0 or rn >= NUM_REGS or dir < 0 or dir +4 > MEM_SIZE: # Comprueba si el número del registro y la dirección de memoria son válidos
-        return False # Devuelve falso si no lo son
-    mar = dir # Copia la dirección de memoria al MAR
-    bus_dir = mar # Copia el contenido del MAR al bus de direcciones
-    mbr = read_mem(bus_dir) # Lee el contenido de la memoria de datos en la dirección indicada por el bus de direcciones y lo guarda en el MBR
-    if mbr == None: # Comprueba si hubo un error al leer la memoria
-        return False # Devuelve falso si lo hubo
-    bus_dat = mbr # Copia el contenido del MBR al bus de datos
-    bus_int = bus_dat # Copia el contenido del bus de datos al bus interno
-    alu = bus_int # Copia el contenido del bus interno a la ALU
-    regs[rn] = alu # Copia el contenido de la ALU al registro Rn
-    return True # Devuelve verdadero
-
-def str(rn, dir):
-    # Almacena el contenido del registro Rn en la dirección de memoria dir
-    global alu, regs, mbr, mar, bus_int, bus_dat, bus_dir
-    if rn < 0 or rn >= NUM_REGS or dir < 0 or dir +4 > MEM_SIZE: # Comprueba si el número del registro y la dirección de memoria son válidos
-        return False # Devuelve falso si no lo son
-    alu = regs[rn] # Copia el contenido del registro Rn a la ALU
-    bus_int = alu # Copia el contenido de la ALU al bus interno
-    bus_dat = bus_int # Copia el contenido del bus interno al bus de datos
-    mbr = bus_dat # Copia el contenido del bus de datos al MBR
-    mar = dir # Copia la dirección de memoria al MAR
-    bus_dir = mar # Copia el contenido del MAR al bus de direcciones
-    if not write_mem(bus_dir, mbr): # Escribe el contenido del MBR en la memoria de datos en la dirección indicada por el bus de direcciones
-        return False # Devuelve falso si hubo un error al escribir la memoria
-    return True # Devuelve verdadero
-
-def jmp(dir):
-    # Salta a la dirección de memoria dir
-    global alu, cp, mar, bus_dir
-    if dir < 0 or dir +4 > MEM_SIZE: # Comprueba si la dirección de memoria es válida
-        return False # Devuelve falso si no lo es
-    alu = dir # Copia la dirección de memoria a la ALU
-    bus_dir = alu # Copia el contenido de la ALU al bus de direcciones
-    mar = bus_dir # Copia el contenido del bus de direcciones al MAR
-    cp = mar # Copia el contenido del MAR al CP
-    return True # Devuelve verdadero
-
-def jz(dir):
-    # Salta a la dirección de memoria dir si el resultado de la última operación es cero
-    global alu, cp, mar, bus_dir
-    if dir < 0 or dir +4 > MEM_SIZE: # Comprueba si la dirección de memoria es válida
-        return False # Devuelve falso si no lo es
-    if alu == 0: # Comprueba si el resultado de la última operación es cero
-        bus_dir = dir # Copia la dirección de memoria al bus de direcciones
-        mar = bus_dir # Copia el contenido del bus de direcciones al MAR
-        cp = mar # Copia el contenido del MAR al CP
-    return True # Devuelve verdadero
-
-def jn(dir):
-    # Salta a la dirección de memoria dir si el resultado de la última operación es negativo
-    global alu, cp, mar, bus_dir
-    if dir < 0 or dir +4 > MEM_SIZE: # Comprueba si la dirección de memoria es válida
-        return False # Devuelve falso si no lo es
-    if alu < 0: # Comprueba si el resultado de la última operación es negativo
-        bus_dir = dir # Copia la dirección de memoria al bus de direcciones
-        mar = bus_dir # Copia el contenido del bus de direcciones al MAR
-        # Copia el contenido del bus de direcciones al MAR
-        cp = mar # Copia el contenido del MAR al CP
-    return True # Devuelve verdadero
-
-def in_(rn):
-    # Lee un dato de entrada y lo guarda en el registro Rn
-    global alu, regs, bus_int
-    if rn < 0 or rn  >= NUM_REGS: # Comprueba si el número del registro es válido
-        return False # Devuelve falso si no lo es
-    try:
-        alu = int(input()) # Lee un dato de entrada y lo convierte a entero
-    except ValueError: # Captura el error si el dato no es válido
-        return False # Devuelve falso si lo hay
-    bus_int = alu # Copia el contenido de la ALU al bus interno
-    regs[rn] = bus_int # Copia el contenido del bus interno al registro Rn
-    return True # Devuelve verdadero
-
-def out(rn):
-    # Escribe el contenido del registro Rn en la salida
-    global alu, regs, bus_int
-    if rn < 0 or rn >= NUM_REGS: # Comprueba si el número del registro es válido
-        return False # Devuelve falso si no lo es
-    alu = regs[rn] # Copia el contenido del registro Rn a la ALU
-    bus_int = alu # Copia el contenido de la ALU al bus interno
-    print(bus_int) # Escribe el contenido del bus interno en la salida
-    return True # Devuelve verdadero
-
-def halt():
-    # Detiene la ejecución del programa
-    global alu, uc
-    alu = 0 # Resetea el valor de la ALU
-    uc = 1 # Cambia el estado del procesador a detenido
-    return True # Devuelve verdadero
-
-# Definimos una función auxiliar que convierte una lista de bytes a un entero de 32 bits
-def bytes_to_int(bytes):
-    # Recibe una lista de 4 bytes y devuelve un entero de 32 bits
-    # Usa el orden de bytes little-endian, es decir, el byte menos significativo está en el índice 0
-    # Usa el formato de complemento a dos para representar los números negativos
-    if len(bytes) != 4: # Comprueba si la lista tiene 4 bytes
-        return None # Devuelve None si no los tiene
-    num = 0 # Inicializa el número a cero
-    for i in range(4): # Recorre los 4 bytes de la lista
-        num += bytes[i] << (8 * i) # Suma el valor del byte multiplicado por 2 elevado a 8 veces el índice
-    if num >= 2**31: # Comprueba si el número es mayor o igual que 2 elevado a 31
-        num -= 2**32 # Resta 2 elevado a 32 para obtener el número negativo correspondiente
-    return num # Devuelve el número
-
-# Definimos una función auxiliar que convierte un entero de 32 bits a una lista de bytes
-def int_to_bytes(num):
-    # Recibe un entero de 32 bits y devuelve una lista de 4 bytes
-    # Usa el orden de bytes little-endian, es decir, el byte menos significativo está en el índice 0
-    # Usa el formato de complemento a dos para representar los números negativos
-    if num < 0: # Comprueba si el número es negativo
-        num += 2**32 # Suma 2 elevado a 32 para obtener el número positivo correspondiente
-    bytes = [] # Inicializa la lista de bytes vacía
-    for i in range(4): # Recorre los 4 bytes del número
-        bytes.append(num & 0xFF) # Añade el byte menos significativo a la lista
-        num >>= 8 # Desplaza el número 8 bits a la derecha
-    return bytes # Devuelve la lista de bytes
-
-# Definimos una función auxiliar que lee una instrucción o un dato de 32 bits de la memoria de datos
-def read_mem(dir):
-    # Recibe una dirección de memoria y devuelve una instrucción o un dato de 32 bits
-    # Usa la memoria de datos para leer el contenido
-    if dir < 0 or dir +4 > MEM_SIZE: # Comprueba si la dirección de memoria es válida
-        return None # Devuelve None si no lo es
-    #index = dir //4 # Calcula el índice de la lista de bytes
-    bytes = mem_dat[dir:dir + 4] # Obtiene los 4 bytes consecutivos de la memoria de datos
-
-    num = bytes_to_int(bytes) # Convierte los bytes a un entero de 32 bits
-  
-    return num # Devuelve el entero
-
-
-# Definimos una función auxiliar que escribe una instrucción o un dato de 32 bits en la memoria de datos
-def write_mem(dir, num):
-    # Recibe una dirección de memoria y una instrucción o un dato de 32 bits
-    # Usa la memoria de datos para escribir el contenido
-    if dir < 0 or dir +4 > MEM_SIZE: # Comprueba si la dirección de memoria es válida
-        return False # Devuelve falso si no lo es
-    bytes = int_to_bytes(num) # Convierte el entero a una lista de bytes
-    
-    mem_dat[dir:dir+4] = bytes # Asigna los 4 bytes consecutivos a la memoria de datos
-    return True # Devuelve verdadero
-
-# Definimos una función que carga un programa en la memoria de sistema
-def load_program(program):
-    # Recibe una lista de instrucciones o datos de 32 bits y los carga en la memoria de sistema
-    # Devuelve la dirección de inicio del programa o None si hay un error
-    global mem_sis
-    if len(program) * 4 > MEM_SIZE: # Comprueba si el programa cabe en la memoria de sistema
-        return None # Devuelve None si no cabe
-    dir = 0 # Inicializa la dirección de inicio a cero
-    for num in program: # Recorre las instrucciones o datos del programa
-        bytes = int_to_bytes(num) # Convierte el entero a una lista de bytes
-        mem_sis[dir:dir+4] = bytes # Asigna los 4 bytes consecutivos a la memoria de sistema
-        dir += 4 # Incrementa la dirección en 4
-    return 0 # Devuelve la dirección de inicio del programa
-
-# Definimos una función que ejecuta el programa cargado en la memoria de sistema
-def run_program():
-    # Ejecuta el programa cargado en la memoria de sistema
-    # Usa un bucle que simula el ciclo de instrucción
-    # Devuelve el estado final del procesador y los registros
-    global uc, mbr, cp, mar, ir, bus_int, bus_dat, bus_dir, bus_con
-    while uc == 0: # Mientras el procesador esté ejecutando
-        mar = cp # Copia el CP al MAR
-        bus_dir = mar # Copia el MAR al bus de direcciones
-        mbr = read_mem(bus_dir) # Lee la instrucción de la memoria de sistema en la dirección indicada por el bus de direcciones y la guarda en el MBR
-        if mbr == None: # Comprueba si hubo un error al leer la memoria
-            print("Error: dirección de memoria inválida") # Imprime un mensaje de error
-            break # Sale del bucle
-        
-        bus_dat = mbr # Copia el MBR al bus de datos
-        bus_int = bus_dat # Copia el bus de datos al bus interno
-        ir = bus_int # Copia el bus interno al IR
-        cp += 4 # Incrementa el CP en 4
+# Definimos el estado de la UC cuando una instrucción IN espera datos de un puerto de entrada que todavía está vacío
+# El puerto lo indica lanzando BlockingIOError; el CP queda apuntando a la instrucción IN, que se repite en el siguiente run
+WAITING = 2
+
+# Definimos una función que codifica una instrucción como una palabra de 32 bits con el formato de las máscaras
+def encode(op, rn=0, rm=0, dir=0):
+    # Recibe el código de operación, los números de los registros y la dirección de memoria o el valor inmediato
+    return (op << 28 & OP_MASK) | (rn << 24 & RN_MASK) | (rm << 20 & RM_MASK) | (dir & DIR_MASK)
+
+# Definimos la tabla de despacho indexada por código de operación
+# Cada entrada contiene el nombre del método que realiza la operación, el nombre de la operación
+# y los campos de la instrucción que recibe como parámetros
+# Los campos se indican con una letra: n = Rn, m = Rm, d = dirección
+DISPATCH = [
+    ("nop", "NOP", ""),
+    ("add", "ADD", "nm"),
+    ("sub", "SUB", "nm"),
+    ("and_", "AND", "nm"),
+    ("or_", "OR", "nm"),
+    ("xor", "XOR", "nm"),
+    ("not_", "NOT", "n"),
+    ("mov", "MOV", "nm"),
+    ("ldr", "LDR", "nd"),
+    ("str", "STR", "nd"),
+    ("jmp", "JMP", "d"),
+    ("jz", "JZ", "d"),
+    ("jn", "JN", "d"),
+    ("in_", "IN", "n"),
+    ("out", "OUT", "n"),
+    ("halt", "HALT", ""),
+]
+
+# Definimos los niveles de fidelidad de la simulación
+# "microarch" reproduce las transferencias entre el CP, el MAR, el MBR, el IR y los buses en cada instrucción, para enseñar y depurar
+# "functional" solo actualiza el estado de la arquitectura: registros, ALU, CP, UC y memoria
+# Los dos niveles dan siempre el mismo resultado en ese estado
+FIDELITIES = ("microarch", "functional")
+
+# Definimos los métodos que sustituyen a los de DISPATCH en el nivel "functional"
+# El resto de operaciones no usan los buses y son iguales en los dos niveles
+FUNCTIONAL = {
+    "ldr": "ldr_functional",
+    "str": "str_functional",
+    "jmp": "jmp_functional",
+    "jz": "jz_functional",
+    "jn": "jn_functional",
+    "in_": "in_functional",
+    "out": "out_functional",
+}
+
+# Definimos las plantillas de código de las operaciones que el compilador de bloques traduce a Python
+# Cada bloque trabaja con variables locales: r0..r7 para los registros y a para la ALU
+BLOCK_OPS = {
+    NOP: "a = 0",
+    ADD: "a = r{n} + r{m}; r{n} = a",
+    SUB: "a = r{n} - r{m}; r{n} = a",
+    AND: "a = r{n} & r{m}; r{n} = a",
+    OR: "a = r{n} | r{m}; r{n} = a",
+    XOR: "a = r{n} ^ r{m}; r{n} = a",
+    NOT: "a = ~r{n}; r{n} = a",
+    MOV: "a = r{m}; r{n} = a",
+    LDR: "a = read_word({d}); r{n} = a",
+    STR: "a = r{n}; write_mem({d}, a)",
+}
+
+# Definimos el número máximo de instrucciones de un bloque
+BLOCK_MAX = 64
+
+# Definimos los componentes del procesador que guarda CPU.snapshot, además de los registros y las memorias
+SNAPSHOT_FIELDS = (
+    "alu", "uc", "mbr", "cp", "mar", "ir", "base",
+    "bus_int", "bus_dat", "bus_dir", "bus_con",
+    "cycles", "error", "superinstructions",
+)
+
+# Definimos las superinstrucciones: secuencias frecuentes que el intérprete "functional" ejecuta con una sola llamada
+# Cada una es una lista de grupos de operaciones; se genera con el compilador de bloques y devuelve cuántas instrucciones ejecutó
+# Solo se usan con los programas que optimizer.py ha comprobado que no se modifican a sí mismos
+ALU_OPS = {ADD, SUB, AND, OR, XOR, NOT, MOV}
+SUPERINSTRUCTIONS = [
+    ({LDR}, ALU_OPS, {STR}), # Carga, opera y guarda, por ejemplo LDR+ADD+STR
+    (ALU_OPS | {LDR}, {JZ, JN}), # Opera y salta según el resultado, por ejemplo SUB+JZ
+]
+FUSE_MAX = max(len(pattern) for pattern in SUPERINSTRUCTIONS) # Número máximo de instrucciones de una superinstrucción
+
+# Definimos la caché de funciones generadas por el compilador de bloques
+# Se indexa por el código fuente del bloque, así los procesadores que ejecutan el mismo programa comparten las funciones
+# Guarda como mucho BLOCK_CODE_MAX funciones: cuando se llena descarta la que lleva más tiempo sin usarse (LRU),
+# así un proceso que ejecuta muchos programas distintos no acumula todas las funciones que ha generado
+# Los procesadores siguen usando los bloques que ya tienen en su caché aunque se descarten de esta
+BLOCK_CODE_MAX = 4096
+block_code = {}
+
+
+# Definimos el procesador
+# Cada instancia guarda todo su estado en atributos, así pueden convivir muchos procesadores en el mismo proceso
+class CPU:
+    __slots__ = (
+        "alu", "uc", "mbr", "cp", "mar", "ir", "regs",
+        "mem_sis", "mem_dat", "base",
+        "bus_int", "bus_dat", "bus_dir", "bus_con",
+        "fidelity", "cycles", "error", "verbose", "input_port", "output_port",
+        "decode_cache", "block_cache", "block_owners", "profile", "superinstructions",
+    )
+
+    def __init__(self, mem_size=MEM_SIZE, image=None, writable=False, fidelity="microarch", profile=False):
+        # Recibe el tamaño de la memoria en bytes y, opcionalmente, un fichero de imagen para proyectar como memoria de datos
+        # fidelity es uno de los niveles de FIDELITIES
+        # Con profile=True se cuentan las instrucciones ejecutadas en self.profile (ver profiler.py)
+        if fidelity not in FIDELITIES: # Comprueba si el nivel de fidelidad es válido
+            raise ValueError(f"nivel de fidelidad desconocido: {fidelity}")
+        self.fidelity = fidelity # Nivel de fidelidad de la simulación
+        # Definimos los componentes del procesador
+        self.alu = 0 # La ALU guarda el resultado de la última operación
+        self.uc = 0 # La UC guarda el estado del procesador (0 = ejecutando, 1 = detenido)
+        self.mbr = 0 # El MBR guarda la instrucción o el dato leído de la memoria
+        self.cp = 0 # El CP guarda la dirección de la próxima instrucción a ejecutar
+        self.mar = 0 # El MAR guarda la dirección de memoria a acceder
+        self.ir = 0 # El IR guarda la instrucción a decodificar y ejecutar
+        self.regs = [0] * NUM_REGS # Los registros se inicializan a cero
+
+        # Definimos los buses
+        self.bus_int = 0 # El bus interno transfiere datos entre el MBR y el IR o los registros
+        self.bus_dat = 0 # El bus de datos transfiere datos entre el MBR y la memoria de datos
+        self.bus_dir = 0 # El bus de direcciones transfiere direcciones entre el MAR y la memoria de sistema o de datos
+        self.bus_con = 0 # El bus de control transfiere señales de control entre la UC y los demás componentes
+
+        # Definimos el estado de la ejecución
+        self.cycles = 0 # Número de instrucciones ejecutadas desde el último reset
+        self.error = None # Mensaje del último error de ejecución, o None si no hubo ninguno
+        self.verbose = True # Si es verdadero, los errores y el estado final se imprimen en la salida
+
+        # Definimos los puertos de entrada y salida
+        # IN lee un dato llamando a input_port() y OUT lo escribe llamando a output_port(dato)
+        # Por defecto se usan la entrada y la salida estándar; el módulo ports tiene puertos con búfer y para asyncio
+        self.input_port = input
+        self.output_port = print
+
+        # Definimos la caché de instrucciones decodificadas
+        # Cada entrada asocia la dirección de una instrucción con la tupla (ir, operación, operandos, nombre)
+        # Así cada palabra se decodifica una sola vez aunque se ejecute muchas veces
+        # write_mem invalida las entradas que se solapan con los bytes escritos, para que los programas automodificables sigan funcionando
+        self.decode_cache = {}
+
+        # Definimos la caché de bloques básicos compilados
+        # Cada entrada asocia la dirección de inicio de un bloque con la función de Python generada para él
+        # block_owners asocia cada byte cubierto por un bloque con las direcciones de inicio de los bloques que lo contienen
+        self.block_cache = {}
+        self.block_owners = {}
+
+        # Definimos el perfil de ejecución, o None si está desactivado
+        self.profile = None
+        if profile: # profiler.py solo se importa si se usa
+            self.set_profile()
+
+        # Definimos si el intérprete "functional" usa superinstrucciones
+        # Lo activa optimizer.load_optimized después de comprobar el programa; cargar otro programa lo desactiva
+        self.superinstructions = False
+
+        # Definimos la memoria de sistema y la memoria de datos
+        # Usamos objetos de memory.py respaldados por bytes para representar la memoria
+        # Cada dirección es un byte y el tamaño de la memoria es su atributo size
+        # Para leer o escribir una instrucción o un dato de 32 bits, se usan 4 bytes consecutivos sin crear copias
+        # La base del segmento se suma a las direcciones de 16 bits de LDR, STR, JMP, JZ y JN para obtener la dirección real,
+        # así las instrucciones codificadas con DIR_MASK pueden usar memorias mayores de 64 KB
+        self.configure_memory(mem_size, image, writable)
+
+    # Definimos las funciones que realizan las operaciones del conjunto de instrucciones
+    # Cada función recibe como parámetros los números de los registros o las direcciones de memoria involucrados
+    # Cada función actualiza el valor de la ALU y de los registros o la memoria según corresponda
+    # Cada función devuelve un valor booleano que indica si la operación se realizó con éxito o no
+
+    def nop(self):
+        # No hace nada
+        self.alu = 0 # Resetea el valor de la ALU
+        return True # Devuelve verdadero
+
+    def add(self, rn, rm):
+        # Suma los contenidos de los registros Rn y Rm y guarda el resultado en Rn
+        if rn < 0 or rn >= NUM_REGS or rm < 0 or rm >= NUM_REGS:
+            # Comprueba si los números de los registros son válidos
+            return False # Devuelve falso si no lo son
+        self.alu = self.regs[rn] + self.regs[rm] # Suma los contenidos de los registros y guarda el resultado en la ALU
+        self.regs[rn] = self.alu # Copia el resultado de la ALU al registro Rn
+        return True # Devuelve verdadero
+
+    def sub(self, rn, rm):
+        # Resta los contenidos de los registros Rn y Rm y guarda el resultado en Rn
+        if rn < 0 or rn >= NUM_REGS or rm < 0 or rm >= NUM_REGS: # Comprueba si los números de los registros son válidos
+            return False # Devuelve falso si no lo son
+        self.alu = self.regs[rn] - self.regs[rm] # Resta los contenidos de los registros y guarda el resultado en la ALU
+        self.regs[rn] = self.alu # Copia el resultado de la ALU al registro Rn
+        return True # Devuelve verdadero
+
+    def and_(self, rn, rm):
+        # Realiza la operación lógica AND entre los contenidos de los registros Rn y Rm y guarda el resultado en Rn
+        if rn < 0 or rn >= NUM_REGS or rm < 0 or rm >= NUM_REGS: # Comprueba si los números de los registros son válidos
+            return False # Devuelve falso si no lo son
+        self.alu = self.regs[rn] & self.regs[rm] # Realiza la operación lógica AND y guarda el resultado en la ALU
+        self.regs[rn] = self.alu # Copia el resultado de la ALU al registro Rn
+        return True # Devuelve verdadero
+
+    def or_(self, rn, rm):
+        # Realiza la operación lógica OR entre los contenidos de los registros Rn y Rm y guarda el resultado en Rn
+        if rn < 0 or rn >= NUM_REGS or rm < 0 or rm >= NUM_REGS: # Comprueba si los números de los registros son válidos
+            return False # Devuelve falso si no lo son
+        self.alu = self.regs[rn] | self.regs[rm] # Realiza la operación lógica OR y guarda el resultado en la ALU
+        self.regs[rn] = self.alu # Copia el resultado de la ALU al registro Rn
+        return True # Devuelve verdadero
+
+    def xor(self, rn, rm):
+        # Realiza la operación lógica XOR entre los contenidos de los registros Rn y Rm y guarda el resultado en Rn
+        if rn < 0 or rn >= NUM_REGS or rm < 0 or rm >= NUM_REGS: # Comprueba si los números de los registros son válidos
+            return False # Devuelve falso si no lo son
+        self.alu = self.regs[rn] ^ self.regs[rm] # Realiza la operación lógica XOR y guarda el resultado en la ALU
+        self.regs[rn] = self.alu # Copia el resultado de la ALU al registro Rn
+        return True # Devuelve verdadero
+
+    def not_(self, rn):
+        # Realiza la operación lógica NOT sobre el contenido del registro Rn y guarda el resultado en Rn
+        if rn < 0 or rn >= NUM_REGS: # Comprueba si el número del registro es válido
+            return False # Devuelve falso si no lo es
+        self.alu = ~self.regs[rn] # Realiza la operación lógica NOT y guarda el resultado en la ALU
+        self.regs[rn] = self.alu # Copia el resultado de la ALU al registro Rn
+        return True # Devuelve verdadero
+
+    def mov(self, rn, rm):
+        # Copia el contenido del registro Rm al registro Rn
+        if rn < 0 or rn >= NUM_REGS or rm < 0 or rm >= NUM_REGS: # Comprueba si los números de los registros son válidos
+            return False # Devuelve falso si no lo son
+        self.alu = self.regs[rm] # Copia el contenido del registro Rm a la ALU
+        self.regs[rn] = self.alu # Copia el contenido de la ALU al registro Rn
+        return True # Devuelve verdadero
+
+    def ldr(self, rn, dir):
+        # Carga el contenido de la dirección de memoria dir al registro Rn
+        if rn < 0 or rn >= NUM_REGS or dir < 0 or dir +4 > self.mem_dat.size: # Comprueba si el número del registro y la dirección de memoria son válidos
+            return False # Devuelve falso si no lo son
+        self.mar = dir # Copia la dirección de memoria al MAR
+        self.bus_dir = self.mar # Copia el contenido del MAR al bus de direcciones
+        self.mbr = self.read_mem(self.bus_dir) # Lee el contenido de la memoria de datos en la dirección indicada por el bus de direcciones y lo guarda en el MBR
+        if self.mbr == None: # Comprueba si hubo un error al leer la memoria
+            return False # Devuelve falso si lo hubo
+        self.bus_dat = self.mbr # Copia el contenido del MBR al bus de datos
+        self.bus_int = self.bus_dat # Copia el contenido del bus de datos al bus interno
+        self.alu = self.bus_int # Copia el contenido del bus interno a la ALU
+        self.regs[rn] = self.alu # Copia el contenido de la ALU al registro Rn
+        return True # Devuelve verdadero
+
+    def str(self, rn, dir):
+        # Almacena el contenido del registro Rn en la dirección de memoria dir
+        if rn < 0 or rn >= NUM_REGS or dir < 0 or dir +4 > self.mem_dat.size: # Comprueba si el número del registro y la dirección de memoria son válidos
+            return False # Devuelve falso si no lo son
+        self.alu = self.regs[rn] # Copia el contenido del registro Rn a la ALU
+        self.bus_int = self.alu # Copia el contenido de la ALU al bus interno
+        self.bus_dat = self.bus_int # Copia el contenido del bus interno al bus de datos
+        self.mbr = self.bus_dat # Copia el contenido del bus de datos al MBR
+        self.mar = dir # Copia la dirección de memoria al MAR
+        self.bus_dir = self.mar # Copia el contenido del MAR al bus de direcciones
+        if not self.write_mem(self.bus_dir, self.mbr): # Escribe el contenido del MBR en la memoria de datos en la dirección indicada por el bus de direcciones
+            return False # Devuelve falso si hubo un error al escribir la memoria
+        return True # Devuelve verdadero
+
+    def jmp(self, dir):
+        # Salta a la dirección de memoria dir
+        if dir < 0 or dir +4 > self.mem_dat.size: # Comprueba si la dirección de memoria es válida
+            return False # Devuelve falso si no lo es
+        self.alu = dir - self.base # Copia a la ALU la dirección de 16 bits de la instrucción, sin la base del segmento
+        self.bus_dir = dir # Copia la dirección de memoria al bus de direcciones
+        self.mar = self.bus_dir # Copia el contenido del bus de direcciones al MAR
+        self.cp = self.mar # Copia el contenido del MAR al CP
+        return True # Devuelve verdadero
+
+    def jz(self, dir):
+        # Salta a la dirección de memoria dir si el resultado de la última operación es cero
+        if dir < 0 or dir +4 > self.mem_dat.size: # Comprueba si la dirección de memoria es válida
+            return False # Devuelve falso si no lo es
+        if self.alu == 0: # Comprueba si el resultado de la última operación es cero
+            self.bus_dir = dir # Copia la dirección de memoria al bus de direcciones
+            self.mar = self.bus_dir # Copia el contenido del bus de direcciones al MAR
+            self.cp = self.mar # Copia el contenido del MAR al CP
+        return True # Devuelve verdadero
+
+    def jn(self, dir):
+        # Salta a la dirección de memoria dir si el resultado de la última operación es negativo
+        if dir < 0 or dir +4 > self.mem_dat.size: # Comprueba si la dirección de memoria es válida
+            return False # Devuelve falso si no lo es
+        if self.alu < 0: # Comprueba si el resultado de la última operación es negativo
+            self.bus_dir = dir # Copia la dirección de memoria al bus de direcciones
+            self.mar = self.bus_dir # Copia el contenido del bus de direcciones al MAR
+            # Copia el contenido del bus de direcciones al MAR
+            self.cp = self.mar # Copia el contenido del MAR al CP
+        return True # Devuelve verdadero
+
+    def in_(self, rn):
+        # Lee un dato de entrada y lo guarda en el registro Rn
+        if rn < 0 or rn  >= NUM_REGS: # Comprueba si el número del registro es válido
+            return False # Devuelve falso si no lo es
+        try:
+            self.alu = int(self.input_port()) # Lee un dato de entrada y lo convierte a entero
+        except BlockingIOError: # Si el puerto todavía no tiene datos
+            return self.wait_input() # Deja el procesador esperando
+        except (ValueError, EOFError): # Captura el error si el dato no es válido o no quedan datos
+            return False # Devuelve falso si lo hay
+        self.bus_int = self.alu # Copia el contenido de la ALU al bus interno
+        self.regs[rn] = self.bus_int # Copia el contenido del bus interno al registro Rn
+        return True # Devuelve verdadero
+
+    def out(self, rn):
+        # Escribe el contenido del registro Rn en la salida
+        if rn < 0 or rn >= NUM_REGS: # Comprueba si el número del registro es válido
+            return False # Devuelve falso si no lo es
+        self.alu = self.regs[rn] # Copia el contenido del registro Rn a la ALU
+        self.bus_int = self.alu # Copia el contenido de la ALU al bus interno
+        self.output_port(self.bus_int) # Escribe el contenido del bus interno en la salida
+        return True # Devuelve verdadero
+
+    def halt(self):
+        # Detiene la ejecución del programa
+        self.alu = 0 # Resetea el valor de la ALU
+        self.uc = 1 # Cambia el estado del procesador a detenido
+        return True # Devuelve verdadero
+
+    # Definimos las versiones de las operaciones para el nivel "functional"
+    # Hacen las mismas comprobaciones y dejan el mismo resultado, pero sin pasar los datos por el MAR, el MBR ni los buses
+
+    def ldr_functional(self, rn, dir):
+        # Carga el contenido de la dirección de memoria dir al registro Rn
+        if rn < 0 or rn >= NUM_REGS or dir < 0 or dir +4 > self.mem_dat.size: # Comprueba si el número del registro y la dirección de memoria son válidos
+            return False # Devuelve falso si no lo son
+        self.alu = self.mem_dat.read_word(dir) # Lee la memoria de datos y guarda el dato en la ALU
+        self.regs[rn] = self.alu # Copia el contenido de la ALU al registro Rn
+        return True # Devuelve verdadero
+
+    def str_functional(self, rn, dir):
+        # Almacena el contenido del registro Rn en la dirección de memoria dir
+        if rn < 0 or rn >= NUM_REGS or dir < 0 or dir +4 > self.mem_dat.size: # Comprueba si el número del registro y la dirección de memoria son válidos
+            return False # Devuelve falso si no lo son
+        self.alu = self.regs[rn] # Copia el contenido del registro Rn a la ALU
+        return self.write_mem(dir, self.alu) # Escribe el contenido de la ALU en la memoria de datos
+
+    def jmp_functional(self, dir):
+        # Salta a la dirección de memoria dir
+        if dir < 0 or dir +4 > self.mem_dat.size: # Comprueba si la dirección de memoria es válida
+            return False # Devuelve falso si no lo es
+        self.alu = dir - self.base # Copia a la ALU la dirección de 16 bits de la instrucción, sin la base del segmento
+        self.cp = dir # Copia la dirección de memoria al CP
+        return True # Devuelve verdadero
+
+    def jz_functional(self, dir):
+        # Salta a la dirección de memoria dir si el resultado de la última operación es cero
+        if dir < 0 or dir +4 > self.mem_dat.size: # Comprueba si la dirección de memoria es válida
+            return False # Devuelve falso si no lo es
+        if self.alu == 0: # Comprueba si el resultado de la última operación es cero
+            self.cp = dir # Copia la dirección de memoria al CP
+        return True # Devuelve verdadero
+
+    def jn_functional(self, dir):
+        # Salta a la dirección de memoria dir si el resultado de la última operación es negativo
+        if dir < 0 or dir +4 > self.mem_dat.size: # Comprueba si la dirección de memoria es válida
+            return False # Devuelve falso si no lo es
+        if self.alu < 0: # Comprueba si el resultado de la última operación es negativo
+            self.cp = dir # Copia la dirección de memoria al CP
+        return True # Devuelve verdadero
+
+    def in_functional(self, rn):
+        # Lee un dato de entrada y lo guarda en el registro Rn
+        if rn < 0 or rn >= NUM_REGS: # Comprueba si el número del registro es válido
+            return False # Devuelve falso si no lo es
+        try:
+            self.alu = int(self.input_port()) # Lee un dato de entrada y lo convierte a entero
+        except BlockingIOError: # Si el puerto todavía no tiene datos
+            return self.wait_input() # Deja el procesador esperando
+        except (ValueError, EOFError): # Captura el error si el dato no es válido o no quedan datos
+            return False # Devuelve falso si lo hay
+        self.regs[rn] = self.alu # Copia el contenido de la ALU al registro Rn
+        return True # Devuelve verdadero
+
+    def out_functional(self, rn):
+        # Escribe el contenido del registro Rn en la salida
+        if rn < 0 or rn >= NUM_REGS: # Comprueba si el número del registro es válido
+            return False # Devuelve falso si no lo es
+        self.alu = self.regs[rn] # Copia el contenido del registro Rn a la ALU
+        self.output_port(self.alu) # Escribe el contenido de la ALU en la salida
+        return True # Devuelve verdadero
+
+    # Definimos una función auxiliar que deja el procesador esperando datos de entrada
+    def wait_input(self):
+        # Vuelve a poner el CP en la instrucción IN y detiene el bucle con la UC en WAITING
+        self.cp -= 4 # La instrucción IN se repetirá al continuar
+        self.uc = WAITING # Cambia el estado del procesador a esperando entrada
+        return True # No es un error
+
+    # Definimos una función auxiliar que vacía el puerto de salida si guarda los datos en un búfer
+    def flush_output(self):
+        flush = getattr(self.output_port, "flush", None) # Los puertos con búfer tienen un método flush
+        if flush != None: # Si el puerto lo tiene
+            flush() # Escribe los datos pendientes
+
+    # Definimos una función auxiliar que lee una instrucción o un dato de 32 bits de la memoria de datos
+    def read_mem(self, dir):
+        # Recibe una dirección de memoria y devuelve una instrucción o un dato de 32 bits
+        # Usa la memoria de datos para leer el contenido
+        if dir < 0 or dir +4 > self.mem_dat.size: # Comprueba si la dirección de memoria es válida
+            return None # Devuelve None si no lo es
+        return self.mem_dat.read_word(dir) # Lee los 4 bytes consecutivos de la memoria de datos como un entero de 32 bits
+
+    # Definimos una función auxiliar que escribe una instrucción o un dato de 32 bits en la memoria de datos
+    def write_mem(self, dir, num):
+        # Recibe una dirección de memoria y una instrucción o un dato de 32 bits
+        # Usa la memoria de datos para escribir el contenido
+        if dir < 0 or dir +4 > self.mem_dat.size: # Comprueba si la dirección de memoria es válida
+            return False # Devuelve falso si no lo es
+        self.mem_dat.write_word(dir, num) # Escribe el entero en los 4 bytes consecutivos de la memoria de datos
+        low = dir - 3 - 4 * (FUSE_MAX - 1) if self.superinstructions else dir - 3 # Las superinstrucciones ocupan varias palabras
+        for i in range(low, dir + 4): # Recorre las direcciones de las instrucciones que contienen alguno de los bytes escritos
+            self.decode_cache.pop(i, None) # Descarta la instrucción decodificada si estaba en la caché
+        for i in range(dir, dir + 4): # Recorre los bytes escritos
+            starts = self.block_owners.pop(i, None) # Obtiene los bloques compilados que contienen el byte
+            if starts: # Si algún bloque lo contiene
+                for start in starts: # Recorre esos bloques
+                    self.block_cache.pop(start, None) # Descarta el bloque para que se vuelva a compilar
+        return True # Devuelve verdadero
+
+    # Definimos una función auxiliar que decodifica la instrucción de una dirección y la guarda en la caché
+    def decode(self, dir, fuse=True):
+        # Recibe la dirección de una instrucción y devuelve la tupla (ir, operación, operandos, nombre)
+        # Si están activas y fuse es verdadero, devuelve la superinstrucción que empiece en dir, si la hay
+        # Devuelve None si la dirección de memoria no es válida
+        ir = self.read_mem(dir) # Lee la instrucción de la memoria
+        if ir == None: # Comprueba si hubo un error al leer la memoria
+            return None # Devuelve None si lo hubo
+        if fuse and self.superinstructions and self.fidelity == "functional" and self.profile == None: # Si se usan superinstrucciones
+            entry = self.fuse(dir) # Busca una superinstrucción
+            if entry != None: # Si la hay
+                self.decode_cache[dir] = entry # La guarda en la caché
+                return entry # Devuelve la superinstrucción
         op = (ir & OP_MASK) >> 28 # Extrae el código de operación de la instrucción
-        rn = (ir & RN_MASK) >> 24 # Extrae el número del primer registro de la instrucción
-        rm = (ir & RM_MASK) >> 20 # Extrae el número del segundo registro de la instrucción
-        dir = ir & DIR_MASK # Extrae la dirección de memoria o el valor inmediato de la instrucción
-        if op == NOP: # Si el código de operación es NOP
-            if not nop(): # Ejecuta la operación NOP
-                print("Error: operación NOP inválida") # Imprime un mensaje de error si hay un error
-                break # Sale del bucle
-        elif op == ADD: # Si el código de operación es ADD
-            if not add(rn, rm): # Ejecuta la operación ADD
-                print("Error: operación ADD inválida") # Imprime un mensaje de error si hay un error
-                break # Sale del bucle
-        elif op == SUB: # Si el código de operación es SUB
-            if not sub(rn, rm): # Ejecuta la operación SUB
-                print("Error: operación SUB inválida") # Imprime un mensaje de error si hay un error
-                break # Sale del bucle
-        elif op == AND: # Si el código de operación es AND
-            if not and_(rn, rm): # Ejecuta la operación AND
-                print("Error: operación AND inválida") # Imprime un mensaje de error si hay un error
-                break # Sale del bucle
-        elif op == OR: # Si el código de operación es OR
-            if not or_(rn, rm): # Ejecuta la operación OR
-                print("Error: operación OR inválida") # Imprime un mensaje de error si hay un error
-                break # Sale del bucle
-        elif op == XOR: # Si el código de operación es XOR
-            if not xor(rn, rm): # Ejecuta la operación XOR
-                print("Error: operación XOR inválida") # Imprime un mensaje de error si hay un error
-                break # Sale del bucle
-        elif op == NOT: # Si el código de operación es NOT
-            if not not_(rn): # Ejecuta la operación NOT
-                print("Error: operación NOT inválida") # Imprime un mensaje de error si hay un error
-                break # Sale del bucle
-        elif op == MOV: # Si el código de operación es MOV
-            if not mov(rn, rm): # Ejecuta la operación MOV
-                print("Error: operación MOV inválida") # Imprime un mensaje de error si hay un error
-                break # Sale del bucle
-        elif op == LDR: # Si el código de operación es LDR
-            if not ldr(rn, dir): # Ejecuta la operación LDR
-                print("Error: operación LDR inválida") # Imprime un mensaje de error si hay un error
-                break # Sale del bucle
-        elif op == STR: # Si el código de operación es STR
-            if not str(rn, dir): # Ejecuta la operación STR
-                print("Error: operación STR inválida") # Imprime un mensaje de error si hay un error
-                break # Sale del bucle
-        elif op == JMP: # Si el código de operación es JMP
-            if not jmp(dir): # Ejecuta la operación JMP
-                print("Error: operación JMP inválida") # Imprime un mensaje de error si hay un error
-                break # Sale del bucle
-        elif op == JZ: # Si el código de operación es JZ
-            if not jz(dir): # Ejecuta la operación JZ
-                print("Error: operación JZ inválida") # Imprime un mensaje de error si hay un error
-                break # Sale del bucle
-        elif op == JN: # Si el código de operación es JN
-            if not jn(dir): # Ejecuta la operación JN
-                print("Error: operación JN inválida") # Imprime un mensaje de error si hay un error
-                break # Sale del bucle
-        elif op == IN: # Si el código de operación es IN
-            if not in_(rn): # Ejecuta la operación IN
-                print("Error: operación IN inválida") # Imprime un mensaje de error si hay un error
-                break # Sale del bucle
-        elif op == OUT: # Si el código de operación es OUT
-            if not out(rn): # Ejecuta la operación OUT
-                print("Error: operación OUT inválida") # Imprime un mensaje de error si hay un error
-                break # Sale del bucle
-        elif op == HALT: # Si el código de operación es HALT
-            if not halt(): # Ejecuta la operación HALT
-                print("Error: operación HALT inválida") # Imprime un mensaje de error si hay un error
+        fields = {
+            "n": (ir & RN_MASK) >> 24, # Extrae el número del primer registro de la instrucción
+            "m": (ir & RM_MASK) >> 20, # Extrae el número del segundo registro de la instrucción
+            "d": self.base + (ir & DIR_MASK), # Extrae la dirección de memoria de la instrucción y le suma la base del segmento
+        }
+        method, name, params = DISPATCH[op] # Busca la operación en la tabla de despacho
+        if self.fidelity == "functional": # En el nivel funcional se usan las versiones sin buses
+            method = FUNCTIONAL.get(method, method)
+        handler = getattr(self, method) # Obtiene el método de este procesador que realiza la operación
+        args = tuple(fields[p] for p in params) # Prepara los operandos en el orden que espera la operación
+        if self.profile != None: # Si el perfil está activo, la operación se cuenta cada vez que se ejecuta
+            handler = self.profile.wrap(self, dir, ir, name, handler, args)
+        entry = (ir, handler, args, name)
+        if fuse or not self.superinstructions: # step no sustituye la superinstrucción que pueda haber en la caché
+            self.decode_cache[dir] = entry # Guarda la instrucción decodificada en la caché
+        return entry # Devuelve la instrucción decodificada
+
+    # Definimos una función que genera la superinstrucción que empieza en una dirección
+    def fuse(self, dir):
+        # Devuelve la entrada (ir, bloque, (procesador,), nombre), o None si las instrucciones no forman ninguna
+        # El bloque devuelve el número de instrucciones que ejecuta, así el bucle las cuenta todas
+        words = [] # Instrucciones a partir de dir
+        for i in range(FUSE_MAX):
+            ir = self.read_mem(dir + 4 * i) # Lee la instrucción
+            if ir == None: # Si la dirección no es válida
+                break
+            words.append(ir)
+        ops = [(ir & OP_MASK) >> 28 for ir in words] # Códigos de operación
+        for pattern in SUPERINSTRUCTIONS: # Busca una superinstrucción que coincida
+            size = len(pattern)
+            if len(ops) >= size and all(op in group for op, group in zip(ops, pattern)):
+                block, end = self.generate_block(dir, size) # Genera el código de la secuencia
+                if end == dir + 4 * size: # Si todas las instrucciones son válidas y se han compilado
+                    name = "+".join(DISPATCH[op][1] for op in ops[:size]) # Nombre de la superinstrucción, por ejemplo SUB+JZ
+                    return (words[0], block, (self,), name)
+        return None
+
+    # Definimos una función que descarta las instrucciones decodificadas y los bloques compilados
+    def flush_caches(self):
+        # Se usa cuando cambia la memoria, el programa o la base del segmento
+        self.decode_cache.clear() # Descarta las instrucciones decodificadas
+        self.block_cache.clear() # Descarta los bloques compilados
+        self.block_owners.clear()
+
+    # Definimos una función que cambia la base del segmento
+    def set_base(self, dir):
+        # Recibe la dirección real a la que apuntará la dirección 0 de las instrucciones
+        self.base = dir # Cambia la base del segmento
+        self.flush_caches() # Las instrucciones decodificadas guardan direcciones reales, hay que decodificarlas de nuevo
+
+    # Definimos una función que activa o desactiva el perfil de ejecución
+    def set_profile(self, enabled=True):
+        # Al activarlo se empieza con los contadores a cero
+        # profiler.py se importa aquí para que importar cpu no cargue el perfil si no se usa
+        if enabled:
+            from profiler import Profile
+            self.profile = Profile()
+        else:
+            self.profile = None
+        self.flush_caches() # Las instrucciones se decodifican de nuevo con o sin contadores
+
+    # Definimos una función que cambia el tamaño o el tipo de la memoria
+    def configure_memory(self, size=MEM_SIZE, image=None, writable=False, offset=0):
+        # Recibe el tamaño de la memoria en bytes, que puede ser de varios GB
+        # Las memorias grandes se reservan por páginas a medida que se escriben
+        # Con image proyecta ese fichero como memoria de datos con mmap, sin leerlo ni copiarlo al arrancar
+        # Con writable=True las escrituras del programa se guardan en el fichero
+        # Con offset la memoria de datos empieza en esa posición del fichero
+        memory = make_memory(size, image, writable, offset) # Crea o proyecta la memoria de datos
+        self.close_memory() # Libera la proyección anterior, si la había
+        self.mem_sis = make_memory(size) # Crea la memoria de sistema
+        self.mem_dat = memory
+        self.set_base(0) # Vuelve a la base 0 y descarta las cachés
+
+    # Definimos una función auxiliar que cierra la memoria de datos si está proyectada desde un fichero
+    def close_memory(self):
+        # Se usa antes de sustituir la memoria de datos, para no dejar abiertos el fichero y la proyección
+        # Una memoria compartida con otros núcleos se cierra igual: todos pasan a usar la nueva (ver multicore.py)
+        memory = getattr(self, "mem_dat", None) # Al crear el procesador todavía no hay memoria
+        if isinstance(memory, MappedMemory):
+            memory.close()
+
+    # Definimos una función que devuelve el procesador a su estado inicial
+    def reset(self, size=None):
+        # Pone a cero los registros, los buses, la ALU, la UC, el CP y las memorias
+        # Con size cambia además el tamaño de la memoria
+        # Una memoria de datos proyectada desde un fichero no se borra, porque con writable=True se borraría el fichero:
+        # se cierra la proyección y se sustituye por una memoria privada a cero del mismo tamaño
+        self.alu = self.uc = self.mbr = self.cp = self.mar = self.ir = 0 # Resetea los componentes del procesador
+        self.bus_int = self.bus_dat = self.bus_dir = self.bus_con = 0 # Resetea los buses
+        self.regs[:] = [0] * NUM_REGS # Resetea los registros
+        self.cycles = 0 # Resetea el contador de instrucciones
+        self.error = None # Olvida el último error
+        if size != None: # Si se pide otro tamaño de memoria
+            self.configure_memory(size) # Crea las memorias nuevas
+        else:
+            self.mem_sis.clear() # Pone la memoria de sistema a cero
+            if isinstance(self.mem_dat, MappedMemory): # Si la memoria de datos está proyectada desde un fichero
+                size = self.mem_dat.size
+                self.close_memory() # Libera la proyección sin modificar el fichero
+                self.mem_dat = make_memory(size) # Usa una memoria nueva a cero
+            else:
+                self.mem_dat.clear() # Pone la memoria de datos a cero
+            self.set_base(0) # Vuelve a la base 0 y descarta las cachés
+
+    # Definimos una función que carga un programa en la memoria de sistema
+    def load_program(self, program, dir=0):
+        # Recibe una lista de instrucciones o datos de 32 bits, o una imagen de bytes ya codificada, y los carga en la memoria
+        # La imagen puede ser una imagen de programa con cabecera (ver image.py) o solo las palabras en little-endian
+        # Las instrucciones se cargan en la memoria de datos, que es de donde run_program las lee
+        # El programa se carga a partir de la dirección dir, que pasa a ser la base de su segmento
+        # Devuelve la dirección de inicio del programa o None si hay un error
+        entry = 0 # Dirección de inicio relativa a la base del segmento
+        if not isinstance(program, (bytes, bytearray, memoryview)): # Si el programa es una lista de palabras
+            program = pack_words(program) # Codifica todas las palabras en una imagen de bytes
+        elif is_image(program): # Si es una imagen de programa con cabecera
+            try:
+                program, entry = read_image(program) # Comprueba la cabecera y obtiene las secciones sin copiarlas
+            except ValueError: # Si la imagen no es válida
+                return None # Devuelve None
+        if dir < 0 or dir + len(program) > self.mem_dat.size: # Comprueba si el programa cabe en la memoria
+            return None # Devuelve None si no cabe
+        self.mem_dat.load(program, dir) # Copia la imagen del programa a la memoria de datos en un solo bloque
+        self.superinstructions = False # El programa nuevo no está comprobado por el optimizador
+        self.set_base(dir) # Las direcciones del programa son relativas al punto de carga
+        return dir + entry # Devuelve la dirección de inicio del programa
+
+    # Definimos una función que carga una imagen de programa desde un fichero
+    def load_image(self, path, mapped=False):
+        # Sin mapped lee el fichero y copia sus secciones a la memoria de datos en un solo bloque a partir de la dirección 0
+        # Con mapped=True la memoria de datos pasa a ser una proyección con mmap de las secciones del fichero:
+        # no se copia nada, su tamaño es el de las secciones y las escrituras del programa no modifican el fichero
+        # Devuelve la dirección de inicio del programa o None si la imagen no es válida
+        if not mapped: # Si se copia el programa a la memoria actual
+            with open(path, "rb") as file:
+                return self.load_program(file.read()) # Comprueba la imagen y la carga
+        try:
+            memory = make_memory(None, path, offset=HEADER.size) # Proyecta las secciones del fichero
+        except (OSError, ValueError): # Si el fichero no existe o está vacío
+            return None # Devuelve None
+        try:
+            body, entry = read_image(memory.map) # Comprueba la cabecera y la suma de comprobación
+        except ValueError: # Si la imagen no es válida
+            memory.close() # Libera la proyección
+            return None # Devuelve None
+        body.release() # La comprobación no necesita conservar la vista
+        self.close_memory() # Libera la proyección anterior, si la había
+        self.mem_dat = memory # Usa la proyección como memoria de datos
+        self.superinstructions = False # El programa nuevo no está comprobado por el optimizador
+        self.set_base(0) # Las direcciones del programa empiezan en 0 y hay que descartar las cachés
+        return entry # Devuelve la dirección de inicio del programa
+
+    # Definimos una función que guarda el estado completo del procesador
+    def snapshot(self):
+        # Guarda los registros, la ALU, el CP, la UC, los buses, las dos memorias y los datos pendientes de los puertos
+        # Las memorias paginadas no se copian: comparten las páginas hasta que se escriben (copy-on-write)
+        # Devuelve un Snapshot que se puede restaurar muchas veces con restore o guardar en un fichero con save
+        state = {field: getattr(self, field) for field in SNAPSHOT_FIELDS} # Componentes del procesador
+        state["regs"] = list(self.regs) # Copia de los registros
+        ports = tuple(getattr(port, "snapshot", lambda: None)() for port in (self.input_port, self.output_port))
+        caches = (dict(self.decode_cache), dict(self.block_cache), {i: set(s) for i, s in self.block_owners.items()})
+        from snapshot import Snapshot # Solo se importa al guardar el estado
+        return Snapshot(state, (self.mem_sis.size, self.mem_sis.snapshot()), (self.mem_dat.size, self.mem_dat.snapshot()),
+                        ports, caches, self)
+
+    # Definimos una función que vuelve al estado guardado por snapshot
+    def restore(self, snap):
+        # Recibe un Snapshot de este procesador o de otro, por ejemplo uno cargado de un fichero
+        # Los puertos se restauran solo si los actuales permiten restaurar su estado
+        for field in SNAPSHOT_FIELDS: # Restaura los componentes del procesador
+            setattr(self, field, snap.state[field])
+        self.regs = list(snap.state["regs"]) # Restaura los registros
+        self.mem_sis = self.restore_memory(self.mem_sis, snap.mem_sis) # Restaura las memorias
+        self.mem_dat = self.restore_memory(self.mem_dat, snap.mem_dat)
+        for port, state in zip((self.input_port, self.output_port), snap.ports): # Restaura los puertos
+            if state != None and hasattr(port, "restore"):
+                port.restore(state)
+        if snap.owner is self: # Las cachés guardadas corresponden a las memorias restauradas
+            decode, blocks, owners = snap.caches
+            self.decode_cache = dict(decode)
+            self.block_cache = dict(blocks)
+            self.block_owners = {i: set(s) for i, s in owners.items()}
+        else: # Las cachés de otro procesador no sirven
+            self.flush_caches()
+
+    # Definimos una función auxiliar que restaura una memoria
+    def restore_memory(self, memory, saved):
+        # Recibe la memoria actual y la tupla (tamaño, contenido) guardada
+        # Devuelve la memoria restaurada, que es nueva si la actual no tiene el mismo tamaño o tipo
+        size, state = saved
+        paged = isinstance(state, dict) # Las memorias paginadas se guardan como un diccionario de páginas
+        if memory.size != size or isinstance(memory, PagedMemory) != paged: # Si la memoria actual no sirve
+            if memory is self.mem_dat: # Libera la proyección que se sustituye, si la había
+                self.close_memory()
+            memory = PagedMemory(size) if paged else Memory(size) # Crea una nueva
+        memory.restore(state) # Copia el contenido guardado
+        return memory
+
+    # Definimos una función que anota un error de ejecución
+    def fail(self, message):
+        # Guarda el mensaje de error y lo imprime si verbose es verdadero
+        self.error = message # Guarda el mensaje de error
+        if self.verbose: # Si hay que informar en la salida
+            self.flush_output() # Escribe antes las salidas pendientes para conservar el orden
+            print(message) # Imprime el mensaje de error
+
+    # Definimos una función que ejecuta una sola instrucción del programa
+    def step(self):
+        # Realiza un ciclo de instrucción igual al del bucle de run
+        # Devuelve verdadero si la instrucción se ejecutó con éxito o falso si hubo un error
+        if self.fidelity == "functional": # En el nivel funcional no se usan el MAR, el MBR, el IR ni los buses
+            entry = self.decode_cache.get(self.cp) # Busca la instrucción ya decodificada
+            if entry == None or self.superinstructions: # Si no está en la caché o puede ser una superinstrucción
+                entry = self.decode(self.cp, False) # La lee de la memoria y la decodifica como una sola instrucción
+                if entry == None: # Comprueba si hubo un error al leer la memoria
+                    self.fail("Error: dirección de memoria inválida") # Anota el error
+                    return False # Devuelve falso
+            ir, handler, args, name = entry # Obtiene la operación y sus operandos
+            self.cp += 4 # Incrementa el CP en 4
+            if not handler(*args): # Ejecuta la operación a través de la tabla de despacho
+                self.fail(f"Error: operación {name} inválida") # Anota el error
+                return False # Devuelve falso
+            return True # Devuelve verdadero
+        self.mar = self.cp # Copia el CP al MAR
+        self.bus_dir = self.mar # Copia el MAR al bus de direcciones
+        entry = self.decode_cache.get(self.bus_dir) # Busca la instrucción ya decodificada
+        if entry == None: # Si la instrucción no está en la caché
+            entry = self.decode(self.bus_dir) # La lee de la memoria, la decodifica y la guarda en la caché
+            if entry == None: # Comprueba si hubo un error al leer la memoria
+                self.fail("Error: dirección de memoria inválida") # Anota el error
+                return False # Devuelve falso
+        self.mbr, handler, args, name = entry # Copia la instrucción al MBR y obtiene la operación y sus operandos
+        self.bus_dat = self.mbr # Copia el MBR al bus de datos
+        self.bus_int = self.bus_dat # Copia el bus de datos al bus interno
+        self.ir = self.bus_int # Copia el bus interno al IR
+        self.cp += 4 # Incrementa el CP en 4
+        if not handler(*args): # Ejecuta la operación a través de la tabla de despacho
+            self.fail(f"Error: operación {name} inválida") # Anota el error
+            return False # Devuelve falso
+        return True # Devuelve verdadero
+
+    # Definimos una función que compila el bloque básico que empieza en una dirección
+    def compile_block(self, start):
+        # Genera la función del bloque y la guarda en la caché de bloques
+        # Devuelve la función del bloque, o CPU.step si la primera instrucción no se puede compilar
+        block, end = self.generate_block(start) # Genera el bloque
+        if block == None: # Si la dirección no es válida no se guarda nada en la caché
+            return CPU.step # Devuelve step para que informe del error
+        self.block_cache[start] = block # Guarda el bloque en la caché
+        for i in range(start, max(end, start + 4)): # Anota los bytes que cubre el bloque
+            self.block_owners.setdefault(i, set()).add(start)
+        return block # Devuelve el bloque
+
+    # Definimos una función que genera el código de un bloque de instrucciones
+    def generate_block(self, start, count=BLOCK_MAX):
+        # Recorre las instrucciones desde start hasta encontrar JMP, JZ, JN, HALT, IN u OUT
+        # Genera una única función de Python que ejecuta el bloque con variables locales
+        # y solo copia los registros, la ALU y el CP al procesador al salir del bloque
+        # Las instrucciones IN y OUT y las instrucciones inválidas no se compilan: el bloque termina justo antes
+        # Los bloques tienen como mucho count instrucciones
+        # La función del bloque recibe el procesador y devuelve el número de instrucciones que ejecutó
+        # Devuelve la tupla (función del bloque, dirección siguiente al bloque)
+        # La función es CPU.step si la primera instrucción no se puede compilar, o None si su dirección no es válida
+        body = [] # Líneas de código del cuerpo del bloque
+        used = set() # Registros que usa el bloque
+        written = set() # Registros que modifica el bloque
+        stores = [] # Direcciones escritas por las instrucciones STR del bloque
+        exits = None # Código de salida del bloque
+        last = None # Tupla (dirección, ir, operación, dirección de datos) de la última instrucción del bloque
+        size = self.mem_dat.size # Tamaño de la memoria
+        dir = start # Dirección de la instrucción actual
+        while dir - start < 4 * count: # Mientras el bloque no llegue al tamaño máximo
+            if any(d < dir + 4 and dir < d + 4 for d in stores): # Comprueba si un STR anterior del bloque modifica esta instrucción
+                break # Termina el bloque antes para que la instrucción se lea ya modificada
+            ir = self.read_mem(dir) # Lee la instrucción de la memoria
+            if ir == None: # Comprueba si la dirección de memoria es válida
+                break # Termina el bloque si no lo es
+            op = (ir & OP_MASK) >> 28 # Extrae el código de operación de la instrucción
+            rn = (ir & RN_MASK) >> 24 # Extrae el número del primer registro de la instrucción
+            rm = (ir & RM_MASK) >> 20 # Extrae el número del segundo registro de la instrucción
+            d = self.base + (ir & DIR_MASK) # Extrae la dirección de memoria de la instrucción y le suma la base del segmento
+            if op in BLOCK_OPS: # Si es una operación que no cambia el flujo del programa
+                regs_op = {NOP: (), NOT: (rn,), LDR: (rn,), STR: (rn,)}.get(op, (rn, rm)) # Registros que usa la operación
+                if any(r >= NUM_REGS for r in regs_op): # Comprueba si los números de los registros son válidos
+                    break # Termina el bloque antes para que la instrucción falle en el intérprete
+                if op in (LDR, STR) and d + 4 > size: # Comprueba si la dirección de memoria es válida
+                    break # Termina el bloque antes para que la instrucción falle en el intérprete
+                body.append(BLOCK_OPS[op].format(n=rn, m=rm, d=d)) # Traduce la instrucción a Python
+                used.update(regs_op) # Anota los registros usados
+                if op == STR: # Si la instrucción escribe en la memoria
+                    stores.append(d) # Anota la dirección escrita
+                elif op != NOP: # Si la instrucción escribe en un registro
+                    written.add(rn) # Anota el registro modificado
+                last = (dir, ir, op, d) # Anota la instrucción como la última del bloque
+                dir += 4 # Pasa a la siguiente instrucción
+                continue
+            if op in (JMP, JZ, JN) and d + 4 > size: # Comprueba si la dirección de salto es válida
+                break # Termina el bloque antes para que la instrucción falle en el intérprete
+            if op == JMP: # Salto incondicional: la ALU guarda la dirección de destino sin la base del segmento
+                body.append(f"a = {d - self.base}")
+                exits = [("", d)]
+            elif op == JZ: # Salto si el resultado de la última operación es cero
+                exits = [("a == 0", d), ("", dir + 4)]
+            elif op == JN: # Salto si el resultado de la última operación es negativo
+                exits = [("a < 0", d), ("", dir + 4)]
+            elif op == HALT: # Detiene el procesador: la ALU se resetea
+                body.append("a = 0")
+                body.append("cpu.uc = 1")
+                exits = [("", dir + 4)]
+            else: # IN y OUT se ejecutan en el intérprete
+                break
+            last = (dir, ir, op, d) # El salto o la parada es la última instrucción del bloque
+            dir += 4 # El bloque incluye la instrucción de salto o de parada
+            break
+        if dir == start: # Si no se pudo compilar ninguna instrucción
+            if self.read_mem(start) == None: # Si la dirección no es válida
+                return None, start
+            block = CPU.step # La instrucción se ejecutará en el intérprete
+        else:
+            if exits == None: # Si el bloque termina antes de IN, OUT o una instrucción inválida
+                exits = [("", dir)] # Continúa en la instrucción siguiente
+            lines = ["def block(cpu):"]
+            lines.append("    regs = cpu.regs")
+            for r in sorted(used): # Copia los registros usados a variables locales
+                lines.append(f"    r{r} = regs[{r}]")
+            lines.append("    a = cpu.alu") # Copia la ALU a una variable local
+            lines.append("    read_word = cpu.mem_dat.read_word") # Las direcciones ya están comprobadas, se lee la memoria directamente
+            lines.append("    write_mem = cpu.write_mem")
+            lines.extend("    " + line for line in body)
+            writeback = [f"regs[{r}] = r{r}" for r in sorted(written)] + ["cpu.alu = a"] # Copia el estado local al procesador
+            for cond, target in exits: # Genera las salidas del bloque
+                indent = "    "
+                if cond: # Si la salida es condicional
+                    lines.append(f"    if {cond}:")
+                    indent = "        "
+                lines.extend(indent + line for line in writeback)
+                if self.fidelity == "microarch": # Los registros de búsqueda y los buses quedan como en el intérprete
+                    lines.extend(indent + line for line in self.fetch_writeback(last, bool(cond)))
+                lines.append(f"{indent}cpu.cp = {target}")
+                lines.append(f"{indent}return {(dir - start) // 4}")
+            source = "\n".join(lines)
+            block = block_code.pop(source, None) # Reutiliza la función si otro procesador ya compiló el mismo bloque
+            if block == None: # Si no, la crea
+                namespace = {}
+                exec(source, namespace) # Crea la función del bloque
+                block = namespace["block"]
+                if len(block_code) >= BLOCK_CODE_MAX: # Si la caché está llena
+                    del block_code[next(iter(block_code))] # Descarta la función usada hace más tiempo
+            block_code[source] = block # La guarda al final, como la usada más recientemente
+        return block, dir # Devuelve el bloque y su final
+
+    # Definimos una función auxiliar que genera la copia de los registros de búsqueda y los buses al salir de un bloque
+    def fetch_writeback(self, last, taken):
+        # Recibe la última instrucción del bloque y si la salida es la de un salto condicional tomado
+        # Devuelve las líneas que dejan el MAR, el MBR, el IR y los buses igual que el intérprete "microarch":
+        # la búsqueda de la última instrucción los escribe todos y después su operación cambia algunos
+        dir, ir, op, d = last
+        address, data = dir, ir # La búsqueda copia la dirección de la instrucción al MAR y la instrucción al MBR
+        if op in (LDR, STR): # LDR y STR pasan por el MAR la dirección de datos y por el MBR el dato, que queda en la ALU
+            address, data = d, "a"
+        elif op == JMP or taken: # Los saltos tomados copian su destino al MAR
+            address = d
+        return [f"cpu.mar = cpu.bus_dir = {address}", f"cpu.mbr = cpu.bus_dat = cpu.bus_int = {data}", f"cpu.ir = {ir}"]
+
+    # Definimos una función que ejecuta el programa con el motor de bloques compilados
+    def run_blocks(self, limit):
+        # Ejecuta cada bloque básico con una sola llamada a la función generada para él
+        # Los bloques se compilan la primera vez que se alcanzan y se guardan en la caché
+        # Se detiene después de limit instrucciones y devuelve el número de instrucciones ejecutadas
+        n = 0 # Instrucciones ejecutadas
+        cache = self.block_cache # Referencia local a la caché de bloques
+        while self.uc == 0 and n < limit - BLOCK_MAX: # Mientras ningún bloque pueda pasarse del límite
+            block = cache.get(self.cp) # Busca el bloque que empieza en el CP
+            if block == None: # Si el bloque no está compilado
+                block = self.compile_block(self.cp) # Lo compila y lo guarda en la caché
+            count = block(self) # Ejecuta el bloque
+            if not count: # Si hubo un error
+                return n # Sale sin ejecutar nada más
+            n += count # Cuenta las instrucciones del bloque
+        while self.uc == 0 and n < limit: # Cerca del límite se ejecuta instrucción a instrucción
+            if not self.step(): # Si hubo un error
                 break # Sale del bucle
-        else: # Si el código de operación no es válido
-            print("Error: código de operación inválido") # Imprime un mensaje de error
-            break # Sale del bucle
-    print("Estado final del procesador y los registros:") # Imprime el estado final del procesador y los registros
-    print("ALU:", alu) # Imprime el valor de la ALU
-    print("UC:", uc) # Imprime el valor de la UC
-    print("MBR:", mbr) # Imprime el valor del MBR
-    print("CP:", cp) # Imprime el valor del CP
-    print("MAR:", mar) # Imprime el valor del MAR
-    print("IR:", ir) # Imprime el valor del IR
-    for i in range(NUM_REGS): # Recorre los registros
-        print(f"R{i}:", regs[i])
+            n += 1 # Cuenta la instrucción
+        return n # Devuelve el número de instrucciones ejecutadas
+
+    # Definimos una función que ejecuta el programa cargado en la memoria de sistema
+    def run(self, max_cycles=None, engine="interp"):
+        # Ejecuta el programa cargado en la memoria de sistema
+        # Usa un bucle que simula el ciclo de instrucción
+        # Con engine="blocks" usa el motor que compila los bloques básicos a funciones de Python
+        # Con max_cycles se detiene tras ese número de instrucciones; se puede continuar llamando otra vez a run
+        # El nivel de fidelidad elegido al crear el procesador decide si se simulan las transferencias por los buses
+        # Con el perfil activo se usa siempre el intérprete y se mide el tiempo de ejecución
+        # Si una instrucción IN dejó el procesador esperando datos, la vuelve a intentar
+        # Devuelve el número de instrucciones ejecutadas
+        if self.uc == WAITING: # Si estaba esperando datos de entrada
+            self.uc = 0 # Vuelve a ejecutar
+        limit = sys.maxsize if max_cycles == None else max_cycles # Número máximo de instrucciones
+        profile = self.profile
+        if profile != None: # Si el perfil está activo
+            start = time.perf_counter() # Empieza a medir el tiempo
+        if engine == "blocks" and profile == None: # Si se pidió el motor de bloques
+            n = self.run_blocks(limit) # Ejecuta el programa por bloques
+        elif self.fidelity == "functional": # Intérprete sin las transferencias entre el MAR, el MBR, el IR y los buses
+            # Cada operación devuelve cuántas instrucciones ejecutó: 1 (verdadero), o más si es una superinstrucción
+            # Con superinstrucciones el bucle se detiene a FUSE_MAX instrucciones del límite y acaba con step
+            cache = self.decode_cache # Referencia local a la caché de instrucciones decodificadas
+            stop = limit - FUSE_MAX if self.superinstructions else limit # Límite para el bucle principal
+            failed = False # Si es verdadero, el programa falló
+            n = 0 # Instrucciones ejecutadas
+            while self.uc == 0 and n < stop: # Mientras el procesador esté ejecutando y no se llegue al límite
+                cp = self.cp # Dirección de la instrucción
+                entry = cache.get(cp) # Busca la instrucción ya decodificada
+                if entry == None: # Si la instrucción no está en la caché
+                    entry = self.decode(cp) # La lee de la memoria, la decodifica y la guarda en la caché
+                    if entry == None: # Comprueba si hubo un error al leer la memoria
+                        self.fail("Error: dirección de memoria inválida") # Anota el error
+                        break # Sale del bucle
+                ir, handler, args, name = entry # Obtiene la operación y sus operandos ya decodificados
+                self.cp = cp + 4 # Incrementa el CP en 4
+                count = handler(*args) # Ejecuta la operación a través de la tabla de despacho
+                if not count: # Comprueba si hubo un error
+                    self.fail(f"Error: operación {name} inválida") # Anota el error
+                    failed = True
+                    break # Sale del bucle
+                n += count # Cuenta las instrucciones
+            while self.superinstructions and not failed and self.uc == 0 and n < limit: # Cerca del límite, instrucción a instrucción
+                if not self.step(): # Si hubo un error
+                    break # Sale del bucle
+                n += 1 # Cuenta la instrucción
+        else: # Si no, usa el intérprete instrucción a instrucción con el recorrido completo por los buses
+            cache = self.decode_cache # Referencia local a la caché de instrucciones decodificadas
+            n = 0 # Instrucciones ejecutadas
+            while self.uc == 0 and n < limit: # Mientras el procesador esté ejecutando y no se llegue al límite
+                self.mar = self.cp # Copia el CP al MAR
+                self.bus_dir = self.mar # Copia el MAR al bus de direcciones
+                entry = cache.get(self.bus_dir) # Busca la instrucción ya decodificada en la dirección indicada por el bus de direcciones
+                if entry == None: # Si la instrucción no está en la caché
+                    entry = self.decode(self.bus_dir) # La lee de la memoria, la decodifica y la guarda en la caché
+                    if entry == None: # Comprueba si hubo un error al leer la memoria
+                        self.fail("Error: dirección de memoria inválida") # Anota el error
+                        break # Sale del bucle
+                self.mbr, handler, args, name = entry # Copia la instrucción al MBR y obtiene la operación y sus operandos ya decodificados
+                self.bus_dat = self.mbr # Copia el MBR al bus de datos
+                self.bus_int = self.bus_dat # Copia el bus de datos al bus interno
+                self.ir = self.bus_int # Copia el bus interno al IR
+                self.cp += 4 # Incrementa el CP en 4
+                if not handler(*args): # Ejecuta la operación a través de la tabla de despacho
+                    self.fail(f"Error: operación {name} inválida") # Anota el error
+                    break # Sale del bucle
+                n += 1 # Cuenta la instrucción
+        if self.uc == WAITING: # La instrucción IN que espera datos no se ha ejecutado todavía
+            n -= 1 # No la cuenta
+        if profile != None: # Si el perfil está activo
+            profile.seconds += time.perf_counter() - start # Acumula el tiempo de ejecución
+        self.cycles += n # Acumula las instrucciones ejecutadas
+        return n # Devuelve el número de instrucciones ejecutadas
+
+    # Definimos una función que ejecuta el programa e informa del estado final
+    def run_program(self, engine="interp", max_cycles=None, record=None, replay_from=None, interval=None):
+        # Igual que run, pero imprime el estado final del procesador y los registros si verbose es verdadero
+        # Con record=ruta graba en ese fichero una traza con los valores leídos por IN
+        # y una copia del estado cada interval instrucciones, por defecto replay.INTERVAL (ver replay.py)
+        # Con replay_from=ruta repite la ejecución grabada en esa traza, sin leer la entrada del puerto
+        if record != None: # Si hay que grabar la ejecución
+            from replay import INTERVAL, Trace # Solo se importa al grabar o repetir una ejecución
+            trace = Trace(INTERVAL if interval == None else interval)
+            try:
+                n = trace.record(self, engine, max_cycles) # Ejecuta el programa anotando las entradas
+            finally:
+                trace.save(record) # Guarda la traza aunque la ejecución se interrumpa
+        elif replay_from != None: # Si hay que repetir una ejecución grabada
+            from replay import load
+            n = load(replay_from).replay(self, engine, max_cycles)
+        else:
+            n = self.run(max_cycles, engine) # Ejecuta el programa
+        self.flush_output() # Escribe las salidas pendientes
+        if self.verbose: # Si hay que informar en la salida
+            self.print_state() # Imprime el estado final del procesador y los registros
+        return n # Devuelve el número de instrucciones ejecutadas
+
+    # Definimos una función que imprime el estado del procesador y los registros
+    def print_state(self):
+        print("Estado final del procesador y los registros:") # Imprime el estado final del procesador y los registros
+        print("ALU:", self.alu) # Imprime el valor de la ALU
+        print("UC:", self.uc) # Imprime el valor de la UC
+        print("MBR:", self.mbr) # Imprime el valor del MBR
+        print("CP:", self.cp) # Imprime el valor del CP
+        print("MAR:", self.mar) # Imprime el valor del MAR
+        print("IR:", self.ir) # Imprime el valor del IR
+        for i in range(NUM_REGS): # Recorre los registros
+            print(f"R{i}:", self.regs[i])
 
 
 # Definimos un ejemplo de programa que suma dos números de entrada y escribe el resultado en la salida
 
+# Cada instrucción se codifica como una palabra de 32 bits; assembler.py genera lo mismo a partir de texto
 program = [
-    IN, 0, # Lee el primer número y lo guarda en el registro R0
-    IN, 1, # Lee el segundo número y lo guarda en el registro R1
-    ADD, 0, 1, # Suma los contenidos de los registros R0 y R1 y guarda el resultado en R0
-    OUT, 0, # Escribe el contenido del registro R0 en la salida
-    HALT # Detiene la ejecución del programa
+    encode(IN, 0), # Lee el primer número y lo guarda en el registro R0
+    encode(IN, 1), # Lee el segundo número y lo guarda en el registro R1
+    encode(ADD, 0, 1), # Suma los contenidos de los registros R0 y R1 y guarda el resultado en R0
+    encode(OUT, 0), # Escribe el contenido del registro R0 en la salida
+    encode(HALT), # Detiene la ejecución del programa
 ]
 
-# Cargamos el programa en la memoria de sistema
-start = load_program(program)
-if start == None: # Comprueba si hubo un error al cargar el programa
-    print("Error: el programa no se pudo cargar en la memoria de sistema") # Imprime un mensaje de error
-else: # Si no hubo error
-    cp = start # Asigna la dirección de inicio del programa al CP
-    run_program() # Ejecuta el programa
\ No newline at end of file
+# Cuando se ejecuta como script, cargamos el programa en la memoria de sistema y lo ejecutamos
+# Importar el módulo no ejecuta nada
+if __name__ == "__main__":
+    cpu = CPU() # Crea el procesador
+    start = cpu.load_program(program)
+    if start == None: # Comprueba si hubo un error al cargar el programa
+        print("Error: el programa no se pudo cargar en la memoria de sistema") # Imprime un mensaje de error
+    else: # Si no hubo error
+        cpu.cp = start # Asigna la dirección de inicio del programa al CP
+        cpu.run_program() # Ejecuta el programa
\ No newline at end of file
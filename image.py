@@ -0,0 +1,51 @@
+# Importamos el módulo struct para leer y escribir la cabecera de la imagen
+import struct
+# Importamos zlib para calcular la suma de comprobación CRC-32
+import zlib
+
+# Definimos el formato de las imágenes binarias de programa
+# Una imagen es una cabecera seguida de la sección de código y de la sección de datos
+# La cabecera guarda, en little-endian:
+#   magic      4 bytes  b"CPUI"
+#   version    2 bytes  versión del formato
+#   flags      2 bytes  reservado, siempre 0
+#   code_size  4 bytes  bytes de la sección de código
+#   data_size  4 bytes  bytes de la sección de datos
+#   entry      4 bytes  dirección de inicio, relativa al principio de la sección de código
+#   checksum   4 bytes  CRC-32 de las dos secciones
+# Las secciones se cargan juntas a partir de la base del segmento, primero el código y después los datos
+HEADER = struct.Struct("<4sHHIIII")
+MAGIC = b"CPUI"
+VERSION = 1
+
+
+# Definimos una función que construye una imagen a partir de sus secciones
+def build_image(code, data=b"", entry=0):
+    # Recibe los bytes de las secciones de código y de datos y la dirección de inicio
+    # Devuelve los bytes de la imagen completa
+    body = bytes(code) + bytes(data) # Junta las dos secciones
+    header = HEADER.pack(MAGIC, VERSION, 0, len(code), len(data), entry, zlib.crc32(body))
+    return header + body # Devuelve la cabecera seguida de las secciones
+
+# Definimos una función que comprueba si unos bytes empiezan como una imagen
+def is_image(buffer):
+    return bytes(buffer[:len(MAGIC)]) == MAGIC
+
+# Definimos una función que lee la cabecera de una imagen y comprueba su contenido
+def read_image(buffer):
+    # Recibe los bytes de la imagen (bytes, bytearray, memoryview o mmap)
+    # Devuelve la tupla (secciones, dirección de inicio), con las secciones como una vista sin copia
+    # Lanza ValueError si la imagen no es válida
+    if len(buffer) < HEADER.size: # Comprueba si la imagen tiene cabecera
+        raise ValueError("la imagen es demasiado corta")
+    magic, version, flags, code_size, data_size, entry, checksum = HEADER.unpack_from(buffer)
+    if magic != MAGIC: # Comprueba si es una imagen de programa
+        raise ValueError("el fichero no es una imagen de programa")
+    if version != VERSION: # Comprueba si la versión es compatible
+        raise ValueError(f"versión de imagen no soportada: {version}")
+    body = memoryview(buffer)[HEADER.size:] # Vista de las secciones sin copiarlas
+    if len(body) != code_size + data_size: # Comprueba si las secciones están completas
+        raise ValueError("el tamaño de la imagen no coincide con su cabecera")
+    if zlib.crc32(body) != checksum: # Comprueba si las secciones están intactas
+        raise ValueError("la suma de comprobación de la imagen no es correcta")
+    return body, entry # Devuelve las secciones y la dirección de inicio
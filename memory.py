@@ -0,0 +1,196 @@
+# Importamos el módulo mmap para proyectar ficheros de imagen directamente en la memoria
+import mmap
+# Importamos el módulo struct para leer y escribir palabras de 32 bits directamente sobre los bytes de la memoria
+import struct
+
+# Definimos los formatos de las palabras de 32 bits
+# Usan el orden de bytes little-endian, es decir, el byte menos significativo está en la dirección más baja
+WORD = struct.Struct("<i") # Palabra con signo en complemento a dos, para leer
+UWORD = struct.Struct("<I") # Palabra sin signo, para escribir los 32 bits menos significativos de cualquier entero
+WORD_MASK = 0xFFFFFFFF # Máscara de los 32 bits de una palabra
+
+# Definimos los parámetros de la memoria paginada
+PAGE_SHIFT = 12 # Las páginas son de 2 elevado a 12 bytes
+PAGE_SIZE = 1 << PAGE_SHIFT # Tamaño de una página en bytes
+FLAT_LIMIT = 1 << 20 # Hasta este tamaño se usa una memoria contigua, por encima una memoria paginada
+
+# Definimos la memoria como un bloque de bytes contiguo
+# Los accesos de 32 bits se hacen sobre el bytearray sin crear listas ni copias intermedias
+# Las comprobaciones de límites las hacen read_mem y write_mem en cpu.py antes de llamar a estos métodos
+class Memory:
+    __slots__ = ("size", "data", "view")
+
+    def __init__(self, size):
+        # Recibe el tamaño de la memoria en bytes y la inicializa a cero
+        self.size = size # Tamaño de la memoria en bytes
+        self.data = bytearray(size) # Bytes de la memoria
+        self.view = memoryview(self.data) # Vista sin copia para las cargas y volcados en bloque
+
+    def read_word(self, dir):
+        # Devuelve la palabra de 32 bits con signo que empieza en la dirección dir
+        return WORD.unpack_from(self.data, dir)[0]
+
+    def write_word(self, dir, num):
+        # Escribe los 32 bits menos significativos de num a partir de la dirección dir
+        UWORD.pack_into(self.data, dir, num & WORD_MASK)
+
+    def load(self, image, dir=0):
+        # Copia una imagen completa (bytes, bytearray o memoryview) a partir de la dirección dir con una sola copia
+        # Devuelve falso si la imagen no cabe en la memoria
+        if dir < 0 or dir + len(image) > self.size: # Comprueba si la imagen cabe en la memoria
+            return False # Devuelve falso si no cabe
+        self.view[dir:dir + len(image)] = image # Copia los bytes de la imagen
+        return True # Devuelve verdadero
+
+    def dump(self, dir=0, size=None):
+        # Devuelve una copia de los bytes de la memoria desde la dirección dir, toda la memoria por defecto
+        if size == None: # Si no se indica el tamaño
+            size = self.size - dir # Vuelca hasta el final de la memoria
+        return bytes(self.view[dir:dir + size]) # Devuelve los bytes copiados
+
+    def clear(self):
+        # Pone toda la memoria a cero
+        self.view[:] = bytes(self.size)
+
+    def snapshot(self):
+        # Devuelve una copia inmutable de toda la memoria hecha de una vez
+        # Las memorias contiguas ocupan como mucho FLAT_LIMIT bytes, así que la copia es rápida
+        return bytes(self.view)
+
+    def restore(self, state):
+        # Vuelve al contenido guardado por snapshot con una sola copia
+        self.view[:] = state
+
+
+# Definimos la memoria paginada para espacios de direcciones grandes
+# Las páginas se crean la primera vez que se escriben, así la memoria que no se toca no ocupa nada
+# Leer una página que no existe devuelve ceros
+# Las páginas se copian al escribir (copy-on-write): snapshot comparte todas las páginas con la copia guardada
+# y cada página se duplica la primera vez que se escribe después, así guardar y restaurar no copia los datos
+class PagedMemory:
+    __slots__ = ("size", "pages", "owned")
+
+    def __init__(self, size):
+        # Recibe el tamaño del espacio de direcciones en bytes, que puede ser de varios GB
+        self.size = size # Tamaño de la memoria en bytes
+        self.pages = {} # Páginas existentes, indexadas por número de página, para leer
+        self.owned = {} # Páginas que solo usa esta memoria, para escribir; las demás están compartidas con una copia
+
+    def page(self, num):
+        # Devuelve la página num para escribir en ella
+        # La crea a cero si todavía no existe y la duplica si está compartida con una copia guardada
+        page = self.owned.get(num) # Busca la página entre las propias
+        if page == None: # Si no es propia
+            shared = self.pages.get(num) # Busca la página compartida
+            page = bytearray(PAGE_SIZE) if shared == None else bytearray(shared) # La crea a cero o la duplica
+            self.pages[num] = self.owned[num] = page # Ahora es propia
+        return page # Devuelve la página
+
+    def read_word(self, dir):
+        # Devuelve la palabra de 32 bits con signo que empieza en la dirección dir
+        offset = dir & (PAGE_SIZE - 1) # Calcula la posición dentro de la página
+        if offset > PAGE_SIZE - 4: # Si la palabra cruza el límite entre dos páginas
+            return WORD.unpack(self.dump(dir, 4))[0] # La lee byte a byte
+        page = self.pages.get(dir >> PAGE_SHIFT) # Busca la página
+        if page == None: # Si la página no existe
+            return 0 # La memoria no escrita vale cero
+        return WORD.unpack_from(page, offset)[0] # Lee la palabra dentro de la página
+
+    def write_word(self, dir, num):
+        # Escribe los 32 bits menos significativos de num a partir de la dirección dir
+        offset = dir & (PAGE_SIZE - 1) # Calcula la posición dentro de la página
+        if offset > PAGE_SIZE - 4: # Si la palabra cruza el límite entre dos páginas
+            self.load(UWORD.pack(num & WORD_MASK), dir) # La escribe byte a byte
+            return
+        UWORD.pack_into(self.page(dir >> PAGE_SHIFT), offset, num & WORD_MASK) # Escribe la palabra dentro de la página
+
+    def load(self, image, dir=0):
+        # Copia una imagen completa a partir de la dirección dir, una página cada vez
+        # Devuelve falso si la imagen no cabe en la memoria
+        if dir < 0 or dir + len(image) > self.size: # Comprueba si la imagen cabe en la memoria
+            return False # Devuelve falso si no cabe
+        image = memoryview(image).cast("B") # Vista sin copia de los bytes de la imagen
+        done = 0 # Bytes copiados
+        while done < len(image): # Mientras queden bytes por copiar
+            offset = (dir + done) & (PAGE_SIZE - 1) # Posición dentro de la página
+            count = min(PAGE_SIZE - offset, len(image) - done) # Bytes que caben en esta página
+            self.page((dir + done) >> PAGE_SHIFT)[offset:offset + count] = image[done:done + count] # Copia el trozo
+            done += count # Avanza
+        return True # Devuelve verdadero
+
+    def dump(self, dir=0, size=None):
+        # Devuelve una copia de los bytes de la memoria desde la dirección dir
+        # Las páginas que no existen se devuelven como ceros
+        if size == None: # Si no se indica el tamaño
+            size = self.size - dir # Vuelca hasta el final de la memoria
+        out = bytearray(size) # Bytes volcados, inicializados a cero
+        done = 0 # Bytes copiados
+        while done < size: # Mientras queden bytes por copiar
+            offset = (dir + done) & (PAGE_SIZE - 1) # Posición dentro de la página
+            count = min(PAGE_SIZE - offset, size - done) # Bytes que quedan en esta página
+            page = self.pages.get((dir + done) >> PAGE_SHIFT) # Busca la página
+            if page != None: # Si la página existe copia sus bytes
+                out[done:done + count] = page[offset:offset + count]
+            done += count # Avanza
+        return bytes(out) # Devuelve los bytes copiados
+
+    def clear(self):
+        # Pone toda la memoria a cero descartando las páginas
+        self.pages.clear()
+        self.owned.clear()
+
+    def snapshot(self):
+        # Devuelve el diccionario de páginas actual, que queda compartido con la copia guardada
+        # Solo se copian las referencias a las páginas, no sus bytes
+        self.owned = {} # Las páginas pasan a estar compartidas: la próxima escritura en cada una la duplicará
+        return dict(self.pages)
+
+    def restore(self, state):
+        # Vuelve a las páginas guardadas por snapshot sin copiar sus bytes
+        self.pages = dict(state) # Las páginas se comparten con la copia guardada, que se puede restaurar otra vez
+        self.owned = {}
+
+
+# Definimos la memoria proyectada desde un fichero de imagen con mmap
+# El sistema operativo carga las páginas del fichero cuando se accede a ellas, sin leer ni copiar el fichero al arrancar
+# Por defecto la proyección es privada: las escrituras del programa no modifican el fichero
+# Con writable=True las escrituras se guardan en el fichero y, si se indica size, el fichero se amplía hasta ese tamaño
+# Con offset la memoria empieza en esa posición del fichero, por ejemplo después de la cabecera de una imagen de programa
+# snapshot copia toda la proyección, así que conviene usarla con imágenes pequeñas
+class MappedMemory(Memory):
+    __slots__ = ("file", "map")
+
+    def __init__(self, path, size=None, writable=False, offset=0):
+        # Recibe la ruta del fichero de imagen y proyecta todo su contenido
+        self.file = open(path, "r+b" if writable else "rb") # Abre el fichero de imagen
+        if writable and size != None and offset + size > self.file.seek(0, 2): # Si hay que ampliar el fichero
+            self.file.truncate(offset + size) # Lo amplía, el sistema operativo no reserva los bytes nuevos hasta que se escriben
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_COPY # Escrituras al fichero o copia privada
+        self.map = mmap.mmap(self.file.fileno(), 0, access=access) # Proyecta el fichero
+        self.view = memoryview(self.map)[offset:] # Vista sin copia de la proyección desde offset
+        self.data = self.view if offset else self.map # Sin offset se accede directamente a la proyección
+        self.size = len(self.view) # El tamaño de la memoria es el del fichero desde offset
+
+    def close(self):
+        # Libera la proyección y cierra el fichero
+        self.data = None
+        self.view.release()
+        self.map.close()
+        self.file.close()
+
+
+# Definimos una función que crea la memoria adecuada para un tamaño
+def make_memory(size, path=None, writable=False, offset=0):
+    # Con path proyecta ese fichero de imagen con mmap a partir de la posición offset
+    # Si no, usa una memoria contigua para tamaños pequeños y una memoria paginada para los grandes
+    if path != None: # Si se indica un fichero de imagen
+        return MappedMemory(path, size, writable, offset) # Lo proyecta
+    if size <= FLAT_LIMIT: # Si la memoria es pequeña
+        return Memory(size) # Usa un bloque de bytes contiguo
+    return PagedMemory(size) # Usa páginas creadas bajo demanda
+
+
+# Definimos una función auxiliar que codifica una lista de palabras de 32 bits como una imagen de bytes
+def pack_words(words):
+    # Recibe una lista de enteros y devuelve sus 32 bits menos significativos en little-endian, en un único bloque de bytes
+    return struct.pack(f"<{len(words)}I", *[num & WORD_MASK for num in words])
@@ -0,0 +1,143 @@
+# Importamos asyncio para el planificador que deja esperar a los núcleos sin bloquear a los demás
+import asyncio
+
+# Importamos el procesador, el tamaño por defecto de la memoria y el tamaño máximo de las superinstrucciones
+from cpu import CPU, FUSE_MAX, MEM_SIZE
+# Importamos la función que ejecuta un procesador dentro de un bucle de eventos de asyncio
+from ports import run_async
+
+# Número de instrucciones por defecto que ejecuta cada núcleo antes de pasar el turno al siguiente
+SLICE = 1000
+
+
+# Definimos un núcleo de un procesador con varios núcleos
+# Cada núcleo es un procesador completo, con sus registros, su ALU, su CP, su UC, sus puertos y su contador de instrucciones,
+# pero todos comparten la memoria de datos
+# Cada núcleo tiene sus propias cachés de instrucciones y de bloques, así que una escritura en la memoria compartida
+# las invalida en todos los núcleos, para que el código que modifica otro núcleo también se vuelva a decodificar
+class Core(CPU):
+    __slots__ = ("index", "peers")
+
+    def __init__(self, index, mem_size=MEM_SIZE, image=None, writable=False, fidelity="microarch"):
+        super().__init__(mem_size, image, writable, fidelity)
+        self.index = index # Número del núcleo
+        self.peers = [self] # Núcleos que comparten la memoria de datos, incluido este
+
+    def write_mem(self, dir, num):
+        # Escribe como CPU.write_mem, que invalida las cachés de este núcleo, y después invalida las de los demás
+        # Un procesador de un solo núcleo no paga este coste en cada STR
+        if not CPU.write_mem(self, dir, num): # Si la dirección no es válida
+            return False
+        low = dir - 3 - 4 * (FUSE_MAX - 1) if self.superinstructions else dir - 3 # Igual que en CPU.write_mem
+        for core in self.peers:
+            if core is self: # Sus cachés ya están invalidadas
+                continue
+            for i in range(low, dir + 4): # Descarta las instrucciones que contienen los bytes escritos
+                core.decode_cache.pop(i, None)
+            for i in range(dir, dir + 4): # Descarta los bloques que contienen los bytes escritos
+                for start in core.block_owners.pop(i, ()):
+                    core.block_cache.pop(start, None)
+        return True
+
+
+# Definimos el procesador con varios núcleos
+# Los núcleos se ejecutan por turnos de slice instrucciones en un solo hilo: un núcleo nunca se interrumpe
+# en mitad de una instrucción, así que cada LDR y STR lee o escribe su palabra completa de una vez (es atómica)
+# y todos los núcleos ven las escrituras en el mismo orden en que se ejecutan
+# run alterna los núcleos en orden fijo (round-robin), así que dos ejecuciones con las mismas entradas son idénticas
+# run_async ejecuta cada núcleo en una tarea de asyncio: un núcleo que espera datos de un AsyncInput
+# cede el turno a los demás en lugar de detener todo el proceso
+# Para que cada núcleo haga una parte del trabajo, se les puede dar CP, registros o puertos distintos
+class Multicore:
+    __slots__ = ("cores",)
+
+    def __init__(self, count, mem_size=MEM_SIZE, image=None, writable=False, fidelity="microarch"):
+        # Recibe el número de núcleos y los mismos parámetros que CPU, que se aplican a todos los núcleos
+        if count < 1: # Comprueba si hay al menos un núcleo
+            raise ValueError(f"número de núcleos inválido: {count}")
+        first = Core(0, mem_size, image, writable, fidelity) # El primer núcleo crea la memoria de datos
+        self.cores = [first] + [Core(i, mem_size, fidelity=fidelity) for i in range(1, count)]
+        for core in self.cores:
+            core.peers = self.cores # Las escrituras de cada núcleo invalidan las cachés de todos
+        self.share()
+
+    # Definimos una función auxiliar que hace que todos los núcleos usen la memoria de datos del primero
+    def share(self):
+        first = self.cores[0]
+        for core in self.cores:
+            core.mem_dat = first.mem_dat # Comparte la memoria de datos
+            core.superinstructions = first.superinstructions # El programa es el mismo para todos
+            core.set_base(first.base) # Usa la misma base y descarta las cachés
+
+    # Definimos una función que carga un programa en la memoria compartida
+    def load_program(self, program, dir=0):
+        # Recibe lo mismo que CPU.load_program y pone el CP de todos los núcleos en la dirección de inicio
+        # Devuelve la dirección de inicio del programa o None si hay un error
+        start = self.cores[0].load_program(program, dir)
+        if start != None: # Si el programa se cargó
+            self.share()
+            for core in self.cores:
+                core.cp = start
+        return start
+
+    # Definimos una función que carga una imagen de programa desde un fichero en la memoria compartida
+    def load_image(self, path, mapped=False):
+        # Recibe lo mismo que CPU.load_image; con mapped=True todos los núcleos comparten la proyección
+        # Devuelve la dirección de inicio del programa o None si la imagen no es válida
+        start = self.cores[0].load_image(path, mapped)
+        if start != None: # Si la imagen se cargó
+            self.share()
+            for core in self.cores:
+                core.cp = start
+        return start
+
+    @property
+    def mem_dat(self):
+        return self.cores[0].mem_dat # Memoria de datos compartida
+
+    @property
+    def cycles(self):
+        return [core.cycles for core in self.cores] # Instrucciones ejecutadas por cada núcleo
+
+    # Definimos una función que ejecuta los núcleos por turnos en orden fijo
+    def run(self, max_cycles=None, engine="interp", slice=SLICE):
+        # Cada núcleo ejecuta slice instrucciones y pasa el turno al siguiente, siempre en el mismo orden
+        # Con max_cycles cada núcleo se detiene tras ese número de instrucciones
+        # Un núcleo que se detiene o falla deja de recibir turnos; uno que espera datos los vuelve a intentar en su turno
+        # Termina cuando ningún núcleo ejecuta nada en una vuelta completa
+        # Devuelve el número de instrucciones ejecutadas por todos los núcleos
+        start = self.cycles # Instrucciones ejecutadas por cada núcleo antes de empezar
+        total = 0 # Instrucciones ejecutadas por todos los núcleos
+        while True:
+            done = 0 # Instrucciones ejecutadas en esta vuelta
+            for core, first in zip(self.cores, start): # Da un turno a cada núcleo
+                if core.error != None or core.uc == 1: # Si el núcleo falló o se detuvo
+                    continue
+                limit = slice if max_cycles == None else min(slice, max_cycles - (core.cycles - first))
+                if limit > 0: # Si el núcleo no ha llegado al límite
+                    done += core.run(limit, engine)
+            if not done: # Si ningún núcleo pudo avanzar
+                break
+            total += done
+        return total
+
+    # Definimos una función que ejecuta los núcleos dentro de un bucle de eventos de asyncio
+    async def run_async(self, max_cycles=None, engine="interp", slice=SLICE):
+        # Cada núcleo se ejecuta en su propia tarea con ports.run_async, que cede el turno cada slice instrucciones
+        # y espera sin bloquear a los demás cuando el núcleo necesita datos de un AsyncInput
+        # Con max_cycles cada núcleo se detiene tras ese número de instrucciones
+        # Devuelve el número de instrucciones ejecutadas por todos los núcleos
+        counts = await asyncio.gather(*(run_async(core, engine, max_cycles, slice) for core in self.cores))
+        return sum(counts)
+
+    # Definimos una función que ejecuta el programa e informa del estado final
+    def run_program(self, engine="interp", max_cycles=None, slice=SLICE):
+        # Igual que run, pero escribe las salidas pendientes e imprime el estado de cada núcleo si es verbose
+        n = self.run(max_cycles, engine, slice)
+        for core in self.cores:
+            core.flush_output() # Escribe las salidas pendientes
+        for core in self.cores:
+            if core.verbose: # Si hay que informar en la salida
+                print(f"Núcleo {core.index}:", core.cycles, "instrucciones") # Imprime las instrucciones del núcleo
+                core.print_state() # Imprime el estado final del núcleo y sus registros
+        return n
@@ -0,0 +1,299 @@
+# Importamos namedtuple para el resultado de la optimización y el módulo struct para leer las palabras de una imagen
+import struct
+from collections import namedtuple
+
+# Importamos el conjunto de instrucciones y el formato de las instrucciones del procesador
+from cpu import (
+    NUM_REGS, OP_MASK, RN_MASK, RM_MASK, DIR_MASK,
+    NOP, ADD, SUB, AND, OR, XOR, NOT, MOV, LDR, STR, JMP, JZ, JN, IN, OUT, HALT,
+)
+# Importamos el formato de las imágenes binarias de programa
+from image import is_image, read_image
+
+# Definimos el resultado de la optimización
+# program es la lista de palabras optimizada, entry la dirección de inicio relativa al principio del programa,
+# removed el número de palabras eliminadas y reason el motivo por el que el programa no se pudo optimizar, o None
+# Si reason no es None, program es el programa original sin cambios
+Optimized = namedtuple("Optimized", "program entry removed reason")
+
+# Definimos los conjuntos de registros como máscaras de bits: el bit r es el registro Rr y el bit NUM_REGS es la ALU
+ALU_BIT = 1 << NUM_REGS # La ALU, que leen JZ y JN
+REGS = ALU_BIT - 1 # Todos los registros
+ALL = REGS | ALU_BIT # Todos los registros y la ALU
+
+# Operaciones aritméticas y lógicas que solo leen y escriben registros
+ALU_OPS = (ADD, SUB, AND, OR, XOR, NOT, MOV)
+
+# Número máximo de pasadas de optimización
+PASSES = 16
+
+
+# Definimos una función que obtiene las palabras y la dirección de inicio de un programa
+def read_words(program):
+    # Recibe una lista de palabras, una imagen de palabras o una imagen de programa con cabecera
+    if not isinstance(program, (bytes, bytearray, memoryview)): # Si es una lista de palabras
+        return [word & 0xFFFFFFFF for word in program], 0
+    entry = 0
+    if is_image(program): # Si es una imagen de programa
+        program, entry = read_image(program) # Obtiene las secciones y la dirección de inicio
+    if len(program) % 4: # Las secciones tienen que estar formadas por palabras completas
+        raise ValueError("el tamaño del programa no es múltiplo de 4")
+    return list(struct.unpack(f"<{len(program) // 4}I", program)), entry
+
+
+# Definimos el análisis de un programa
+# Las instrucciones se identifican por su índice, que es su dirección dividida entre 4
+class Program:
+    __slots__ = ("words", "code", "size", "limit", "entry", "reachable", "data", "targets", "removed", "live")
+
+    def __init__(self, words, entry, mem_size):
+        # Recibe las palabras del programa, la dirección de inicio y el tamaño de memoria disponible desde la base
+        self.words = words # Palabras originales
+        self.code = [[(w & OP_MASK) >> 28, (w & RN_MASK) >> 24, (w & RM_MASK) >> 20, w & DIR_MASK] for w in words]
+        self.size = 4 * len(words) # Tamaño del programa en bytes
+        self.limit = mem_size # Tamaño de la memoria, o None si no se conoce
+        self.entry = entry # Dirección de inicio
+        self.reachable = set() # Índices de las instrucciones que se pueden ejecutar
+        self.data = set() # Índices de las palabras que leen o escriben LDR y STR
+        self.targets = set() # Índices de las instrucciones a las que se puede llegar saltando
+        self.removed = set() # Índices de las palabras eliminadas
+        self.live = [] # Registros vivos a la salida de cada instrucción
+
+    def valid(self, i):
+        # Devuelve verdadero si la instrucción i no puede fallar por sus registros
+        op, rn, rm, d = self.code[i]
+        if op in (ADD, SUB, AND, OR, XOR, MOV):
+            return rn < NUM_REGS and rm < NUM_REGS
+        if op in (NOT, LDR, STR, IN, OUT):
+            return rn < NUM_REGS
+        return True
+
+    def safe_address(self, d):
+        # Devuelve verdadero si un LDR o un STR en la dirección d no puede fallar
+        return d + 4 <= (self.size if self.limit == None else self.limit)
+
+    def successors(self, i):
+        # Devuelve los índices de las instrucciones que se pueden ejecutar después de la instrucción i
+        op, rn, rm, d = self.code[i]
+        if not self.valid(i) or op == HALT: # Las instrucciones inválidas y HALT detienen el programa
+            return ()
+        if op == JMP:
+            return (d // 4,)
+        if op in (JZ, JN):
+            return (d // 4, i + 1)
+        return (i + 1,)
+
+    def explore(self):
+        # Recorre el grafo de control desde la dirección de inicio
+        # Devuelve el motivo por el que el programa no se puede optimizar, o None
+        if self.entry % 4 or not 0 <= self.entry < self.size:
+            return "la dirección de inicio no es una instrucción del programa"
+        pending = [self.entry // 4]
+        self.targets.add(self.entry // 4)
+        while pending:
+            i = pending.pop()
+            if i in self.reachable:
+                continue
+            if i >= len(self.code): # El programa seguiría ejecutando fuera de sus palabras
+                return "el programa puede continuar después de su última palabra"
+            self.reachable.add(i)
+            op, rn, rm, d = self.code[i]
+            if op in (JMP, JZ, JN) and self.valid(i): # Saltos
+                if d % 4 or d >= self.size: # El destino tiene que ser una instrucción del programa
+                    return f"el salto de la dirección {4 * i} sale del programa"
+                self.targets.add(d // 4)
+            pending.extend(self.successors(i))
+        for i in self.reachable: # Comprueba los accesos a memoria
+            op, rn, rm, d = self.code[i]
+            if op in (LDR, STR) and self.valid(i) and d < self.size:
+                if d % 4: # Un acceso que no está alineado mezclaría dos palabras que se pueden mover por separado
+                    return f"el acceso a memoria de la dirección {4 * i} no está alineado"
+                if d // 4 in self.reachable: # El programa se lee o se modifica a sí mismo
+                    return f"la instrucción de la dirección {4 * i} accede al código del programa"
+                self.data.add(d // 4)
+        return None
+
+    def effects(self, i):
+        # Devuelve la tupla (registros leídos, registros escritos, registros vivos siempre) de la instrucción i
+        # Los registros vivos siempre son los que se pueden observar si el programa se detiene en ella
+        op, rn, rm, d = self.code[i]
+        if i in self.removed or not self.valid(i): # Una instrucción eliminada no hace nada
+            return 0, 0, 0 if i in self.removed else ALL # Una inválida detiene el programa con un error
+        if op == NOP:
+            use, define = 0, ALU_BIT
+        elif op == NOT:
+            use, define = 1 << rn, 1 << rn | ALU_BIT
+        elif op == MOV:
+            use, define = 1 << rm, 1 << rn | ALU_BIT
+        elif op in ALU_OPS:
+            use, define = 1 << rn | 1 << rm, 1 << rn | ALU_BIT
+        elif op in (LDR, IN):
+            use, define = 0, 1 << rn | ALU_BIT
+        elif op in (STR, OUT):
+            use, define = 1 << rn, ALU_BIT
+        elif op in (JMP, HALT): # JMP copia su destino a la ALU y HALT la pone a cero
+            use, define = 0, ALU_BIT
+        else: # JZ y JN leen la ALU
+            use, define = ALU_BIT, 0
+        always = 0
+        if op == HALT: # Al terminar se observan los registros
+            always = REGS
+        elif op == IN or (op in (LDR, STR) and not self.safe_address(d)): # Puede detenerse con un error
+            always = ALL # Entonces se observa todo el estado
+        return use, define, always
+
+    def liveness(self):
+        # Calcula los registros vivos a la salida de cada instrucción, es decir, los que se leen después
+        # antes de volver a escribirse, repitiendo hasta que no cambie nada
+        live_in = [0] * len(self.code)
+        self.live = [0] * len(self.code)
+        order = sorted(self.reachable, reverse=True) # Recorrer hacia atrás converge antes
+        changed = True
+        while changed:
+            changed = False
+            for i in order:
+                out = 0
+                for j in self.successors(i):
+                    out |= live_in[j]
+                use, define, always = self.effects(i)
+                new = use | (out & ~define) | always
+                self.live[i] = out
+                if new != live_in[i]:
+                    live_in[i] = new
+                    changed = True
+
+    def fold_moves(self):
+        # Sustituye MOV c, a por MOV c, b cuando a se copió de b antes en el mismo bloque básico y b no ha cambiado
+        # Así la copia intermedia puede quedar muerta y eliminarse
+        # Devuelve el número de instrucciones cambiadas
+        changed = 0
+        for j in sorted(self.reachable - self.removed):
+            op, c, a, d = self.code[j]
+            if op != MOV or not self.valid(j) or c == a:
+                continue
+            written = 0 # Registros escritos entre la copia y la instrucción j
+            k = j
+            while k not in self.targets and k > 0: # Retrocede dentro del bloque básico
+                k -= 1
+                if k in self.removed:
+                    continue
+                if k not in self.reachable or not self.valid(k):
+                    break
+                pop, pn, pm, pd = self.code[k]
+                if pop in (JMP, JZ, JN, HALT):
+                    break
+                use, define, always = self.effects(k)
+                if define & (1 << a): # Instrucción que escribió a
+                    if pop == MOV and pm != a and not written & (1 << pm): # Si es una copia y su origen no ha cambiado
+                        self.code[j][2] = pm # Copia directamente del origen
+                        changed += 1
+                    break
+                written |= define
+        return changed
+
+    def remove_dead(self):
+        # Elimina las instrucciones que no tienen más efecto que escribir registros o la ALU que ya no se leen
+        # Devuelve el número de instrucciones eliminadas
+        dead = []
+        for i in self.reachable - self.removed:
+            op, rn, rm, d = self.code[i]
+            if not self.valid(i):
+                continue
+            if op == NOP or (op == MOV and rn == rm) or (op == JMP and d == 4 * (i + 1)):
+                define = ALU_BIT # Solo cambian la ALU
+            elif op in ALU_OPS or (op == LDR and self.safe_address(d)):
+                define = self.effects(i)[1]
+            elif op in (JZ, JN) and d == 4 * (i + 1): # Un salto a la instrucción siguiente no hace nada
+                define = 0
+            else: # STR, IN, OUT, HALT, los saltos y los accesos que pueden fallar no se eliminan
+                continue
+            if not define & self.live[i]: # Si nada de lo que escribe se lee después
+                dead.append(i)
+        self.removed.update(dead)
+        return len(dead)
+
+    def relocate(self, d, index):
+        # Devuelve la nueva dirección de la dirección d del programa original
+        # index[i] es el número de palabras que quedan antes de la palabra i
+        if d >= self.size: # Las direcciones de fuera del programa no cambian
+            return d
+        return 4 * index[d // 4]
+
+    def emit(self):
+        # Devuelve la tupla (palabras, dirección de inicio, motivo), con motivo None si la optimización es correcta
+        keep = [i in self.data or (i in self.reachable and i not in self.removed) for i in range(len(self.code))]
+        index = [] # Palabras que quedan antes de cada palabra
+        count = 0
+        for kept in keep:
+            index.append(count)
+            count += kept
+        words = []
+        for i, kept in enumerate(keep):
+            if not kept:
+                continue
+            word = self.words[i] # Palabra original
+            op, rn, rm, d = self.code[i]
+            if i in self.data or not self.valid(i): # Los datos y las instrucciones inválidas no cambian
+                words.append(word)
+                continue
+            if op == MOV: # El registro de origen puede haber cambiado al simplificar las cadenas de MOV
+                word = word & ~RM_MASK | rm << 20
+            if op in (JMP, JZ, JN, LDR, STR):
+                new = self.relocate(d, index)
+                if op == JMP and self.live[i] & ALU_BIT and (new == 0) != (d == 0):
+                    # JMP copia su destino a la ALU: si después se lee con JZ, la condición tiene que seguir igual
+                    return None, None, f"el salto de la dirección {4 * i} cambiaría el resultado de un JZ"
+                word = word & ~DIR_MASK | new
+            words.append(word)
+        return words, self.relocate(self.entry, index), None
+
+
+# Definimos una función que optimiza un programa
+def optimize(program, entry=None, mem_size=None):
+    # Recibe una lista de palabras, una imagen de palabras o una imagen de programa, y la dirección de inicio,
+    # que por defecto es la de la imagen o 0
+    # mem_size es la memoria disponible desde la base del segmento; si no se conoce, solo los accesos dentro del
+    # programa se consideran seguros
+    # Construye el grafo de control desde la dirección de inicio y:
+    # - elimina las palabras que no se pueden ejecutar ni se leen como datos
+    # - elimina los NOP, los MOV de un registro a sí mismo y los saltos a la instrucción siguiente
+    # - sustituye las cadenas de MOV por una copia directa del registro de origen
+    # - elimina las escrituras de registros que no se leen después
+    # y recoloca las direcciones de los saltos y de los accesos a memoria
+    # Los registros al terminar con HALT o con un error, las salidas y el valor de la ALU que leen JZ y JN no cambian
+    # Los programas que se leen o se modifican a sí mismos no se optimizan
+    # Devuelve un Optimized
+    words, image_entry = read_words(program)
+    if entry == None: # Si no se indica la dirección de inicio
+        entry = image_entry
+    analysis = Program(words, entry, mem_size)
+    reason = analysis.explore() # Construye el grafo de control
+    if reason != None: # Si el programa no se puede optimizar, lo devuelve sin cambios
+        return Optimized(words, entry, 0, reason)
+    for _ in range(PASSES): # Repite las optimizaciones mientras cambien algo
+        folded = analysis.fold_moves()
+        analysis.liveness()
+        if not analysis.remove_dead() and not folded:
+            break
+    analysis.liveness()
+    optimized, new_entry, reason = analysis.emit()
+    if reason != None:
+        return Optimized(words, entry, 0, reason)
+    return Optimized(optimized, new_entry, len(words) - len(optimized), None)
+
+
+# Definimos una función que optimiza un programa y lo carga en un procesador
+def load_optimized(proc, program, dir=0):
+    # Igual que CPU.load_program, pero antes optimiza el programa
+    # Si el optimizador lo ha comprobado, activa las superinstrucciones del intérprete "functional"
+    # Devuelve la tupla (dirección de inicio o None si hay un error, resultado de optimize)
+    # Si la imagen no es válida no se carga nada y el resultado lleva el motivo en reason, con el programa vacío
+    try:
+        result = optimize(program, mem_size=proc.mem_dat.size - dir)
+    except ValueError as error: # Si la imagen no es válida, igual que CPU.load_program
+        return None, Optimized([], 0, 0, str(error))
+    start = proc.load_program(result.program, dir) # Carga el programa optimizado
+    if start == None: # Comprueba si hubo un error al cargar el programa
+        return None, result
+    proc.superinstructions = result.reason == None # Solo los programas comprobados usan superinstrucciones
+    return start + result.entry, result
@@ -0,0 +1,259 @@
+# Importamos asyncio para los puertos que reciben datos de un socket o de una cola sin bloquear el bucle de eventos
+import asyncio
+# Importamos el módulo sys para la entrada y la salida estándar
+import sys
+# Importamos deque para guardar los datos que llegan a un puerto asíncrono
+from collections import deque
+
+# Importamos el estado de la UC que indica que el procesador espera datos de entrada
+from cpu import WAITING
+
+# Definimos los tamaños de los búferes
+CHUNK = 1 << 16 # Bytes que se leen de un fichero en cada lectura
+BUFFER = 4096 # Valores que se guardan en un puerto de salida antes de escribirlos
+
+# Número de instrucciones que run_async ejecuta antes de ceder el control al bucle de eventos
+SLICE = 10000
+
+
+# Los puertos de entrada son objetos que se pueden llamar sin argumentos y devuelven el siguiente valor
+# Lanzan EOFError cuando no quedan valores y BlockingIOError cuando todavía no han llegado
+# Los puertos de salida son objetos que se pueden llamar con un valor y tienen un método flush
+# Se conectan al procesador asignándolos a CPU.input_port y CPU.output_port
+# Los puertos que tienen los métodos snapshot y restore guardan sus datos pendientes con CPU.snapshot
+
+
+# Definimos una función auxiliar que separa los valores de un trozo de texto o de bytes
+def split_values(data):
+    # Recibe el texto leído y devuelve la lista de valores completos y el trozo final que puede estar cortado
+    # Los valores se convierten a enteros todos a la vez; si alguno no es válido se dejan como texto
+    # y la instrucción IN falla al llegar a él, igual que con input()
+    tokens = data.split() # Separa los valores por espacios y saltos de línea
+    carry = data[:0] # Trozo final vacío, del mismo tipo que data
+    if tokens and not data[-1:].isspace(): # Si el último valor puede continuar en la siguiente lectura
+        carry = tokens.pop() # Lo guarda para juntarlo con ella
+    try:
+        return list(map(int, tokens)), carry # Convierte todos los valores de una vez
+    except ValueError: # Si alguno no es un entero
+        return tokens, carry # Los deja como texto
+
+
+# Definimos el puerto de entrada que lee los valores de un iterable, por ejemplo una lista o un generador
+class IteratorInput:
+    __slots__ = ("next",)
+
+    def __init__(self, values):
+        self.next = iter(values).__next__ # Función que devuelve el siguiente valor
+
+    def __call__(self):
+        try:
+            return self.next() # Devuelve el siguiente valor
+        except StopIteration: # Si no quedan valores
+            raise EOFError from None
+
+
+# Definimos el puerto de entrada que lee los valores de un fichero por trozos grandes
+# Los valores pueden estar separados por espacios o por saltos de línea
+class FileInput:
+    __slots__ = ("file", "chunk", "next", "carry")
+
+    def __init__(self, file, chunk=CHUNK):
+        # Recibe un fichero abierto en modo texto o binario
+        self.file = file # Fichero del que se leen los valores
+        self.chunk = chunk # Tamaño de cada lectura
+        self.next = iter(()).__next__ # Función que devuelve el siguiente valor ya leído
+        self.carry = None # Trozo final de la última lectura, que puede ser el principio de un valor
+
+    def refill(self):
+        # Lee el siguiente trozo del fichero y prepara sus valores
+        # Devuelve falso si el fichero se terminó
+        data = self.file.read(self.chunk) # Lee un trozo del fichero
+        if not data: # Si el fichero se terminó
+            if not self.carry: # Si no quedó ningún valor
+                return False # Devuelve falso
+            values, self.carry = [self.carry], None # El último valor termina con el fichero
+        else:
+            if self.carry: # Si quedó un valor cortado en la lectura anterior
+                data = self.carry + data # Lo junta con el nuevo trozo
+            values, self.carry = split_values(data) # Separa los valores completos
+        self.next = iter(values).__next__
+        return True # Devuelve verdadero
+
+    def __call__(self):
+        while True:
+            try:
+                return self.next() # Devuelve el siguiente valor ya leído
+            except StopIteration: # Si no quedan valores leídos
+                if not self.refill(): # Lee otro trozo del fichero
+                    raise EOFError from None # Si no quedan, lanza EOFError
+
+
+# Definimos una función que crea un puerto de entrada que lee la entrada estándar por trozos grandes
+def stdin_input(chunk=CHUNK):
+    return FileInput(sys.stdin.buffer, chunk)
+
+
+# Definimos el puerto de salida que guarda los valores en una lista en memoria
+class ListOutput(list):
+    __slots__ = ()
+
+    __call__ = list.append # Añade el valor a la lista
+
+    def flush(self):
+        # Los valores ya están en la lista, no hay nada que escribir
+        pass
+
+    def snapshot(self):
+        return list(self) # Copia de los valores escritos
+
+    def restore(self, state):
+        self[:] = state # Vuelve a los valores guardados
+
+
+# Definimos el puerto de salida que escribe los valores en un fichero por tandas
+# Cada valor se escribe en una línea, igual que con print()
+class BufferedOutput:
+    __slots__ = ("file", "size", "values")
+
+    def __init__(self, file=None, size=BUFFER):
+        # Recibe un fichero abierto en modo texto, la salida estándar por defecto
+        self.file = sys.stdout if file == None else file # Fichero en el que se escriben los valores
+        self.size = size # Número de valores que se guardan antes de escribirlos
+        self.values = [] # Valores pendientes de escribir
+
+    def __call__(self, value):
+        values = self.values
+        values.append(value) # Guarda el valor
+        if len(values) >= self.size: # Si el búfer está lleno
+            self.flush() # Escribe todos los valores de una vez
+
+    def write(self, text):
+        # Escribe el texto de una tanda de valores en el fichero
+        self.file.write(text)
+        self.file.flush()
+
+    def flush(self):
+        # Escribe los valores pendientes con una sola escritura
+        if self.values: # Si hay valores pendientes
+            self.write("".join(f"{value}\n" for value in self.values))
+            self.values.clear() # Vacía el búfer
+
+    def snapshot(self):
+        return list(self.values) # Copia de los valores pendientes de escribir
+
+    def restore(self, state):
+        self.values[:] = state # Los valores escritos en el fichero ya no se pueden deshacer
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush() # Escribe los valores pendientes al salir del bloque with
+
+
+# Definimos el puerto de salida que escribe los valores por tandas en un socket de asyncio
+# Las escrituras no bloquean; run_async espera a que el socket las envíe entre tanda y tanda de instrucciones
+class StreamOutput(BufferedOutput):
+    __slots__ = ()
+
+    def __init__(self, writer, size=BUFFER):
+        # Recibe el asyncio.StreamWriter del socket
+        super().__init__(writer, size)
+
+    def write(self, text):
+        self.file.write(text.encode()) # El socket recibe bytes
+
+    async def drain(self):
+        # Espera a que el socket haya enviado los datos escritos
+        await self.file.drain()
+
+
+# Definimos el puerto de entrada que recibe los valores desde asyncio, de un socket o de una cola
+# Si la instrucción IN llega cuando todavía no hay valores, el procesador queda esperando (UC = WAITING)
+# en lugar de bloquear el bucle de eventos; run_async espera a que lleguen más y continúa
+class AsyncInput:
+    __slots__ = ("values", "closed", "ready")
+
+    def __init__(self):
+        self.values = deque() # Valores recibidos que todavía no ha leído el programa
+        self.closed = False # Si es verdadero, ya no llegarán más valores
+        self.ready = asyncio.Event() # Se activa cuando llegan valores o se cierra el puerto
+
+    def __call__(self):
+        if self.values: # Si hay valores recibidos
+            return self.values.popleft() # Devuelve el primero
+        if self.closed: # Si ya no llegarán más
+            raise EOFError
+        raise BlockingIOError # Si no, el procesador tiene que esperar
+
+    def feed(self, values):
+        # Añade valores al puerto
+        self.values.extend(values)
+        self.ready.set() # Avisa a quien esté esperando
+
+    def close(self):
+        # Indica que ya no llegarán más valores
+        self.closed = True
+        self.ready.set() # Avisa a quien esté esperando
+
+    def snapshot(self):
+        return list(self.values), self.closed # Valores recibidos que todavía no se han leído
+
+    def restore(self, state):
+        values, self.closed = state
+        self.values = deque(values)
+        if values or self.closed: # Avisa a quien esté esperando
+            self.ready.set()
+
+    async def wait(self):
+        # Espera a que haya valores o a que se cierre el puerto
+        while not self.values and not self.closed:
+            self.ready.clear()
+            await self.ready.wait()
+
+    async def feed_stream(self, reader, chunk=CHUNK):
+        # Recibe valores de un asyncio.StreamReader, por ejemplo un socket, hasta que se cierre
+        carry = b"" # Valor cortado al final de la última lectura
+        while True:
+            data = await reader.read(chunk) # Lee lo que haya llegado sin bloquear el bucle de eventos
+            if not data: # Si el socket se cerró
+                break
+            values, carry = split_values(carry + data) # Separa los valores completos
+            self.feed(values)
+        if carry: # El último valor termina al cerrarse el socket
+            self.feed((carry,))
+        self.close()
+
+    async def feed_queue(self, queue):
+        # Recibe valores de una asyncio.Queue hasta que llegue None
+        while True:
+            value = await queue.get()
+            if value == None: # None indica que ya no llegarán más
+                break
+            self.feed((value,))
+        self.close()
+
+
+# Definimos una función que ejecuta un procesador dentro de un bucle de eventos de asyncio
+async def run_async(proc, engine="interp", max_cycles=None, slice=SLICE):
+    # Ejecuta el procesador por tandas de slice instrucciones y cede el control al bucle de eventos entre tandas
+    # Si el programa espera datos de un AsyncInput, espera a que lleguen sin bloquear el bucle de eventos
+    # Si el puerto de salida es un StreamOutput, espera a que el socket envíe los datos
+    # Devuelve el número total de instrucciones ejecutadas por el procesador
+    start = proc.cycles # Instrucciones ejecutadas antes de empezar
+    while proc.error == None: # Mientras el programa no falle
+        done = proc.cycles - start # Instrucciones ejecutadas hasta ahora
+        if max_cycles != None and done >= max_cycles: # Si se llegó al límite
+            break
+        limit = slice if max_cycles == None else min(slice, max_cycles - done) # Instrucciones de esta tanda
+        proc.run(limit, engine) # Ejecuta una tanda de instrucciones
+        proc.flush_output() # Escribe las salidas de la tanda
+        if isinstance(proc.output_port, StreamOutput): # Si la salida es un socket
+            await proc.output_port.drain() # Espera a que se envíen los datos
+        if proc.uc == WAITING: # Si el programa espera datos
+            await proc.input_port.wait() # Espera a que lleguen
+        elif proc.uc != 0: # Si el programa se detuvo
+            break
+        else: # Deja que se ejecuten otras tareas
+            await asyncio.sleep(0)
+    return proc.cycles - start
@@ -0,0 +1,98 @@
+# Importamos defaultdict para sumar los contadores al exportar
+from collections import defaultdict
+
+
+# Definimos el perfil de ejecución de un procesador
+# Se activa al crear el procesador con CPU(profile=True) o con CPU.set_profile(True)
+# Los contadores se añaden al decodificar cada instrucción, envolviendo su operación en una función que la cuenta,
+# así el bucle de ejecución no comprueba nada en cada instrucción y un procesador sin perfil no paga ningún coste
+# Con el perfil activo el motor de bloques no se usa: el programa se ejecuta en el intérprete
+class Profile:
+    __slots__ = ("sites", "seconds")
+
+    def __init__(self):
+        # Cada sitio es una instrucción decodificada: (dirección, ir) -> [nombre, dirección de datos, ejecuciones, saltos tomados]
+        # Se guarda por instrucción y no solo por dirección para que el código automodificable no mezcle contadores
+        self.sites = {}
+        self.seconds = 0.0 # Tiempo de ejecución medido por CPU.run
+
+    def clear(self):
+        # Pone a cero todos los contadores
+        self.sites.clear()
+        self.seconds = 0.0
+
+    def wrap(self, proc, dir, ir, name, handler, args):
+        # Recibe una instrucción decodificada y devuelve su operación envuelta en una función que la cuenta
+        # Solo se cuentan las instrucciones que se ejecutan con éxito, igual que CPU.cycles
+        site = self.sites.get((dir, ir)) # Busca los contadores de esta instrucción
+        if site == None: # Si es la primera vez que se decodifica
+            site = self.sites[(dir, ir)] = [name, args[-1] if name in ("LDR", "STR") else None, 0, 0]
+        if name in ("JZ", "JN"): # Los saltos condicionales cuentan también las veces que saltan
+            zero = name == "JZ"
+            def counted(*args):
+                alu = proc.alu # La condición se evalúa antes de ejecutar el salto
+                ok = handler(*args)
+                if ok:
+                    site[2] += 1
+                    if (alu == 0) if zero else (alu < 0): # Si se tomó el salto
+                        site[3] += 1
+                return ok
+        elif name == "IN": # IN no cuenta si el procesador se queda esperando datos
+            def counted(*args):
+                ok = handler(*args)
+                if ok and proc.cp != dir: # Al esperar, el CP vuelve a apuntar a la instrucción IN
+                    site[2] += 1
+                return ok
+        else:
+            def counted(*args):
+                ok = handler(*args)
+                if ok:
+                    site[2] += 1
+                return ok
+        return counted
+
+    def report(self):
+        # Devuelve un diccionario con todos los contadores sumados
+        ops = defaultdict(int) # Instrucciones ejecutadas por operación
+        addresses = defaultdict(int) # Instrucciones ejecutadas por dirección
+        branches = {} # Saltos tomados y no tomados por dirección de JZ o JN
+        loads = defaultdict(int) # LDR ejecutados por dirección de datos
+        stores = defaultdict(int) # STR ejecutados por dirección de datos
+        for (dir, ir), (name, data, count, taken) in self.sites.items():
+            if count == 0: # Las instrucciones decodificadas que no llegaron a ejecutarse no aparecen
+                continue
+            ops[name] += count
+            addresses[dir] += count
+            if name in ("JZ", "JN"):
+                branch = branches.setdefault(dir, {"taken": 0, "not_taken": 0})
+                branch["taken"] += taken
+                branch["not_taken"] += count - taken
+            elif name == "LDR":
+                loads[data] += count
+            elif name == "STR":
+                stores[data] += count
+        total = sum(ops.values()) # Instrucciones ejecutadas en total
+        return {
+            "instructions": total,
+            "seconds": self.seconds,
+            "ips": total / self.seconds if self.seconds else 0.0, # Instrucciones por segundo
+            "ops": dict(sorted(ops.items(), key=lambda item: -item[1])),
+            "addresses": dict(sorted(addresses.items())),
+            "branches": dict(sorted(branches.items())),
+            "loads": dict(sorted(loads.items())),
+            "stores": dict(sorted(stores.items())),
+        }
+
+    def to_json(self, indent=None):
+        # Devuelve el informe en formato JSON; las direcciones aparecen como claves de texto
+        import json # Solo se importa al exportar, para no cargarlo con el procesador
+        return json.dumps(self.report(), indent=indent)
+
+    def folded(self):
+        # Devuelve el informe en el formato "pila contador" que leen flamegraph.pl, speedscope o inferno
+        # Cada línea agrupa una instrucción bajo su operación, por ejemplo "ADD;ADD@0x0010 1200"
+        counts = defaultdict(int)
+        for (dir, ir), (name, data, count, taken) in self.sites.items():
+            if count:
+                counts[f"{name};{name}@{dir:#06x}"] += count
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
@@ -0,0 +1,221 @@
+# Importamos los módulos para leer los argumentos, guardar las copias del procesador y escribir la cabecera de la traza
+import argparse
+import bisect
+import pickle
+import struct
+import sys
+# Importamos zlib para comprimir las copias del estado
+import zlib
+
+# Importamos el procesador, que se crea al repetir una traza desde la línea de comandos
+from cpu import CPU
+
+# Definimos el formato de los ficheros de traza
+# Una ejecución es determinista salvo por los valores que lee la instrucción IN, así que basta con guardar esos valores
+# para repetirla exactamente; además se guardan copias del estado completo cada cierto número de instrucciones
+# para poder saltar a cualquier instrucción sin repetir la ejecución desde el principio
+# El fichero es una cabecera seguida de los valores de entrada y de las copias, en little-endian:
+#   magic     4 bytes  b"CPUT"
+#   version   2 bytes  versión del formato
+#   flags     2 bytes  reservado, siempre 0
+#   interval  8 bytes  instrucciones entre dos copias del estado
+#   size      8 bytes  bytes de los valores de entrada
+# Cada valor de entrada ocupa de 1 a varios bytes: se codifica en zigzag (los negativos pequeños ocupan poco)
+# y después en grupos de 7 bits, con el bit alto a 1 si quedan más grupos
+# Las copias se guardan con pickle comprimido con zlib; las páginas que comparten varias copias se escriben una sola vez
+# Las copias no guardan el estado de los puertos: las salidas se vuelven a producir al repetir la ejecución
+HEADER = struct.Struct("<4sHHQQ")
+MAGIC = b"CPUT"
+VERSION = 1
+
+# Número de instrucciones por defecto entre dos copias del estado
+INTERVAL = 1000000
+
+
+# Definimos una función que codifica una lista de valores de entrada en bytes
+def encode_values(values):
+    out = bytearray()
+    for value in values:
+        value = value << 1 if value >= 0 else (-value << 1) - 1 # Zigzag: 0, -1, 1, -2... -> 0, 1, 2, 3...
+        while value > 0x7F: # Mientras queden más de 7 bits
+            out.append(value & 0x7F | 0x80) # Guarda 7 bits e indica que siguen más
+            value >>= 7
+        out.append(value) # Último grupo
+    return bytes(out)
+
+# Definimos una función que decodifica los valores de entrada guardados con encode_values
+def decode_values(data):
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift # Añade 7 bits al valor
+        shift += 7
+        if byte < 0x80: # Si era el último grupo
+            values.append(value >> 1 if not value & 1 else -((value + 1) >> 1)) # Deshace el zigzag
+            value = shift = 0
+    if shift: # Si el último valor está cortado
+        raise ValueError("los valores de entrada de la traza están incompletos")
+    return values
+
+
+# Definimos el puerto de entrada que anota los valores que lee otro puerto
+# Los errores del puerto (EOFError, BlockingIOError o un valor que no es entero) no se anotan:
+# al repetir la ejecución, el final de la traza hace fallar la instrucción IN igual que en la original
+class RecordingInput:
+    __slots__ = ("port", "values")
+
+    def __init__(self, port, values):
+        self.port = port # Puerto del que se leen los valores
+        self.values = values # Lista en la que se anotan
+
+    def __call__(self):
+        value = int(self.port()) # Lee el valor y lo convierte a entero, igual que IN
+        self.values.append(value) # Lo anota
+        return value
+
+
+# Definimos el puerto de entrada que devuelve los valores anotados en una traza
+class ReplayInput:
+    __slots__ = ("values", "position")
+
+    def __init__(self, values, position=0):
+        self.values = values # Valores anotados
+        self.position = position # Posición del siguiente valor
+
+    def __call__(self):
+        position = self.position
+        if position >= len(self.values): # Si no quedan valores
+            raise EOFError
+        self.position = position + 1
+        return self.values[position] # Devuelve el siguiente valor
+
+
+# Definimos la traza de una ejecución
+# Se graba con record (o con CPU.run_program(record=ruta)) y se repite con replay o seek
+class Trace:
+    __slots__ = ("interval", "fidelity", "inputs", "checkpoints")
+
+    def __init__(self, interval=INTERVAL, fidelity="microarch"):
+        self.interval = interval # Instrucciones entre dos copias del estado
+        self.fidelity = fidelity # Nivel de fidelidad del procesador grabado
+        self.inputs = [] # Valores leídos por IN, en orden
+        self.checkpoints = [] # Copias del estado: tuplas (CPU.cycles, valores de entrada leídos, Snapshot)
+
+    def checkpoint(self, proc):
+        # Guarda una copia del estado del procesador junto con el número de valores leídos hasta ahora
+        snap = proc.snapshot()
+        snap.ports = (None, None) # Los valores de entrada están en la traza y las salidas se pueden repetir
+        self.checkpoints.append((proc.cycles, len(self.inputs), snap))
+
+    def record(self, proc, engine="interp", max_cycles=None):
+        # Ejecuta el procesador como CPU.run, anotando los valores de entrada y guardando una copia cada interval instrucciones
+        # Al terminar, el puerto de entrada del procesador vuelve a ser el original
+        # Devuelve el número de instrucciones ejecutadas
+        self.fidelity = proc.fidelity
+        port = proc.input_port
+        proc.input_port = RecordingInput(port, self.inputs) # Anota lo que lea el programa
+        n = 0 # Instrucciones ejecutadas
+        try:
+            self.checkpoint(proc) # Estado inicial
+            while max_cycles == None or n < max_cycles: # Mientras no se llegue al límite
+                limit = self.interval if max_cycles == None else min(self.interval, max_cycles - n)
+                done = proc.run(limit, engine) # Ejecuta hasta la siguiente copia
+                n += done
+                if done < limit: # Si el programa se detuvo, falló o espera datos
+                    break
+                self.checkpoint(proc)
+        finally:
+            proc.input_port = port # Quita el puerto que anota
+        return n
+
+    def nearest(self, cycle):
+        # Devuelve la última copia guardada antes de la instrucción cycle, o None si no hay ninguna
+        index = bisect.bisect_right(self.checkpoints, cycle, key=lambda checkpoint: checkpoint[0])
+        return self.checkpoints[index - 1] if index else None
+
+    def seek(self, proc, cycle, engine="interp"):
+        # Deja el procesador en el estado que tenía cuando CPU.cycles valía cycle
+        # Restaura la copia más cercana y ejecuta desde ella las instrucciones que faltan
+        # El puerto de entrada del procesador pasa a leer los valores de la traza
+        # Devuelve el número de instrucciones ejecutadas desde la copia, o None si cycle es anterior a la traza
+        checkpoint = self.nearest(cycle)
+        if checkpoint == None: # Comprueba si la traza llega a esa instrucción
+            return None
+        cycles, position, snap = checkpoint
+        proc.restore(snap) # Vuelve a la copia
+        proc.input_port = ReplayInput(self.inputs, position) # Lee los valores que faltan de la traza
+        if cycle == cycles: # Si la copia es justo la instrucción pedida
+            return 0
+        return proc.run(cycle - cycles, engine) # Ejecuta hasta la instrucción pedida
+
+    def replay(self, proc, engine="interp", max_cycles=None):
+        # Repite la ejecución grabada desde el principio, con los valores de entrada de la traza
+        # Devuelve el número de instrucciones ejecutadas
+        cycles, position, snap = self.checkpoints[0]
+        proc.restore(snap) # Vuelve al estado inicial
+        proc.input_port = ReplayInput(self.inputs, position)
+        return proc.run(max_cycles, engine)
+
+    def save(self, path):
+        # Guarda la traza en un fichero
+        data = encode_values(self.inputs)
+        with open(path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION, 0, self.interval, len(data)))
+            file.write(data)
+            file.write(zlib.compress(pickle.dumps((self.fidelity, self.checkpoints), pickle.HIGHEST_PROTOCOL), 1))
+
+
+# Definimos una función que carga una traza guardada con Trace.save
+def load(path):
+    # Lanza ValueError si el fichero no es una traza válida
+    with open(path, "rb") as file:
+        header = file.read(HEADER.size)
+        if len(header) < HEADER.size: # Comprueba si el fichero tiene cabecera
+            raise ValueError("la traza es demasiado corta")
+        magic, version, flags, interval, size = HEADER.unpack(header)
+        if magic != MAGIC: # Comprueba si es una traza
+            raise ValueError("el fichero no es una traza")
+        if version != VERSION: # Comprueba si la versión es compatible
+            raise ValueError(f"versión de traza no soportada: {version}")
+        data = file.read(size)
+        if len(data) != size: # Comprueba si los valores de entrada están completos
+            raise ValueError("los valores de entrada de la traza están incompletos")
+        trace = Trace(interval)
+        trace.inputs = decode_values(data)
+        try:
+            trace.fidelity, trace.checkpoints = pickle.loads(zlib.decompress(file.read()))
+        except (zlib.error, pickle.UnpicklingError, EOFError) as error:
+            raise ValueError("las copias del estado de la traza no son válidas") from error
+    if not trace.checkpoints: # Una traza siempre tiene al menos el estado inicial
+        raise ValueError("la traza no tiene copias del estado")
+    return trace
+
+
+# Definimos la entrada de línea de comandos
+# Repite una ejecución grabada sin pedir datos por la terminal, o salta a una instrucción con --seek,
+# e imprime el estado del procesador
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Repite una ejecución grabada con CPU.run_program(record=...)")
+    parser.add_argument("trace", help="fichero de traza")
+    parser.add_argument("--seek", type=int, help="se detiene cuando se han ejecutado estas instrucciones")
+    parser.add_argument("--engine", choices=("interp", "blocks"), default="interp")
+    args = parser.parse_args(argv)
+    try:
+        trace = load(args.trace)
+    except (OSError, ValueError) as error:
+        print(f"{args.trace}: {error}", file=sys.stderr)
+        return 1
+    proc = CPU(fidelity=trace.fidelity) # restore ajusta las memorias al tamaño guardado
+    if args.seek == None:
+        trace.replay(proc, args.engine)
+    elif trace.seek(proc, args.seek, args.engine) == None:
+        print(f"{args.trace}: la traza empieza después de la instrucción {args.seek}", file=sys.stderr)
+        return 1
+    proc.flush_output() # Los errores ya los imprimió el procesador al fallar
+    print("Instrucciones:", proc.cycles)
+    proc.print_state()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+# Importamos los módulos para leer los argumentos, escribir los resultados y medir el tiempo
+import argparse
+import json
+import sys
+import time
+# Importamos namedtuple para los resultados y el módulo para repartir los trabajos entre varios procesos
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Importamos el procesador y sus puertos de entrada y salida
+import cpu
+from ports import IteratorInput, ListOutput
+# Importamos el ensamblador para aceptar programas en código fuente
+from assembler import assemble_file
+# Importamos el optimizador de programas
+from optimizer import load_optimized
+# Importamos las copias del estado del procesador
+import snapshot
+
+# Definimos el resultado compacto de un trabajo
+# index es la posición del trabajo en la lista, regs los registros finales, outputs los valores escritos por OUT,
+# cycles las instrucciones ejecutadas y fault el motivo por el que se detuvo sin HALT, o None si terminó con HALT
+Result = namedtuple("Result", "index regs outputs cycles fault")
+
+# Definimos los motivos de parada que no son errores del programa
+LOAD_FAULT = "Error: el programa no se pudo cargar en la memoria de sistema"
+CYCLE_LIMIT = "límite de ciclos"
+TIME_LIMIT = "límite de tiempo"
+
+# Número de instrucciones que se ejecutan entre dos comprobaciones del límite de tiempo
+SLICE = 10000
+
+
+# Definimos una función que ejecuta un trabajo en un procesador propio
+def run_job(index, program, inputs, max_cycles=None, time_limit=None, mem_size=cpu.MEM_SIZE, engine="interp",
+            fidelity="functional", optimize=False):
+    # Recibe el programa (lista de palabras o imagen de bytes) y la lista de valores de entrada
+    # El programa también puede ser un Snapshot: el trabajo continúa desde el estado guardado,
+    # y cycles y max_cycles cuentan también las instrucciones ejecutadas antes de guardarlo
+    # Por defecto usa el nivel de fidelidad "functional", porque el resultado solo incluye el estado de la arquitectura
+    # Devuelve el resultado compacto del trabajo
+    proc = cpu.CPU(mem_size, fidelity=fidelity) # Crea un procesador limpio para este trabajo
+    proc.verbose = False # Los errores se devuelven en el resultado en lugar de imprimirse
+    outputs = ListOutput() # Valores escritos por OUT
+    proc.input_port = IteratorInput(inputs) # Valores que leerá IN; lanza EOFError si no quedan
+    proc.output_port = outputs
+    if isinstance(program, snapshot.Snapshot): # Continúa desde una copia del estado
+        proc.restore(program)
+        start = proc.cp
+    elif optimize: # Optimiza el programa antes de cargarlo; cambia el número de ciclos, pero no las salidas ni los registros finales
+        start = load_optimized(proc, program)[0]
+    else:
+        start = proc.load_program(program) # Carga el programa
+    if start == None: # Comprueba si hubo un error al cargar el programa
+        return Result(index, tuple(proc.regs), list(outputs), 0, LOAD_FAULT)
+    proc.cp = start # Empieza en la dirección de inicio del programa
+    deadline = None if time_limit == None else time.perf_counter() + time_limit # Momento en que se agota el tiempo
+    fault = None
+    while proc.uc == 0: # Mientras el procesador esté ejecutando
+        limit = SLICE if max_cycles == None else min(SLICE, max_cycles - proc.cycles) # Instrucciones de esta tanda
+        if limit <= 0: # Si se agotaron los ciclos
+            fault = CYCLE_LIMIT
+            break
+        proc.run(limit, engine) # Ejecuta una tanda de instrucciones
+        if proc.error != None: # Si el programa falló
+            fault = proc.error
+            break
+        if deadline != None and proc.uc == 0 and time.perf_counter() > deadline: # Si se agotó el tiempo
+            fault = TIME_LIMIT
+            break
+    return Result(index, tuple(proc.regs), list(outputs), proc.cycles, fault) # Devuelve el resultado compacto
+
+# Definimos una función que ejecuta una tanda de trabajos en un proceso trabajador
+def run_chunk(chunk, options):
+    # Recibe una lista de tuplas (índice, programa, entradas) y devuelve la lista de sus resultados
+    # Agrupar los trabajos en tandas reduce el número de mensajes entre procesos
+    return [run_job(index, program, inputs, **options) for index, program, inputs in chunk]
+
+# Definimos una función que reparte muchos trabajos entre varios procesos
+def run_batch(jobs, workers=None, chunksize=16, max_cycles=None, time_limit=None, mem_size=cpu.MEM_SIZE, engine="interp",
+              fidelity="functional", optimize=False):
+    # Recibe una lista de tuplas (programa, entradas)
+    # Cada trabajo se ejecuta en un procesador aislado dentro de un proceso trabajador
+    # Los resultados se devuelven según van terminando las tandas, no en el orden de los trabajos; usa Result.index para ordenarlos
+    options = {"max_cycles": max_cycles, "time_limit": time_limit, "mem_size": mem_size, "engine": engine, "fidelity": fidelity,
+               "optimize": optimize}
+    jobs = [(index, program, inputs) for index, (program, inputs) in enumerate(jobs)] # Numera los trabajos
+    with ProcessPoolExecutor(workers) as pool: # Crea los procesos trabajadores
+        futures = [pool.submit(run_chunk, jobs[i:i + chunksize], options) for i in range(0, len(jobs), chunksize)]
+        for future in as_completed(futures): # Según van terminando las tandas
+            yield from future.result() # Devuelve sus resultados
+
+
+# Definimos una función que lee un fichero de valores de entrada separados por espacios o saltos de línea
+def read_inputs(path):
+    with open(path) as file:
+        return [int(value) for value in file.read().split()]
+
+# Definimos la entrada de línea de comandos
+def main(argv=None):
+    # Cada trabajo es PROGRAMA[:ENTRADAS], donde PROGRAMA es una imagen de programa (ver image.py), una imagen de palabras
+    # de 32 bits en little-endian, un fichero fuente .s o .asm, que se ensambla usando la caché de imágenes,
+    # o una copia del procesador .snap guardada con Snapshot.save, y ENTRADAS un fichero de texto con los valores que leerá IN
+    # Escribe un resultado JSON por línea según van terminando los trabajos
+    parser = argparse.ArgumentParser(description="Ejecuta muchos programas en paralelo")
+    parser.add_argument("jobs", nargs="+", metavar="PROGRAMA[:ENTRADAS]")
+    parser.add_argument("--workers", type=int, default=None, help="número de procesos trabajadores")
+    parser.add_argument("--chunksize", type=int, default=16, help="trabajos por tanda enviada a un proceso")
+    parser.add_argument("--max-cycles", type=int, default=None, help="instrucciones máximas por trabajo")
+    parser.add_argument("--timeout", type=float, default=None, help="segundos máximos por trabajo")
+    parser.add_argument("--mem-size", type=int, default=cpu.MEM_SIZE, help="tamaño de la memoria en bytes")
+    parser.add_argument("--engine", choices=["interp", "blocks"], default="interp")
+    parser.add_argument("--fidelity", choices=cpu.FIDELITIES, default="functional")
+    parser.add_argument("--optimize", action="store_true", help="optimiza los programas antes de ejecutarlos")
+    args = parser.parse_args(argv)
+    jobs = []
+    for job in args.jobs: # Lee los programas y sus entradas
+        path, _, inputs = job.partition(":")
+        if path.endswith((".s", ".asm")): # Si es código fuente
+            path = assemble_file(path) # Usa la imagen ensamblada
+        if path.endswith(".snap"): # Si es una copia del procesador
+            program = snapshot.load(path)
+        else:
+            with open(path, "rb") as file:
+                program = file.read()
+        jobs.append((program, read_inputs(inputs) if inputs else []))
+    results = run_batch(jobs, args.workers, args.chunksize, args.max_cycles, args.timeout, args.mem_size, args.engine,
+                        args.fidelity, args.optimize)
+    for result in results: # Escribe cada resultado en cuanto está disponible
+        print(json.dumps(result._asdict(), ensure_ascii=False), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
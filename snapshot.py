@@ -0,0 +1,39 @@
+# Importamos el módulo pickle para guardar las copias del procesador en un fichero
+import pickle
+
+
+# Definimos la copia del estado completo de un procesador, creada por CPU.snapshot y usada por CPU.restore
+# state guarda los componentes del procesador, mem_sis y mem_dat el tamaño y el contenido de cada memoria
+# y ports el estado pendiente de los puertos de entrada y salida que lo permiten (ver ports.py)
+# Las memorias paginadas comparten sus páginas con el procesador hasta que este las escribe (copy-on-write)
+# caches guarda las cachés de instrucciones decodificadas y de bloques; solo sirven para el procesador owner,
+# así que no se guardan en los ficheros
+class Snapshot:
+    __slots__ = ("state", "mem_sis", "mem_dat", "ports", "caches", "owner")
+
+    def __init__(self, state, mem_sis, mem_dat, ports, caches=None, owner=None):
+        self.state = state # Diccionario con los componentes del procesador
+        self.mem_sis = mem_sis # Tupla (tamaño, contenido) de la memoria de sistema
+        self.mem_dat = mem_dat # Tupla (tamaño, contenido) de la memoria de datos
+        self.ports = ports # Tupla (estado del puerto de entrada, estado del puerto de salida)
+        self.caches = caches # Tupla de cachés del procesador owner, o None
+        self.owner = owner # Procesador que creó la copia, o None
+
+    def __getstate__(self):
+        # Las cachés y el procesador no se guardan en los ficheros
+        return (self.state, self.mem_sis, self.mem_dat, self.ports)
+
+    def __setstate__(self, data):
+        self.state, self.mem_sis, self.mem_dat, self.ports = data
+        self.caches = self.owner = None
+
+    def save(self, path):
+        # Guarda la copia en un fichero para que otros procesos la puedan cargar con load
+        with open(path, "wb") as file:
+            pickle.dump(self, file, pickle.HIGHEST_PROTOCOL)
+
+
+# Definimos una función que carga una copia guardada con Snapshot.save
+def load(path):
+    with open(path, "rb") as file:
+        return pickle.load(file)
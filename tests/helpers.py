@@ -0,0 +1,52 @@
+# Funciones comunes de las pruebas diferenciales
+# Cada fichero de pruebas elige los parámetros de los programas aleatorios y las configuraciones que compara
+from cpu import CPU, encode, JMP, JZ, JN, LDR, STR, HALT
+from optimizer import load_optimized
+from ports import IteratorInput, ListOutput
+
+# Tamaño por defecto de la memoria de las pruebas, suficiente para los programas de benchmarks.workloads
+MEM_SIZE = 4096
+
+
+# Definimos una función que prepara un procesador con un programa cargado
+def prepare(program, inputs, fidelity="functional", mem_size=MEM_SIZE, dir=0, entry=0, optimized=False):
+    # Carga el programa en dir, con optimizer.load_optimized si optimized es verdadero,
+    # y pone el CP en la dirección de inicio más entry
+    # Devuelve el procesador y el puerto de salida
+    proc = CPU(mem_size, fidelity=fidelity)
+    proc.verbose = False
+    outputs = ListOutput()
+    proc.input_port = IteratorInput(inputs)
+    proc.output_port = outputs
+    start = load_optimized(proc, program, dir)[0] if optimized else proc.load_program(program, dir)
+    assert start != None
+    proc.cp = start + entry
+    return proc, outputs
+
+# Definimos una función que devuelve el estado de la arquitectura de un procesador
+def state(proc, outputs):
+    return (list(proc.regs), proc.alu, proc.cp, proc.uc, proc.mem_dat.dump(), list(outputs), proc.error, proc.cycles)
+
+# Definimos una función que genera un programa aleatorio
+def random_program(rng, length, ops, jump, access, valid=0.95, halt=False):
+    # length es la tupla (mínimo, máximo) de instrucciones y ops la lista de operaciones entre las que se elige
+    # jump y access reciben (rng, instrucciones, palabras de datos) y devuelven la dirección de un salto o de un LDR o STR
+    # Cada registro es válido (R0 a R7) con probabilidad valid
+    # Con halt se añade un HALT al final del código; después van de 0 a 4 palabras de datos
+    n = rng.randint(*length)
+    data = rng.randint(0, 4)
+    code = []
+    for _ in range(n):
+        op = rng.choice(ops)
+        rn = rng.randrange(8) if rng.random() < valid else rng.randrange(16)
+        rm = rng.randrange(8) if rng.random() < valid else rng.randrange(16)
+        if op in (JMP, JZ, JN):
+            d = jump(rng, n, data)
+        elif op in (LDR, STR):
+            d = access(rng, n, data)
+        else:
+            d = rng.randrange(1 << 16) if rng.random() < 0.1 else 0
+        code.append(encode(op, rn, rm, d))
+    if halt:
+        code.append(encode(HALT))
+    return code + [rng.randrange(-50, 50) for _ in range(data)]
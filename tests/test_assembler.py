@@ -0,0 +1,86 @@
+# Pruebas del ensamblador
+# Las etiquetas, los desplazamientos y las directivas se traducen a las palabras esperadas, los errores del código
+# fuente indican su línea y assemble_file reutiliza la imagen de la caché sin volver a ensamblar
+import pytest
+
+import assembler
+from assembler import assemble, assemble_file, assemble_sections
+from cpu import encode, ADD, NOT, LDR, STR, JMP, JZ, OUT, HALT
+from memory import pack_words
+
+
+def test_labels_and_offsets():
+    source = """
+start:  LDR R1, table+4     ; segunda palabra de la tabla
+        STR R1, table - 0x4 ; palabra anterior a la tabla
+        JZ end
+        JMP start
+end:    HALT
+table:  .word 10, 20, end
+"""
+    code, data, entry = assemble_sections(source)
+    assert code == pack_words([encode(LDR, 1, dir=24), encode(STR, 1, dir=16), encode(JZ, dir=16), encode(JMP, dir=0),
+                               encode(HALT), 10, 20, 16])
+    assert data == b"" and entry == 0
+
+
+def test_sections_and_directives():
+    source = """
+        .data
+value:  .word -1, 0x7FFFFFFF
+buffer: .space 6
+after:  .word buffer, after
+        .code
+main:   ADD R0, R1
+        NOT R2
+        OUT R2
+        HALT
+        .entry main+4
+"""
+    code, data, entry = assemble_sections(source)
+    assert code == pack_words([encode(ADD, 0, 1), encode(NOT, 2), encode(OUT, 2), encode(HALT)])
+    # Los datos van después del código: value en 16, buffer en 24 y after en 30
+    assert data == pack_words([-1, 0x7FFFFFFF]) + bytes(6) + pack_words([24, 30])
+    assert entry == 4
+
+
+@pytest.mark.parametrize("source, line, message", [
+    ("HALT\nFOO R1", 2, "instrucción desconocida"),
+    ("\n\nADD R0", 3, "necesita 2 operandos"),
+    ("ADD R0, R16", 1, "registro inválido"),
+    ("JMP nowhere", 1, "etiqueta desconocida"),
+    ("a: HALT\na: HALT", 2, "etiqueta repetida"),
+    ("1a: HALT", 1, "etiqueta inválida"),
+    ("NOP\nJMP 0x10000", 2, "no cabe en 16 bits"),
+    ("NOP\nNOP\n.word 0x100000000", 3, "no cabe en 32 bits"),
+    (".space -4", 1, ".space necesita"),
+    (".entry", 1, ".entry necesita"),
+])
+def test_errors_report_line(source, line, message):
+    with pytest.raises(ValueError) as error:
+        assemble(source)
+    assert str(error.value).startswith(f"línea {line}: ")
+    assert message in str(error.value)
+
+
+def test_assemble_file_cache(tmp_path, monkeypatch):
+    path = tmp_path / "program.s"
+    path.write_text("LDR R0, one\nOUT R0\nHALT\none: .word 1\n", encoding="utf-8")
+    target = assemble_file(path)
+    with open(target, "rb") as file:
+        assert file.read() == assemble(path.read_text(encoding="utf-8"))
+    def fail(source):
+        raise AssertionError("la imagen se ha vuelto a ensamblar")
+    monkeypatch.setattr(assembler, "assemble", fail)
+    assert assemble_file(path) == target # La imagen está en la caché
+    path.write_text("HALT\n", encoding="utf-8") # Otro código fuente tiene otra imagen
+    with pytest.raises(AssertionError):
+        assemble_file(path)
+
+
+def test_optimize_requires_output(tmp_path):
+    path = tmp_path / "program.s"
+    path.write_text("HALT\n", encoding="utf-8")
+    with pytest.raises(SystemExit) as error:
+        assembler.main([str(path), "-O"])
+    assert error.value.code == 2
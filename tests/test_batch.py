@@ -0,0 +1,59 @@
+# Prueba diferencial del motor por lotes
+# Cada instancia de un lote ejecutado con run_lockstep tiene que acabar igual que un procesador CPU(fidelity="functional")
+# que ejecuta el mismo programa con sus entradas: registros, ALU, CP, UC, salidas, error, instrucciones y memoria
+# Los programas se ejecutan pocas instrucciones para que los registros no se salgan de los enteros de 64 bits del lote
+import random
+
+import numpy as np
+import pytest
+
+from cpu import encode, NOP, ADD, SUB, AND, OR, XOR, NOT, MOV, LDR, STR, JMP, JZ, JN, IN, OUT, HALT
+from batch import run_lockstep
+from helpers import prepare, random_program
+
+# Instrucciones máximas de cada ejecución
+MAX_CYCLES = 40
+
+# Tamaño de la memoria de cada instancia
+MEM_SIZE = 256
+
+# Instancias de cada lote y columnas de la matriz de entradas
+LANES = 16
+COLUMNS = 4
+
+# Operaciones de los programas aleatorios
+OPS = [NOP, ADD, SUB, AND, OR, XOR, NOT, MOV, LDR, STR, JMP, JZ, JN, IN, OUT, HALT]
+
+
+# Definimos la dirección de los saltos y de los accesos a memoria de los programas aleatorios
+# Casi todas son palabras del programa, pero algunas quedan fuera de la memoria para que las instancias fallen
+def address(rng, n, data):
+    return 4 * rng.randrange(n + 4) if rng.random() < 0.9 else rng.randrange(300)
+
+# Definimos una función que compara cada instancia de un lote con un procesador
+def check(program, inputs, in_len, dir):
+    batch = run_lockstep(program, inputs, MEM_SIZE, MAX_CYCLES, dir, in_len)
+    for lane in range(len(inputs)):
+        proc, outputs = prepare(program, list(inputs[lane, :in_len[lane]]), mem_size=MEM_SIZE, dir=dir)
+        proc.run(MAX_CYCLES)
+        expected = (list(proc.regs), proc.alu, proc.cp, proc.uc, list(outputs), proc.error, proc.cycles, proc.mem_dat.dump())
+        got = (batch.regs[lane].tolist(), int(batch.alu[lane]), int(batch.cp[lane]), int(batch.uc[lane]),
+               batch.outputs(lane).tolist(), batch.error(lane), int(batch.cycles[lane]), batch.mem[lane].tobytes())
+        assert got == expected, lane
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_random(seed):
+    rng = random.Random(seed)
+    for _ in range(100):
+        program = random_program(rng, (3, 20), OPS, address, address)
+        inputs = np.array([[rng.randrange(-5, 5) for _ in range(COLUMNS)] for _ in range(LANES)])
+        in_len = [rng.randint(0, COLUMNS) for _ in range(LANES)] # Cada instancia puede leer un número distinto de valores
+        check(program, inputs, in_len, rng.choice([0, 0, 32]))
+
+
+def test_invalid_in_len():
+    with pytest.raises(ValueError):
+        run_lockstep([encode(HALT)], np.zeros((2, 3)), in_len=[1, 4])
+    with pytest.raises(ValueError):
+        run_lockstep([encode(HALT)], np.zeros((2, 3)), in_len=-1)
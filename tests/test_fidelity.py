@@ -0,0 +1,75 @@
+# Prueba diferencial de los niveles de fidelidad y de los motores de ejecución
+# Cada programa se ejecuta con "microarch" y "functional" y con los motores "interp" y "blocks",
+# y el estado de la arquitectura tiene que ser el mismo en las cuatro combinaciones
+# Con "microarch" los dos motores tienen que dejar además el MAR, el MBR, el IR y los buses iguales
+import random
+
+import pytest
+
+import cpu
+from cpu import encode, NOP, ADD, SUB, AND, OR, XOR, NOT, MOV, LDR, STR, JMP, JZ, JN, IN, OUT, HALT
+from assembler import assemble
+from benchmarks.workloads import WORKLOADS
+from helpers import prepare, random_program, state
+
+# Instrucciones máximas de cada ejecución, para los programas que no terminan
+MAX_CYCLES = 3000
+
+# Registros de búsqueda y buses que solo simula el nivel "microarch"
+MICROARCH_FIELDS = ("mar", "mbr", "ir", "bus_int", "bus_dat", "bus_dir", "bus_con")
+
+# Programas de prueba fijos: (nombre, programa, entradas, dirección de carga, dirección de inicio relativa)
+CORPUS = [
+    ("demo", cpu.program, [3, 4], 0, 0),
+    ("demo_base", cpu.program, [3, 4], 64, 0),
+    # JMP copia a la ALU la dirección de 16 bits, así que JZ se comporta igual cargado en cualquier dirección
+    ("jmp_alu", [encode(JZ, dir=12), encode(NOT, 0), encode(JMP, dir=0), encode(OUT, 0), encode(HALT)], [], 0, 8),
+    ("jmp_alu_base", [encode(JZ, dir=12), encode(NOT, 0), encode(JMP, dir=0), encode(OUT, 0), encode(HALT)], [], 64, 8),
+    ("in_eof", [encode(IN, 0), encode(IN, 1), encode(HALT)], [5], 0, 0),
+    ("bad_register", [encode(ADD, 0, 9), encode(HALT)], [], 0, 0),
+    ("bad_load", [encode(LDR, 0, dir=0xFFF0), encode(HALT)], [], 0, 0),
+    ("fetch_fault", [encode(JMP, dir=0x1000)], [], 0, 0),
+    ("fall_off", [encode(NOP), encode(ADD, 0, 0)], [], 0, 0),
+    # STR reescribe la instrucción siguiente dentro del mismo bloque
+    ("selfmod", [encode(LDR, 1, dir=16), encode(STR, 1, dir=8), encode(NOP), encode(HALT), encode(OUT, 1)], [], 0, 0),
+]
+CORPUS += [(name, assemble(function(0.01).source), function(0.01).inputs, 0, 0) for name, function in WORKLOADS.items()]
+
+# Operaciones de los programas aleatorios
+OPS = [NOP, ADD, SUB, AND, OR, XOR, NOT, MOV, LDR, STR, JMP, JZ, JN, IN, OUT, HALT]
+
+
+# Definimos una función que ejecuta un programa y devuelve el procesador y sus salidas
+def run(program, inputs, fidelity, engine, dir=0, entry=0):
+    proc, outputs = prepare(program, inputs, fidelity, dir=dir, entry=entry)
+    proc.run(MAX_CYCLES, engine)
+    return proc, outputs
+
+# Definimos una función que comprueba un programa con las cuatro combinaciones
+def check(program, inputs, dir=0, entry=0):
+    ref, ref_out = run(program, inputs, "microarch", "interp", dir, entry)
+    blocks, blocks_out = run(program, inputs, "microarch", "blocks", dir, entry)
+    assert state(blocks, blocks_out) == state(ref, ref_out)
+    assert [getattr(blocks, f) for f in MICROARCH_FIELDS] == [getattr(ref, f) for f in MICROARCH_FIELDS]
+    for engine in ("interp", "blocks"):
+        assert state(*run(program, inputs, "functional", engine, dir, entry)) == state(ref, ref_out)
+
+# Definimos la dirección de los saltos y de los accesos a memoria de los programas aleatorios
+# Casi todas son palabras del programa, para que los programas lleguen lejos, pero no todas
+def address(rng, n, data):
+    return 4 * rng.randrange(n + 4) if rng.random() < 0.9 else rng.randrange(300)
+
+
+@pytest.mark.parametrize("name, program, inputs, dir, entry", CORPUS, ids=[case[0] for case in CORPUS])
+def test_corpus(name, program, inputs, dir, entry):
+    check(program, inputs, dir, entry)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_random(seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        program = random_program(rng, (3, 20), OPS, address, address)
+        inputs = [rng.randrange(-5, 5) for _ in range(rng.randint(0, 6))]
+        dir = rng.choice([0, 0, 32])
+        check(program, inputs, dir)
@@ -0,0 +1,74 @@
+# Pruebas del formato de las imágenes de programa
+# read_image rechaza las imágenes con la cabecera o las secciones estropeadas, y un programa cargado
+# con load_image se ejecuta igual copiado en la memoria que proyectado con mmap
+import pytest
+
+from image import HEADER, VERSION, build_image, is_image, read_image
+from assembler import assemble
+from ports import IteratorInput, ListOutput
+from cpu import CPU
+from helpers import state
+
+# Imagen de prueba: lee dos valores, escribe su suma en la sección de datos y la devuelve por la salida
+SOURCE = """
+        .entry main
+        .data
+sum:    .word 0
+        .code
+main:   IN R0
+        IN R1
+        ADD R0, R1
+        STR R0, sum
+        LDR R2, sum
+        OUT R2
+        HALT
+"""
+IMAGE = assemble(SOURCE)
+
+
+# Definimos una función que cambia un campo de la cabecera de una imagen
+def patch(image, index, value):
+    fields = list(HEADER.unpack_from(image))
+    fields[index] = value
+    return HEADER.pack(*fields) + image[HEADER.size:]
+
+
+def test_round_trip():
+    body, entry = read_image(build_image(b"\x01\x02\x03\x04", b"\x05\x06\x07\x08", 4))
+    assert bytes(body) == b"\x01\x02\x03\x04\x05\x06\x07\x08"
+    assert entry == 4
+    assert is_image(IMAGE) and not is_image(b"\x00" * HEADER.size)
+
+
+@pytest.mark.parametrize("image, message", [
+    (IMAGE[:HEADER.size - 1], "demasiado corta"),
+    (patch(IMAGE, 0, b"CPUX"), "no es una imagen"),
+    (patch(IMAGE, 1, VERSION + 1), "versión"),
+    (IMAGE[:-4], "tamaño"),
+    (IMAGE + b"\x00", "tamaño"),
+    (patch(IMAGE, 3, HEADER.unpack_from(IMAGE)[3] + 4), "tamaño"),
+    (IMAGE[:-1] + bytes([IMAGE[-1] ^ 0x80]), "suma de comprobación"),
+], ids=["short", "magic", "version", "truncated", "extra", "size", "crc"])
+def test_read_image_rejects(image, message):
+    with pytest.raises(ValueError) as error:
+        read_image(image)
+    assert message in str(error.value)
+
+
+@pytest.mark.parametrize("engine", ["interp", "blocks"])
+def test_load_image_mapped(engine, tmp_path):
+    path = tmp_path / "program.img"
+    path.write_bytes(IMAGE)
+    results = []
+    for mapped in (False, True):
+        proc = CPU(len(IMAGE) - HEADER.size, fidelity="functional")
+        proc.verbose = False
+        outputs = ListOutput()
+        proc.input_port = IteratorInput([5, 7])
+        proc.output_port = outputs
+        proc.cp = proc.load_image(path, mapped)
+        proc.run(100, engine)
+        results.append(state(proc, outputs))
+    assert results[0] == results[1]
+    assert results[0][5] == [12] and results[0][3] == 1 # La suma sale por la salida y el programa termina con HALT
+    assert path.read_bytes() == IMAGE # La proyección no escribe en el fichero
@@ -0,0 +1,88 @@
+# Prueba diferencial del optimizador y de las superinstrucciones
+# Un programa optimizado tiene que producir las mismas salidas, el mismo error y los mismos registros al terminar
+# que el original, con cualquier nivel de fidelidad y motor
+# Las superinstrucciones no pueden cambiar nada: con ellas y sin ellas el procesador tiene que dejar el mismo estado
+# y el mismo número de instrucciones tras cada llamada a run, aunque el límite caiga en mitad de una superinstrucción
+import random
+
+import pytest
+
+from cpu import NOP, ADD, SUB, AND, OR, XOR, NOT, MOV, LDR, STR, JMP, JZ, JN, IN, OUT, HALT
+from assembler import assemble
+from benchmarks.workloads import WORKLOADS
+from helpers import prepare, random_program, state
+
+# Instrucciones máximas de cada ejecución; los programas que no terminan antes no se comparan
+MAX_CYCLES = 5000
+
+# Tamaño de la memoria de los programas aleatorios
+MEM_SIZE = 256
+
+# Combinaciones de nivel de fidelidad y motor con las que se ejecuta el programa optimizado
+CONFIGS = [("functional", "interp"), ("functional", "blocks"), ("microarch", "interp"), ("microarch", "blocks")]
+
+# Operaciones de los programas aleatorios, con más MOV y NOP para que el optimizador tenga trabajo
+OPS = [NOP, ADD, SUB, AND, OR, XOR, NOT, MOV, MOV, MOV, LDR, STR, JMP, JZ, JN, IN, OUT, NOP, HALT]
+
+# Longitudes de los tramos en que se divide la ejecución al comparar las superinstrucciones
+SLICES = (1, 2, 3, 5, 7)
+
+
+# Definimos una función que devuelve lo que el optimizador no puede cambiar
+def result(proc, outputs):
+    # La ALU solo se compara al terminar con HALT, porque es lo único que leen JZ y JN
+    return (proc.uc, proc.error, list(outputs), list(proc.regs), proc.alu if proc.uc else None)
+
+# Definimos una función que compara un programa optimizado con el original
+def check_optimized(program, inputs, mem_size=MEM_SIZE):
+    proc, outputs = prepare(program, inputs, mem_size=mem_size)
+    proc.run(MAX_CYCLES)
+    if proc.uc == 0 and proc.error == None: # El programa no terminó dentro del límite
+        return
+    expected = result(proc, outputs)
+    for fidelity, engine in CONFIGS:
+        proc, outputs = prepare(program, inputs, fidelity, mem_size, optimized=True)
+        proc.run(MAX_CYCLES, engine)
+        assert result(proc, outputs) == expected, (fidelity, engine)
+
+# Definimos una función que compara el intérprete "functional" con superinstrucciones y sin ellas
+def check_superinstructions(program, inputs, rng, mem_size=MEM_SIZE):
+    fused, fused_out = prepare(program, inputs, optimized=True, mem_size=mem_size)
+    plain, plain_out = prepare(program, inputs, optimized=True, mem_size=mem_size)
+    plain.superinstructions = False
+    total = 0
+    while total < MAX_CYCLES:
+        limit = rng.choice(SLICES)
+        done = fused.run(limit)
+        assert done == plain.run(limit)
+        assert state(fused, fused_out) == state(plain, plain_out)
+        if done < limit: # El programa se detuvo o falló
+            break
+        total += done
+
+# Definimos las direcciones de los programas aleatorios
+# Los saltos van casi siempre a instrucciones del programa y los accesos a memoria a sus datos,
+# para que el optimizador pueda comprobar la mayoría de los programas
+def jump(rng, n, data):
+    return 4 * rng.randrange(n + 1) if rng.random() < 0.98 else rng.randrange(200)
+
+def access(rng, n, data):
+    return 4 * (n + rng.randrange(max(data, 1) + 2)) if rng.random() < 0.95 else rng.randrange(200)
+
+
+@pytest.mark.parametrize("name", list(WORKLOADS))
+def test_workloads(name):
+    workload = WORKLOADS[name](0.01)
+    program = assemble(workload.source)
+    check_optimized(program, workload.inputs, workload.mem_size)
+    check_superinstructions(program, workload.inputs, random.Random(name), workload.mem_size)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_random(seed):
+    rng = random.Random(seed)
+    for _ in range(200):
+        program = random_program(rng, (4, 24), OPS, jump, access, 0.97, halt=True)
+        inputs = [rng.randrange(-3, 3) for _ in range(rng.randint(0, 8))]
+        check_optimized(program, inputs)
+        check_superinstructions(program, inputs, rng)
@@ -0,0 +1,98 @@
+# Pruebas de las trazas de ejecución
+# Los valores de entrada se codifican y decodifican sin pérdidas, y una traza guardada y cargada de nuevo
+# repite la ejecución original: replay llega al mismo estado final y seek al estado que tenía en cada instrucción
+import pytest
+
+from assembler import assemble
+from benchmarks.workloads import io
+from replay import Trace, decode_values, encode_values, load
+from helpers import prepare
+
+# Instrucciones entre dos copias del estado, pequeño para que la traza tenga muchas
+INTERVAL = 40
+
+# Programa de prueba: lee un contador y suma los valores que lee, escribiendo cada suma parcial
+WORKLOAD = io(0.001)
+PROGRAM = assemble(WORKLOAD.source)
+
+
+# Definimos una función que ejecuta el programa directamente, sin traza
+def straight(inputs, max_cycles=None, fidelity="functional"):
+    proc, outputs = prepare(PROGRAM, inputs, fidelity, WORKLOAD.mem_size)
+    proc.run(max_cycles)
+    return proc
+
+# Definimos una función que devuelve lo que tiene que coincidir con la ejecución directa
+def state(proc):
+    return (list(proc.regs), proc.alu, proc.cp, proc.uc, proc.cycles, proc.error)
+
+# Definimos una función que graba una traza, la guarda y la vuelve a cargar
+def record(inputs, path, fidelity="functional"):
+    proc, outputs = prepare(PROGRAM, inputs, fidelity, WORKLOAD.mem_size)
+    trace = Trace(INTERVAL)
+    trace.record(proc)
+    trace.save(path)
+    return proc, load(path)
+
+
+@pytest.mark.parametrize("values", [
+    [],
+    [0],
+    [1, -1, 2, -2, 63, -64, 64, -65],
+    [2 ** 31 - 1, -2 ** 31, 2 ** 40, -2 ** 40, 10 ** 30],
+    list(range(-300, 300, 7)),
+])
+def test_values_round_trip(values):
+    assert decode_values(encode_values(values)) == values
+
+
+def test_values_small_negatives_are_short():
+    # Con zigzag los negativos pequeños ocupan un byte, igual que los positivos
+    assert len(encode_values([-1, -64, 63])) == 3
+
+
+def test_values_truncated():
+    data = encode_values([1000, -1000])
+    with pytest.raises(ValueError):
+        decode_values(data[:-1])
+
+
+# Entradas que terminan el programa con HALT y entradas que se acaban antes, así que IN falla
+@pytest.mark.parametrize("inputs", [WORKLOAD.inputs, WORKLOAD.inputs[:30]], ids=["halt", "eof"])
+def test_record_and_replay(inputs, tmp_path):
+    original, trace = record(inputs, tmp_path / "run.trace")
+    expected = straight(inputs)
+    assert state(original) == state(expected)
+    assert trace.inputs == inputs[:len(trace.inputs)]
+    assert len(trace.checkpoints) > 3
+    proc = straight([]) # Otro procesador, sin entradas: los valores salen de la traza
+    trace.replay(proc)
+    assert state(proc) == state(expected)
+
+
+@pytest.mark.parametrize("fidelity", ["functional", "microarch"])
+def test_seek(fidelity, tmp_path):
+    inputs = WORKLOAD.inputs
+    original, trace = record(inputs, tmp_path / "run.trace", fidelity)
+    end = original.cycles
+    cycles = [checkpoint[0] for checkpoint in trace.checkpoints]
+    targets = {0, 1, end - 1, end, end + 100} # Principio, final y después del final de la traza
+    for cycle in cycles[1:]: # Justo en una copia, una antes y una después
+        targets.update((cycle - 1, cycle, cycle + 1))
+    for cycle in sorted(targets):
+        proc = straight([], fidelity=fidelity)
+        assert trace.seek(proc, cycle) != None
+        assert state(proc) == state(straight(inputs, cycle, fidelity)), cycle
+
+
+def test_seek_before_trace(tmp_path):
+    original, trace = record(WORKLOAD.inputs, tmp_path / "run.trace")
+    assert trace.seek(straight([]), -1) == None
+
+
+@pytest.mark.parametrize("data", [b"", b"CPUX" + bytes(20), b"CPUT\x09\x00" + bytes(18)], ids=["short", "magic", "version"])
+def test_load_invalid(data, tmp_path):
+    path = tmp_path / "bad.trace"
+    path.write_bytes(data)
+    with pytest.raises(ValueError):
+        load(path)
@@ -0,0 +1,41 @@
+# Pruebas del ejecutor de trabajos en paralelo
+# Un programa que no se puede cargar tiene que dar un resultado con LOAD_FAULT, con o sin optimizar,
+# sin lanzar una excepción que detenga los demás trabajos de la tanda
+import pytest
+
+import cpu
+from image import build_image
+from memory import pack_words
+from runner import LOAD_FAULT, run_batch, run_job
+
+# Imagen válida del programa de ejemplo y una copia con un bit cambiado en las secciones
+IMAGE = build_image(pack_words(cpu.program))
+CORRUPT = IMAGE[:-1] + bytes([IMAGE[-1] ^ 1])
+
+
+@pytest.mark.parametrize("optimize", [False, True])
+def test_valid_image(optimize):
+    result = run_job(0, IMAGE, [3, 4], optimize=optimize)
+    assert result.fault == None
+    assert result.outputs == [7]
+
+
+@pytest.mark.parametrize("optimize", [False, True])
+def test_bad_checksum(optimize):
+    result = run_job(0, CORRUPT, [3, 4], optimize=optimize)
+    assert result.fault == LOAD_FAULT
+    assert result.cycles == 0 and result.outputs == []
+
+
+def test_bad_length_optimized():
+    # El optimizador solo acepta palabras completas; sin optimizar, CPU.load_program carga los bytes tal cual
+    result = run_job(0, pack_words(cpu.program)[:-1], [3, 4], optimize=True)
+    assert result.fault == LOAD_FAULT
+
+
+def test_bad_image_in_batch():
+    # Un trabajo que no se puede cargar no impide obtener los resultados de los demás
+    jobs = [(IMAGE, [3, 4]), (CORRUPT, [3, 4]), (IMAGE, [1, 2])]
+    results = sorted(run_batch(jobs, workers=1, chunksize=3, optimize=True))
+    assert [result.fault for result in results] == [None, LOAD_FAULT, None]
+    assert [result.outputs for result in results] == [[7], [], [3]]
@@ -0,0 +1,62 @@
+# Pruebas de las copias del estado del procesador
+# Una copia de una memoria paginada comparte sus páginas con el procesador, pero las escrituras posteriores
+# no la modifican, y se puede restaurar varias veces; una copia guardada en un fichero se puede restaurar
+# en otro procesador, que descarta sus cachés y continúa la ejecución igual que el original
+import cpu
+from cpu import CPU, encode, ADD, LDR, STR, OUT, JMP, HALT
+from image import build_image
+from memory import FLAT_LIMIT, PagedMemory, pack_words
+from snapshot import load
+from ports import ListOutput
+from helpers import prepare, state
+
+# Tamaño de una memoria paginada
+PAGED_SIZE = 4 * FLAT_LIMIT
+
+
+def test_paged_copy_on_write():
+    proc = CPU(PAGED_SIZE, fidelity="functional")
+    assert isinstance(proc.mem_dat, PagedMemory)
+    proc.write_mem(0x1000, 11)
+    proc.write_mem(0x200000, 22)
+    snap = proc.snapshot()
+    saved = {num: bytes(page) for num, page in snap.mem_dat[1].items()} # Contenido de las páginas guardadas
+    for value in (33, 44): # Escribe después de la copia y la restaura, dos veces
+        proc.write_mem(0x1000, value)
+        proc.write_mem(0x200000, value)
+        proc.write_mem(0x300000, value) # Página que no existía al hacer la copia
+        assert proc.read_mem(0x1000) == value
+        proc.restore(snap)
+        assert [proc.read_mem(dir) for dir in (0x1000, 0x200000, 0x300000)] == [11, 22, 0]
+        assert {num: bytes(page) for num, page in snap.mem_dat[1].items()} == saved
+
+
+def test_save_load_other_cpu(tmp_path):
+    # Bucle que suma R1 a R0 y lo escribe en la memoria y en la salida
+    program = [encode(LDR, 1, dir=28), encode(ADD, 0, 1), encode(STR, 0, dir=32), encode(OUT, 0),
+               encode(LDR, 2, dir=32), encode(JMP, dir=4), encode(HALT), 3, 0]
+    original, outputs = prepare(program, [], mem_size=64)
+    original.run(20)
+    done = len(outputs) # Salidas escritas antes de la copia
+    original.snapshot().save(tmp_path / "proc.snap")
+    original.run(30)
+    other, _ = prepare(cpu.program, [3, 4], mem_size=32) # Otro procesador, con otro programa ya decodificado
+    other.run(3)
+    assert other.decode_cache
+    other.restore(load(tmp_path / "proc.snap"))
+    assert not other.decode_cache and not other.block_cache and not other.block_owners # Las cachés se descartan
+    other.output_port = other_out = ListOutput()
+    other.run(30)
+    assert state(other, other_out) == state(original, outputs[done:]) # Salidas escritas después de la copia
+
+
+def test_restore_closes_mapped_memory(tmp_path):
+    path = tmp_path / "program.img"
+    path.write_bytes(build_image(pack_words(cpu.program)))
+    snap = CPU(64).snapshot() # Copia de una memoria de otro tamaño
+    proc = CPU()
+    assert proc.load_image(path, mapped=True) == 0
+    mapped = proc.mem_dat
+    proc.restore(snap)
+    assert mapped.file.closed
+    assert proc.mem_dat.size == 64